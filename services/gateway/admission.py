@@ -0,0 +1,194 @@
+"""
+Admission control for backend calls.
+
+Each backend gets a concurrency limit and a bounded FIFO wait queue. A call
+that finds every slot busy waits in the queue; when the queue is full (or the
+wait exceeds the queue timeout) it is shed immediately with ``Overloaded``,
+which the app turns into ``429`` + ``Retry-After`` instead of piling more work
+onto a saturated backend.
+
+With adaptive limiting (GATEWAY_ADAPTIVE_LIMIT, default on) the limit moves
+between <PREFIX>_MIN_CONCURRENCY and the configured <PREFIX>_MAX_CONCURRENCY
+following a latency gradient: the limit shrinks when the recent service time
+rises above the long-run baseline (the backend is queueing internally) and
+grows back while latency stays near the baseline. Timeouts cut it by 10%.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict
+
+import httpx
+
+
+class Overloaded(Exception):
+    """Raised when a call is shed; ``retry_after`` is a whole number of seconds."""
+
+    def __init__(self, backend: str, reason: str, retry_after: int) -> None:
+        super().__init__(f"{backend} overloaded ({reason})")
+        self.backend = backend
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """Concurrency limit + bounded wait queue for one backend."""
+
+    # Gradient tuning: how much slower than baseline still counts as healthy
+    TOLERANCE = 1.5
+    SMOOTHING = 0.2
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        max_queue: int,
+        queue_timeout: float,
+        adaptive: bool = True,
+        min_limit: int = 1,
+    ) -> None:
+        self.name = name
+        self.max_limit = max(1, limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.queued_total = 0
+        self.queue_ms_total = 0.0
+        self.queue_ms_max = 0.0
+        self.service_ms_total = 0.0
+        self.service_ms_max = 0.0
+        self.completed = 0
+        self._rtt_short = 0.0
+        self._rtt_long = 0.0
+
+    @property
+    def current_limit(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    @property
+    def load(self) -> int:
+        """Calls holding or waiting for a slot."""
+        return self.in_flight + len(self._waiters)
+
+    def _retry_after(self) -> int:
+        # Time for the queue ahead of a new caller to drain at the current limit
+        per_call = (self._rtt_short or self._rtt_long or 1.0)
+        estimate = (len(self._waiters) + 1) * per_call / self.current_limit
+        return max(1, min(60, math.ceil(estimate)))
+
+    async def acquire(self) -> float:
+        """Take a slot, waiting in the queue if needed; returns the queue wait in ms."""
+        if self.in_flight < self.current_limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.name, "queue full", self._retry_after())
+
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued_total += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.queue_timeouts += 1
+            raise Overloaded(self.name, "queue timeout", self._retry_after()) from None
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the caller went away
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+        waited = (time.perf_counter() - started) * 1000.0
+        self.admitted += 1
+        self.queue_ms_total += waited
+        self.queue_ms_max = max(self.queue_ms_max, waited)
+        return waited
+
+    def release(self, service_s: float, timed_out: bool = False) -> None:
+        """Give the slot back and feed the service time into the adaptive limit."""
+        self.completed += 1
+        service_ms = service_s * 1000.0
+        self.service_ms_total += service_ms
+        self.service_ms_max = max(self.service_ms_max, service_ms)
+        if self.adaptive:
+            self._adapt(service_s, timed_out)
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < self.current_limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _adapt(self, rtt: float, timed_out: bool) -> None:
+        if timed_out:
+            self.limit = max(self.min_limit, self.limit * 0.9)
+            return
+        if not self._rtt_long:
+            self._rtt_short = self._rtt_long = rtt
+            return
+        self._rtt_short += (rtt - self._rtt_short) * 0.5
+        self._rtt_long += (rtt - self._rtt_long) * 0.02
+        gradient = max(0.5, min(1.0, self.TOLERANCE * self._rtt_long / self._rtt_short))
+        # Only probe upwards while latency is healthy and the limit is actually being used
+        healthy = gradient >= 1.0 and self.in_flight >= self.limit / 2
+        headroom = math.sqrt(self.limit) if healthy else 0.0
+        target = self.limit * gradient + headroom
+        self.limit = self.limit * (1 - self.SMOOTHING) + target * self.SMOOTHING
+        self.limit = max(self.min_limit, min(self.max_limit, self.limit))
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[float]:
+        """``async with limiter.slot() as queue_ms``: hold a slot for the block."""
+        queue_ms = await self.acquire()
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            yield queue_ms
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            timed_out = True
+            raise
+        finally:
+            self.release(time.perf_counter() - started, timed_out)
+
+    def snapshot(self) -> Dict[str, Any]:
+        admitted = self.admitted or 1
+        completed = self.completed or 1
+        return {
+            "limit": self.current_limit,
+            "max_limit": self.max_limit,
+            "adaptive": self.adaptive,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_timeouts": self.queue_timeouts,
+            "queue_ms_avg": round(self.queue_ms_total / admitted, 3),
+            "queue_ms_max": round(self.queue_ms_max, 3),
+            "service_ms_avg": round(self.service_ms_total / completed, 3),
+            "service_ms_max": round(self.service_ms_max, 3),
+        }
+
+
+def adaptive_enabled() -> bool:
+    return os.getenv("GATEWAY_ADAPTIVE_LIMIT", "1").lower() in {"1", "true", "yes"}
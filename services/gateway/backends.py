@@ -0,0 +1,261 @@
+"""
+Pooled HTTP clients for the gateway's backends.
+
+One ``httpx.AsyncClient`` per backend lives for the whole application
+(opened and closed in the FastAPI lifespan), so hops to pdf2json and json2xml
+reuse keep-alive connections under a shared limit instead of opening a new
+TCP connection per request.
+
+Settings come from ``<PREFIX>_<NAME>`` (e.g. ``PDF2JSON_POOL_MAX_CONNECTIONS``)
+with ``GATEWAY_<NAME>`` as the shared default:
+
+    POOL_MAX_CONNECTIONS  (100)   POOL_MAX_KEEPALIVE  (20)
+    KEEPALIVE_EXPIRY      (30 s)  POOL_TIMEOUT        (30 s)
+    CONNECT_TIMEOUT       (5 s)   READ_TIMEOUT        (300 s)
+
+Admission control (see ``admission.py``) is configured the same way:
+
+    MAX_CONCURRENCY  (per backend)  MIN_CONCURRENCY  (1)
+    MAX_QUEUE        (32)           QUEUE_TIMEOUT    (READ_TIMEOUT)
+
+QUEUE_TIMEOUT defaults to the backend's READ_TIMEOUT: a queued call waits
+behind calls that may each take that long (a pdf2json pipeline run is tens of
+seconds, with 4 slots), so a shorter default sheds requests the backend would
+have served in time. The client's request deadline still bounds the wait.
+"""
+
+import asyncio
+import os
+import secrets
+import time
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Optional, Tuple, Union
+
+import httpx
+from fastapi import UploadFile
+
+import compression
+from admission import AdmissionLimiter, adaptive_enabled
+
+# Chunk size used when streaming uploads to a backend
+UPLOAD_CHUNK_BYTES = 256 * 1024
+
+# Event-loop time by which the current client request must be answered (set per request)
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+# Remaining budget in seconds, forwarded so backends can stop work nobody will wait for
+DEADLINE_HEADER = "X-Request-Timeout"
+
+
+def _setting(prefix: str, name: str, default: float) -> float:
+    value = os.getenv(f"{prefix}_{name}") or os.getenv(f"GATEWAY_{name}")
+    return float(value) if value else default
+
+
+class BackendPool:
+    """Application-lifetime client for one backend, with pool metrics."""
+
+    def __init__(self, name: str, base_url: str, env_prefix: str, max_concurrency: int = 16) -> None:
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = int(_setting(env_prefix, "POOL_MAX_CONNECTIONS", 100))
+        self.max_keepalive = int(_setting(env_prefix, "POOL_MAX_KEEPALIVE", 20))
+        self.keepalive_expiry = _setting(env_prefix, "KEEPALIVE_EXPIRY", 30.0)
+        read_timeout = _setting(env_prefix, "READ_TIMEOUT", 300.0)
+        self.timeout = httpx.Timeout(
+            connect=_setting(env_prefix, "CONNECT_TIMEOUT", 5.0),
+            read=read_timeout,
+            write=read_timeout,
+            pool=_setting(env_prefix, "POOL_TIMEOUT", 30.0),
+        )
+        self.limiter = AdmissionLimiter(
+            name,
+            limit=int(_setting(env_prefix, "MAX_CONCURRENCY", max_concurrency)),
+            max_queue=int(_setting(env_prefix, "MAX_QUEUE", 32)),
+            queue_timeout=_setting(env_prefix, "QUEUE_TIMEOUT", read_timeout),
+            adaptive=adaptive_enabled(),
+            min_limit=int(_setting(env_prefix, "MIN_CONCURRENCY", 1)),
+        )
+        self.client: Optional[httpx.AsyncClient] = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.new_connections = 0
+        self.pool_timeouts = 0
+        self.errors = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def open(self) -> None:
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                timeout=self.timeout,
+            )
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _trace(self, started: float, state: Dict[str, Any]):
+        # The first connection event marks the end of the wait for a pool slot
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            if state.get("waited") is None and event_name.endswith(".started"):
+                waited = (time.perf_counter() - started) * 1000.0
+                state["waited"] = waited
+                self.wait_ms_total += waited
+                self.wait_ms_max = max(self.wait_ms_max, waited)
+            if event_name == "connection.connect_tcp.started":
+                self.new_connections += 1
+
+        return trace
+
+    async def request(
+        self, method: str, path: str, stream: bool = False, admit: bool = True, **kwargs: Any
+    ) -> httpx.Response:
+        """Send a request; with ``stream`` the body is left unread (caller must ``aclose()``).
+
+        With ``admit`` the call holds an admission slot until the response
+        headers arrive and may raise ``Overloaded`` instead of being sent.
+        """
+        if not admit:
+            return await self._send(method, path, stream, **kwargs)
+        async with self.limiter.slot():
+            return await self._send(method, path, stream, **kwargs)
+
+    async def _send(self, method: str, path: str, stream: bool, **kwargs: Any) -> httpx.Response:
+        if self.client is None:
+            self.open()
+        deadline = request_deadline.get()
+        if deadline is not None:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                raise httpx.ReadTimeout("Request deadline exceeded before the backend call")
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), DEADLINE_HEADER: f"{remaining:.3f}"}
+        started = time.perf_counter()
+        extensions = dict(kwargs.pop("extensions", None) or {})
+        extensions["trace"] = self._trace(started, {})
+        request = self.client.build_request(method, self.url(path), extensions=extensions, **kwargs)
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await self.client.send(request, stream=stream)
+        except httpx.PoolTimeout:
+            self.pool_timeouts += 1
+            raise
+        except httpx.RequestError:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    async def get(self, path: str, **kwargs: Any) -> httpx.Response:
+        # Lightweight lookups (templates, health) bypass admission control
+        return await self.request("GET", path, admit=False, **kwargs)
+
+    async def post(self, path: str, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", path, **kwargs)
+
+    def snapshot(self) -> Dict[str, Any]:
+        requests = self.requests or 1
+        return {
+            "base_url": self.base_url,
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            "keepalive_expiry_s": self.keepalive_expiry,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "saturation": round(self.in_flight / self.max_connections, 4) if self.max_connections else 0.0,
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": max(0, self.requests - self.new_connections - self.errors),
+            "pool_timeouts": self.pool_timeouts,
+            "errors": self.errors,
+            "pool_wait_ms_avg": round(self.wait_ms_total / requests, 3),
+            "pool_wait_ms_max": round(self.wait_ms_max, 3),
+            "admission": self.limiter.snapshot(),
+        }
+
+
+def _quote(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+
+class MultipartStream:
+    """multipart/form-data body that streams the file part chunk by chunk.
+
+    The upload is read from Starlette's spooled file (or given as bytes) while
+    it is sent, so the gateway never holds a second full copy of it.
+
+    The client body is deliberately not piped through as ``request.stream()``:
+    routing needs the file's content type and the form fields first, the
+    dedup fingerprint hashes the file before any backend call, the forwarded
+    form differs from the client's (``mapping`` is dropped towards pdf2json,
+    ``pretty`` added) and the PDF→XML fallback sends the same file a second
+    time. Spooling keeps memory bounded (SpooledTemporaryFile rolls to disk
+    past 1 MB) at the cost of one local disk copy per upload.
+    """
+
+    def __init__(
+        self,
+        fields: Dict[str, str],
+        file: Union[UploadFile, bytes],
+        filename: Optional[str],
+        content_type: Optional[str],
+        file_field: str = "file",
+    ) -> None:
+        self.boundary = secrets.token_hex(16)
+        self.file = file
+        head = b"".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{_quote(name)}"\r\n\r\n'.encode("utf-8")
+            + str(value).encode("utf-8")
+            + b"\r\n"
+            for name, value in fields.items()
+            if value is not None
+        )
+        head += (
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{_quote(file_field)}"; '
+            f'filename="{_quote(filename or "upload")}"\r\n'
+            f"Content-Type: {content_type or 'application/octet-stream'}\r\n\r\n"
+        ).encode("utf-8")
+        self.head = head
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        size = len(file) if isinstance(file, bytes) else file.size
+        self.length = None if size is None else len(self.head) + size + len(self.tail)
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": f"multipart/form-data; boundary={self.boundary}"}
+        if self.length is not None:
+            headers["Content-Length"] = str(self.length)
+        return headers
+
+    def encoded(self, encoding: Optional[str]) -> Tuple[bytes, Dict[str, str]]:
+        """Whole body compressed with ``encoding`` (for in-memory ``bytes`` files only)."""
+        body = self.head + self.file + self.tail
+        headers = {"Content-Type": self.headers["Content-Type"]}
+        if encoding and len(body) >= compression.MIN_BYTES:
+            body = compression.encode(body, encoding)
+            headers["Content-Encoding"] = encoding
+        return body, headers
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield self.head
+        if isinstance(self.file, bytes):
+            yield self.file
+        else:
+            await self.file.seek(0)
+            while True:
+                chunk = await self.file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+        yield self.tail
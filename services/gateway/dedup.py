@@ -0,0 +1,252 @@
+"""
+Duplicate suppression for /process.
+
+Identical requests (same file bytes, filename, template, mapping, pretty and
+Accept) produce identical output, so the gateway avoids running the pipeline
+for them more than once:
+
+- single-flight: concurrent identical requests share one backend call; the
+  first one runs it and the others wait for its result,
+- response cache: a successful response is kept for GATEWAY_CACHE_TTL seconds
+  (default 300, 0 disables) in a byte-bounded LRU,
+- Idempotency-Key: a client-supplied key is bound to the request fingerprint
+  for GATEWAY_IDEMPOTENCY_TTL seconds (default 3600); a retry with the same
+  key replays the stored response, reusing the key for a different request
+  is rejected with 422. The key is claimed for its fingerprint as soon as
+  the request joins a backend call, so a concurrent request with the same
+  key and a different body is rejected too instead of running alongside.
+
+Only 200 responses are stored; errors are shared with in-flight followers
+but never cached, so a retry after a failure runs again.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import Response
+
+HASH_CHUNK_BYTES = 256 * 1024
+
+
+class CachedResponse:
+    """A fully read backend response that can be replayed to several clients."""
+
+    def __init__(self, body: bytes, media_type: str, headers: Dict[str, str]) -> None:
+        self.body = body
+        self.media_type = media_type
+        self.headers = headers
+
+    def to_response(self, **extra_headers: str) -> Response:
+        headers = dict(self.headers)
+        headers.update(extra_headers)
+        return Response(content=self.body, media_type=self.media_type, headers=headers)
+
+
+class ResponseCache:
+    """LRU of ``CachedResponse`` with a per-entry TTL and a total byte budget."""
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[str, Tuple[float, Any, int]]" = OrderedDict()
+        self.size = 0
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value, _size = entry
+        if expires < time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: Any, ttl: float, size: int = 0) -> bool:
+        if ttl <= 0 or size > self.max_entry_bytes:
+            return False
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + ttl, value, size)
+        self.size += size
+        while self.size > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+        return True
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class Deduplicator:
+    """Single-flight + TTL cache + Idempotency-Key bookkeeping."""
+
+    def __init__(
+        self,
+        ttl: float,
+        idempotency_ttl: float,
+        max_bytes: int,
+        max_entry_bytes: int,
+    ) -> None:
+        self.ttl = ttl
+        self.idempotency_ttl = idempotency_ttl
+        self.cache = ResponseCache(max_bytes, max_entry_bytes)
+        self._in_flight: Dict[str, "asyncio.Task[CachedResponse]"] = {}
+        self._waiters: Dict[str, int] = {}
+        # Idempotency-Key slot -> (fingerprint, requests holding it) while its call runs
+        self._claims: Dict[str, Tuple[str, int]] = {}
+        self.requests = 0
+        self.executed = 0
+        self.hits = 0
+        self.coalesced = 0
+        self.replayed = 0
+        self.conflicts = 0
+
+    async def run(
+        self,
+        fingerprint: str,
+        produce: Callable[[], Awaitable[CachedResponse]],
+        idempotency_key: Optional[str] = None,
+    ) -> Tuple[CachedResponse, str]:
+        """Return the response for ``fingerprint`` and how it was obtained.
+
+        The second element is ``miss`` (this call ran the backend), ``hit``
+        (response cache), ``coalesced`` (shared an in-flight call) or
+        ``replayed`` (stored under the Idempotency-Key).
+        """
+        self.requests += 1
+        idem_slot = f"idem:{idempotency_key}" if idempotency_key else None
+        if idem_slot:
+            record = self.cache.get(idem_slot)
+            claim = self._claims.get(idem_slot)
+            bound_fingerprint = record[0] if record is not None else claim[0] if claim is not None else None
+            if bound_fingerprint is not None and bound_fingerprint != fingerprint:
+                self.conflicts += 1
+                raise HTTPException(
+                    status_code=422,
+                    detail="Idempotency-Key was already used for a different request"
+                )
+            if record is not None and record[1] is not None:
+                self.replayed += 1
+                return record[1], "replayed"
+
+        cached = self.cache.get(fingerprint)
+        if cached is not None:
+            self.hits += 1
+            self._remember(idem_slot, fingerprint, cached)
+            return cached, "hit"
+
+        task = self._in_flight.get(fingerprint)
+        outcome = "coalesced"
+        if task is None:
+            task = asyncio.ensure_future(produce())
+            self._in_flight[fingerprint] = task
+            task.add_done_callback(lambda _task: self._in_flight.pop(fingerprint, None))
+            self.executed += 1
+            outcome = "miss"
+        else:
+            self.coalesced += 1
+
+        # Claimed before the first await, so no other body can take the key meanwhile
+        self._claim(idem_slot, fingerprint)
+        # Shielded: a client that goes away must not cancel the call other waiters share
+        self._waiters[fingerprint] = self._waiters.get(fingerprint, 0) + 1
+        try:
+            result = await asyncio.shield(task)
+            if outcome == "miss":
+                self.cache.put(fingerprint, result, self.ttl, len(result.body))
+            self._remember(idem_slot, fingerprint, result)
+        except asyncio.CancelledError:
+            if self._waiters[fingerprint] == 1:
+                # Last one interested: abort the backend call
+                task.cancel()
+            elif outcome == "miss":
+                # The shared call streams this request's upload; keep it open until the call ends
+                await asyncio.wait({task})
+            raise
+        finally:
+            self._waiters[fingerprint] -= 1
+            if not self._waiters[fingerprint]:
+                del self._waiters[fingerprint]
+            self._release(idem_slot)
+        return result, outcome
+
+    def _claim(self, idem_slot: Optional[str], fingerprint: str) -> None:
+        if idem_slot:
+            holders = self._claims.get(idem_slot, (fingerprint, 0))[1]
+            self._claims[idem_slot] = (fingerprint, holders + 1)
+
+    def _release(self, idem_slot: Optional[str]) -> None:
+        # A failed call leaves no record behind, so the key is free for a retry
+        if idem_slot:
+            fingerprint, holders = self._claims[idem_slot]
+            if holders > 1:
+                self._claims[idem_slot] = (fingerprint, holders - 1)
+            else:
+                del self._claims[idem_slot]
+
+    def _remember(self, idem_slot: Optional[str], fingerprint: str, result: CachedResponse) -> None:
+        if idem_slot:
+            self.cache.put(idem_slot, (fingerprint, result), self.idempotency_ttl, len(result.body))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "executed": self.executed,
+            "cache_hits": self.hits,
+            "coalesced": self.coalesced,
+            "idempotent_replays": self.replayed,
+            "idempotency_conflicts": self.conflicts,
+            "in_flight": len(self._in_flight),
+            "idempotency_claims": len(self._claims),
+            "cache_entries": len(self.cache),
+            "cache_bytes": self.cache.size,
+            "ttl_s": self.ttl,
+            "idempotency_ttl_s": self.idempotency_ttl,
+        }
+
+
+async def fingerprint(file: UploadFile, **params: Optional[str]) -> str:
+    """sha256 over the upload bytes, its filename/content type and the request parameters."""
+    digest = hashlib.sha256()
+    for name in sorted(params):
+        digest.update(f"{name}={params[name] or ''}\n".encode("utf-8"))
+    digest.update(f"filename={file.filename or ''}\ncontent_type={file.content_type or ''}\n".encode("utf-8"))
+    await file.seek(0)
+    while True:
+        chunk = await file.read(HASH_CHUNK_BYTES)
+        if not chunk:
+            break
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest()
+
+
+async def capture(response: httpx.Response, media_type: str, headers: Dict[str, str]) -> CachedResponse:
+    """Read a streamed backend response into a replayable ``CachedResponse``."""
+    try:
+        body = await response.aread()
+    finally:
+        await response.aclose()
+    return CachedResponse(body, media_type, headers)
+
+
+def from_env() -> Optional[Deduplicator]:
+    """Deduplicator configured from GATEWAY_* variables, or None when GATEWAY_DEDUP=0."""
+    if os.getenv("GATEWAY_DEDUP", "1").lower() not in {"1", "true", "yes"}:
+        return None
+    return Deduplicator(
+        ttl=float(os.getenv("GATEWAY_CACHE_TTL", "300")),
+        idempotency_ttl=float(os.getenv("GATEWAY_IDEMPOTENCY_TTL", "3600")),
+        max_bytes=int(float(os.getenv("GATEWAY_CACHE_MAX_MB", "64")) * 1024 * 1024),
+        max_entry_bytes=int(float(os.getenv("GATEWAY_CACHE_MAX_ENTRY_MB", "8")) * 1024 * 1024),
+    )
@@ -5,54 +5,261 @@ Single /process endpoint that routes to appropriate backend services
 based on file type and Accept headers.
 """
 
+import asyncio
 import os
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Dict, Optional, Tuple
 
 import httpx
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
-from fastapi.responses import Response, StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 
-app = FastAPI(
-    title="Gateway Service",
-    description="Unified /process endpoint for PDF→JSON, JSON→XML, and PDF→XML conversions",
-    version="1.0.0"
-)
+import compression
+import dedup
+from admission import Overloaded
+from backends import DEADLINE_HEADER, BackendPool, MultipartStream, request_deadline
+from compression import CompressionMiddleware
+from routing import ReplicaSet
 
 # Configuration
+# Comma-separated list for several pdf2json replicas (routed by template, see routing.py)
 PDF2JSON_URL = os.getenv("PDF2JSON_URL", "http://pdf2json:8000")
 JSON2XML_URL = os.getenv("JSON2XML_URL", "http://json2xml:8000")
 MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))  # Default 50MB limit
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+# PDF→XML in one pdf2json call (/process-xml); the pdf2json→json2xml hop stays as fallback
+FUSED_XML = os.getenv("GATEWAY_FUSED_XML", "1").lower() in {"1", "true", "yes"}
+# Room for the multipart envelope and form fields around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_PATHS = {"/process", "/process-artifacts"}
+# Upper bound for one request end to end; clients may ask for less with X-Request-Timeout
+REQUEST_TIMEOUT = float(os.getenv("GATEWAY_REQUEST_TIMEOUT", "300"))
+# How often an in-flight request checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+
+# One keep-alive client and admission limiter per backend for the lifetime of the app
+# (pdf2json runs a CPU-bound pipeline per call, json2xml is cheap)
+pdf2json = ReplicaSet("pdf2json", PDF2JSON_URL, "PDF2JSON", max_concurrency=4)
+json2xml = BackendPool("json2xml", JSON2XML_URL, "JSON2XML", max_concurrency=16)
+BACKENDS = (pdf2json, json2xml)
+# Single-flight + short-TTL response cache + Idempotency-Key for /process (None when GATEWAY_DEDUP=0)
+deduplicator = dedup.from_env()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for backend in BACKENDS:
+        backend.open()
+    try:
+        yield
+    finally:
+        for backend in BACKENDS:
+            await backend.close()
+
+
+app = FastAPI(
+    title="Gateway Service",
+    description="Unified /process endpoint for PDF→JSON, JSON→XML, and PDF→XML conversions",
+    version="1.0.0",
+    lifespan=lifespan,
+)
+
+
+class UploadLimitMiddleware:
+    """Enforce MAX_UPLOAD_MB while the request body arrives.
+
+    A declared Content-Length over the limit is refused before any body is
+    read; otherwise bytes are counted as they are received and the upload is
+    aborted with 413 as soon as the limit is crossed.
+    """
+
+    def __init__(self, app, max_bytes: int, paths: set) -> None:
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        too_large = HTTPException(status_code=413, detail=f"File too large. Maximum size is {MAX_UPLOAD_MB}MB")
+        declared = dict(scope.get("headers") or []).get(b"content-length")
+        if declared and declared.isdigit() and int(declared) > self.max_bytes:
+            await JSONResponse(status_code=413, content={"detail": too_large.detail})(scope, receive, send)
+            return
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI re-raises HTTPException from body parsing as-is
+                    raise too_large
+            return message
+
+        async def tracking_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except HTTPException as exc:
+            if exc.status_code != 413 or started:
+                raise
+            await JSONResponse(status_code=413, content={"detail": exc.detail})(scope, receive, send)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed load with 429 + Retry-After when a backend's admission queue is full."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"{exc.backend} is busy ({exc.reason}), retry later"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES, paths=UPLOAD_PATHS)
+# Outermost: compressed uploads are decoded (never past the upload cap) before the size limit counts them
+app.add_middleware(CompressionMiddleware, max_request_bytes=MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES)
+
+
+def _check_upload_size(file: UploadFile) -> None:
+    """Exact file-size check once the (spooled) upload has been received."""
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size is {MAX_UPLOAD_MB}MB"
+        )
+
+
+async def _read_error(response: httpx.Response) -> httpx.Response:
+    """Load and release a streamed backend response that is not going to be relayed."""
+    await response.aread()
+    await response.aclose()
+    return response
+
+
+def _relay(
+    response: httpx.Response, media_type: str, headers: dict, accept_encoding: Optional[str] = None
+) -> StreamingResponse:
+    """Stream a backend response body to the client chunk by chunk.
+
+    A body the backend already compressed in an encoding the client accepts
+    is forwarded as is, without decoding and re-encoding it here.
+    """
+    encoding = response.headers.get("Content-Encoding")
+    if encoding and compression.accepts(accept_encoding, encoding):
+        body = response.aiter_raw()
+        headers = {**headers, "Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+    else:
+        body = response.aiter_bytes()
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers=headers,
+        background=BackgroundTask(response.aclose),
+    )
+
+def _raise_if_rejected(response: httpx.Response) -> None:
+    """Pass pdf2json preflight rejections (422) and expired deadlines (504) through instead of masking them as 502."""
+    if response.status_code == 504:
+        raise HTTPException(status_code=504, detail="Deadline exceeded")
+    if response.status_code == 422:
+        try:
+            detail = response.json().get("detail", response.text)
+        except ValueError:
+            detail = response.text
+        raise HTTPException(status_code=422, detail=detail)
+
+def _start_deadline(request: Request) -> float:
+    """Set this request's deadline from GATEWAY_REQUEST_TIMEOUT and the client's X-Request-Timeout."""
+    budget = REQUEST_TIMEOUT
+    try:
+        asked = float(request.headers.get(DEADLINE_HEADER) or 0)
+    except ValueError:
+        asked = 0
+    if 0 < asked < budget:
+        budget = asked
+    deadline = asyncio.get_running_loop().time() + budget
+    request_deadline.set(deadline)
+    return deadline
+
+
+async def _until_disconnected(request: Request) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+
+async def _guarded(request: Request, deadline: float, work: Awaitable[Any]) -> Any:
+    """Await ``work`` unless the client disconnects or the deadline passes first.
+
+    Either way the work is cancelled, which aborts its backend call: httpx
+    closes the connection and pdf2json stops the pipeline it was running.
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_until_disconnected(request))
+    remaining = max(0.0, deadline - asyncio.get_running_loop().time())
+    try:
+        done, _ = await asyncio.wait({task, watcher}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+    if task in done:
+        return task.result()
+    task.cancel()
+    # Let the cancellation finish before the request (and its upload) is torn down
+    await asyncio.wait({task})
+    if watcher in done:
+        raise HTTPException(status_code=499, detail="Client closed request")
+    raise HTTPException(status_code=504, detail="Deadline exceeded")
+
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "gateway"}
 
+@app.get("/metrics")
+async def metrics():
+    """Per backend: connection pool usage, admission (limit, queue vs service time); duplicate suppression"""
+    return {
+        "backends": {backend.name: backend.snapshot() for backend in BACKENDS},
+        "dedup": deduplicator.snapshot() if deduplicator else None,
+    }
+
 @app.get("/pdf2json/templates")
 async def proxy_templates():
     """Proxy templates endpoint to PDF2JSON service"""
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(f"{PDF2JSON_URL}/templates")
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"PDF2JSON service error: {response.text}"
-                )
-            
-            return Response(
-                content=response.content,
-                media_type="application/json",
-                headers={"Content-Type": "application/json"}
+        response = await pdf2json.get("/templates", timeout=30.0)
+
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=502,
+                detail=f"PDF2JSON service error: {response.text}"
             )
-            
+
+        return Response(
+            content=response.content,
+            media_type="application/json",
+            headers={"Content-Type": "application/json"}
+        )
+
     except httpx.RequestError as e:
         raise HTTPException(
             status_code=502,
             detail=f"Backend service connection error: {str(e)}"
         )
 
+# Uploads are parsed (spooled) rather than piped through: see MultipartStream for why
 @app.post("/process")
 async def unified_process(
     request: Request,
@@ -73,17 +280,8 @@ async def unified_process(
             detail="Accept header must be 'application/json' or 'application/xml'"
         )
     
-    # Check file size limit
-    file_size = 0
-    content = await file.read()
-    file_size = len(content)
-    await file.seek(0)  # Reset file pointer
-    
-    if file_size > MAX_UPLOAD_MB * 1024 * 1024:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Maximum size is {MAX_UPLOAD_MB}MB"
-        )
+    # Check file size limit (also enforced while the body streams in)
+    _check_upload_size(file)
     
     # Get file content type
     content_type = file.content_type or ""
@@ -114,111 +312,159 @@ async def unified_process(
             detail="Mapping parameter is required when requesting XML output."
         )
     
+    deadline = _start_deadline(request)
+    if deduplicator is None:
+        response, media_type, headers = await _guarded(
+            request, deadline, _dispatch(file, is_pdf, accept_header, mapping, template, pretty)
+        )
+        return _relay(response, media_type, headers, request.headers.get("Accept-Encoding"))
+
+    # Identical requests share one backend call and, for a short while, its response
+    fingerprint = await dedup.fingerprint(
+        file, accept=accept_header, mapping=mapping, template=template, pretty=pretty
+    )
+
+    async def produce() -> dedup.CachedResponse:
+        response, media_type, headers = await _dispatch(file, is_pdf, accept_header, mapping, template, pretty)
+        return await dedup.capture(response, media_type, headers)
+
+    result, outcome = await _guarded(
+        request, deadline, deduplicator.run(fingerprint, produce, request.headers.get("Idempotency-Key"))
+    )
+    extra = {"X-Cache": outcome}
+    if outcome == "replayed":
+        extra["Idempotent-Replayed"] = "true"
+    return result.to_response(**extra)
+
+
+async def _dispatch(
+    file: UploadFile,
+    is_pdf: bool,
+    accept_header: str,
+    mapping: Optional[str],
+    template: Optional[str],
+    pretty: str,
+) -> Tuple[httpx.Response, str, Dict[str, str]]:
+    """Run the backend route for a validated /process request.
+
+    Returns the successful (still streaming) backend response with the media
+    type and headers to answer with; failures raise HTTPException.
+    """
+    is_json = not is_pdf
+
     try:
-        async with httpx.AsyncClient(timeout=300.0) as client:
+        if is_pdf and accept_header == "application/json":
+            # Route 1: PDF + Accept: application/json → Forward to pdf2json service
+            body = MultipartStream({"template": template}, file, file.filename, file.content_type)
+            response = await pdf2json.post("/process", content=body, headers=body.headers, stream=True, route_key=template)
+            if response.status_code != 200:
+                await _read_error(response)
+                _raise_if_rejected(response)
+                raise HTTPException(
+                    status_code=502,
+                    detail=f"PDF2JSON service error: {response.text}"
+                )
             
-            if is_pdf and accept_header == "application/json":
-                # Route 1: PDF + Accept: application/json → Forward to pdf2json service
-                files = {"file": (file.filename, content, file.content_type)}
-                data = {}
-                if template:
-                    data["template"] = template
-                response = await client.post(f"{PDF2JSON_URL}/process", files=files, data=data)
-                
-                if response.status_code != 200:
+            return response, "application/json", {"Content-Type": "application/json"}
+            
+        elif is_pdf and accept_header == "application/xml":
+            # Route 2: PDF + Accept: application/xml + mapping → pdf2json → json2xml pipeline
+            pdf_response = None
+            if FUSED_XML:
+                # Fused: pdf2json converts with the pipeline's json2xml profile in-process
+                body = MultipartStream({"template": template, "pretty": pretty}, file, file.filename, file.content_type)
+                fused = await pdf2json.post("/process-xml", content=body, headers=body.headers, stream=True, route_key=template)
+                if fused.status_code == 200 and fused.headers.get("X-Fused") == "1":
+                    return fused, "application/xml", {
+                        "Content-Type": "application/xml; charset=utf-8",
+                        "X-Stage": "pdf2json+json2xml"
+                    }
+                await _read_error(fused)
+                if fused.status_code == 200:
+                    # Converter not available in pdf2json: finish the JSON it returned on json2xml
+                    pdf_response = fused
+                elif fused.status_code != 404:
+                    if fused.headers.get("X-Failed-Stage") == "json2xml":
+                        raise HTTPException(
+                            status_code=502,
+                            detail=f"JSON2XML service error: {fused.text}"
+                        )
+                    _raise_if_rejected(fused)
                     raise HTTPException(
                         status_code=502,
-                        detail=f"PDF2JSON service error: {response.text}"
+                        detail=f"PDF2JSON service error: {fused.text}"
                     )
-                
-                return Response(
-                    content=response.content,
-                    media_type="application/json",
-                    headers={"Content-Type": "application/json"}
-                )
-                
-            elif is_pdf and accept_header == "application/xml":
-                # Route 2: PDF + Accept: application/xml + mapping → pdf2json → json2xml pipeline
-                
-                # Step 1: Call PDF2JSON
-                files = {"file": (file.filename, content, file.content_type)}
-                data = {}
-                if template:
-                    data["template"] = template
-                pdf_response = await client.post(f"{PDF2JSON_URL}/process", files=files, data=data)
+            
+            if pdf_response is None:
+                # Step 1: Call PDF2JSON (two-hop fallback, e.g. pdf2json without /process-xml)
+                body = MultipartStream({"template": template}, file, file.filename, file.content_type)
+                pdf_response = await pdf2json.post("/process", content=body, headers=body.headers, route_key=template)
+                _raise_if_rejected(pdf_response)
                 
                 if pdf_response.status_code != 200:
                     raise HTTPException(
                         status_code=502,
                         detail=f"PDF2JSON service error: {pdf_response.text}"
                     )
-                
-                # Step 2: Call JSON2XML with the JSON result
-                json_content = pdf_response.content
-                form_data = {
-                    "mapping": mapping,
-                    "pretty": pretty
-                }
-                files = {"file": ("converted.json", json_content, "application/json")}
-                
-                xml_response = await client.post(
-                    f"{JSON2XML_URL}/process", 
-                    files=files,
-                    data=form_data
-                )
-                
-                if xml_response.status_code != 200:
-                    raise HTTPException(
-                        status_code=502,
-                        detail=f"JSON2XML service error: {xml_response.text}"
-                    )
-                
-                return Response(
-                    content=xml_response.content,
-                    media_type="application/xml",
-                    headers={
-                        "Content-Type": "application/xml; charset=utf-8",
-                        "X-Stage": "pdf2json,json2xml"
-                    }
-                )
-                
-            elif is_json and accept_header == "application/xml":
-                # Route 3: JSON + Accept: application/xml + mapping → Forward to json2xml service
-                
-                form_data = {
-                    "mapping": mapping,
-                    "pretty": pretty
-                }
-                files = {"file": (file.filename, content, file.content_type)}
-                
-                response = await client.post(
-                    f"{JSON2XML_URL}/process", 
-                    files=files,
-                    data=form_data
-                )
-                
-                if response.status_code != 200:
-                    raise HTTPException(
-                        status_code=502,
-                        detail=f"JSON2XML service error: {response.text}"
-                    )
-                
-                return Response(
-                    content=response.content,
-                    media_type="application/xml",
-                    headers={
-                        "Content-Type": "application/xml; charset=utf-8",
-                        "X-Stage": "json2xml"
-                    }
+            
+            # Step 2: Call JSON2XML with the JSON result (compressed, it is already in memory).
+            # ``template`` selects the same pipeline profile the fused route converts with.
+            json_content = pdf_response.content
+            form = MultipartStream(
+                {"mapping": mapping, "template": template, "pretty": pretty},
+                json_content,
+                "converted.json",
+                "application/json",
+            )
+            content, headers = form.encoded(compression.negotiate(", ".join(compression.supported())))
+            
+            xml_response = await json2xml.post(
+                "/process",
+                content=content,
+                headers=headers,
+                stream=True
+            )
+            
+            if xml_response.status_code != 200:
+                await _read_error(xml_response)
+                raise HTTPException(
+                    status_code=502,
+                    detail=f"JSON2XML service error: {xml_response.text}"
                 )
-                
-            else:
-                # This should not happen due to earlier validation, but just in case
+            
+            return xml_response, "application/xml", {
+                "Content-Type": "application/xml; charset=utf-8",
+                "X-Stage": "pdf2json,json2xml"
+            }
+            
+        elif is_json and accept_header == "application/xml":
+            # Route 3: JSON + Accept: application/xml + mapping → Forward to json2xml service
+            
+            body = MultipartStream(
+                {"mapping": mapping, "template": template, "pretty": pretty}, file, file.filename, file.content_type
+            )
+            
+            response = await json2xml.post("/process", content=body, headers=body.headers, stream=True)
+            
+            if response.status_code != 200:
+                await _read_error(response)
                 raise HTTPException(
-                    status_code=400,
-                    detail="Invalid combination of file type and Accept header."
+                    status_code=502,
+                    detail=f"JSON2XML service error: {response.text}"
                 )
-                
+            
+            return response, "application/xml", {
+                "Content-Type": "application/xml; charset=utf-8",
+                "X-Stage": "json2xml"
+            }
+            
+        else:
+            # This should not happen due to earlier validation, but just in case
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid combination of file type and Accept header."
+            )
+            
     except httpx.RequestError as e:
         raise HTTPException(
             status_code=502,
@@ -235,20 +481,14 @@ async def process_artifacts(
     request: Request,
     file: UploadFile = File(...),
     mapping: Optional[str] = Form(None),
-    template: Optional[str] = Form(None)
+    template: Optional[str] = Form(None),
+    overlay: Optional[bool] = Form(None),
+    overlay_pages: Optional[str] = Form(None)
 ):
     """Process PDF and return artifacts as ZIP file"""
     
-    # Check file size limit
-    content = await file.read()
-    file_size = len(content)
-    await file.seek(0)  # Reset file pointer
-    
-    if file_size > MAX_UPLOAD_MB * 1024 * 1024:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Maximum size is {MAX_UPLOAD_MB}MB"
-        )
+    # Check file size limit (also enforced while the body streams in)
+    _check_upload_size(file)
     
     # Get file content type
     content_type = file.content_type or ""
@@ -260,30 +500,39 @@ async def process_artifacts(
             detail="Only PDF files are supported for artifact generation."
         )
     
+    deadline = _start_deadline(request)
+    
     try:
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            # Call PDF2JSON artifacts endpoint
-            files = {"file": (file.filename, content, file.content_type)}
-            data = {}
-            if template:
-                data["template"] = template
-            response = await client.post(f"{PDF2JSON_URL}/process-with-artifacts", files=files, data=data)
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"PDF2JSON artifacts service error: {response.text}"
-                )
-            
-            return Response(
-                content=response.content,
-                media_type="application/zip",
-                headers={
-                    "Content-Type": "application/zip",
-                    "Content-Disposition": response.headers.get("Content-Disposition", "attachment; filename=\"artifacts.zip\"")
-                }
+        # Call PDF2JSON artifacts endpoint
+        data = {}
+        if template:
+            data["template"] = template
+        if overlay is not None:
+            data["overlay"] = "true" if overlay else "false"
+        if overlay_pages:
+            data["overlay_pages"] = overlay_pages
+        body = MultipartStream(data, file, file.filename, file.content_type)
+        # pdf2json stores the ZIP members when the archive is compressed for transport;
+        # let it decide on the end client's encodings so the ZIP can be relayed as is
+        headers = {**body.headers, "Accept-Encoding": request.headers.get("Accept-Encoding") or "identity"}
+        response = await _guarded(request, deadline, pdf2json.post(
+            "/process-with-artifacts", content=body, headers=headers, stream=True, route_key=template
+        ))
+        
+        if response.status_code != 200:
+            await _read_error(response)
+            _raise_if_rejected(response)
+            raise HTTPException(
+                status_code=502,
+                detail=f"PDF2JSON artifacts service error: {response.text}"
             )
-                
+        
+        # Stream the ZIP through instead of holding it in memory
+        return _relay(response, "application/zip", {
+            "Content-Type": "application/zip",
+            "Content-Disposition": response.headers.get("Content-Disposition", "attachment; filename=\"artifacts.zip\"")
+        }, request.headers.get("Accept-Encoding"))
+            
     except httpx.RequestError as e:
         raise HTTPException(
             status_code=502,
@@ -0,0 +1,200 @@
+"""
+Template-aware routing across pdf2json replicas.
+
+PDF2JSON_URL may list several replicas (comma separated). Requests are placed
+on a consistent-hash ring by template name so every document of one vendor
+lands on the same replica and hits its warm per-template state (s04
+TemplateCache, compiled configs, anchor indexes). Adding or removing a replica
+only moves the templates that hashed to it.
+
+Bounded load: a replica is skipped when its load (in flight + queued) is above
+``GATEWAY_ROUTING_LOAD_FACTOR`` (default 1.25) times the average, so a burst
+for one vendor spills over to the next replica on the ring instead of
+queueing behind itself. Requests without a template go to the least loaded
+replica.
+
+Health: each replica's /health is polled every GATEWAY_HEALTH_INTERVAL
+seconds (default 5, 0 disables). After GATEWAY_EJECT_AFTER consecutive
+failures (default 2, connection errors on real requests count too) a replica
+is ejected from the ring until a health check succeeds again. If every
+replica is ejected, routing falls back to all of them.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from admission import Overloaded
+from backends import BackendPool
+
+VIRTUAL_NODES = 64
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class Replica:
+    """One pdf2json replica: its pooled client plus health state."""
+
+    def __init__(self, pool: BackendPool) -> None:
+        self.pool = pool
+        self.failures = 0
+        self.ejected = False
+        self.ejections = 0
+        self.routed = 0
+        self.spilled = 0
+
+    @property
+    def load(self) -> int:
+        return self.pool.limiter.load
+
+    def mark_success(self) -> None:
+        self.failures = 0
+        self.ejected = False
+
+    def mark_failure(self, eject_after: int) -> None:
+        self.failures += 1
+        if not self.ejected and self.failures >= eject_after:
+            self.ejected = True
+            self.ejections += 1
+
+
+class ReplicaSet:
+    """Consistent-hash router over ``BackendPool`` replicas with the BackendPool call API."""
+
+    def __init__(self, name: str, urls: str, env_prefix: str, max_concurrency: int = 16) -> None:
+        self.name = name
+        base_urls = [url.strip() for url in urls.split(",") if url.strip()]
+        self.replicas = [
+            Replica(BackendPool(f"{name}[{index}]" if len(base_urls) > 1 else name, url, env_prefix, max_concurrency))
+            for index, url in enumerate(base_urls)
+        ]
+        self.load_factor = float(os.getenv("GATEWAY_ROUTING_LOAD_FACTOR", "1.25"))
+        self.health_interval = float(os.getenv("GATEWAY_HEALTH_INTERVAL", "5"))
+        self.eject_after = max(1, int(os.getenv("GATEWAY_EJECT_AFTER", "2")))
+        self._ring: List[int] = []
+        self._owners: List[Replica] = []
+        for replica in self.replicas:
+            for vnode in range(VIRTUAL_NODES):
+                point = _hash(f"{replica.pool.base_url}#{vnode}")
+                index = bisect.bisect(self._ring, point)
+                self._ring.insert(index, point)
+                self._owners.insert(index, replica)
+        self._health_task: Optional["asyncio.Task[None]"] = None
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def open(self) -> None:
+        for replica in self.replicas:
+            replica.pool.open()
+        if len(self.replicas) > 1 and self.health_interval > 0 and self._health_task is None:
+            self._health_task = asyncio.ensure_future(self._health_loop())
+
+    async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        for replica in self.replicas:
+            await replica.pool.close()
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await asyncio.gather(*(self._probe(replica) for replica in self.replicas))
+
+    async def _probe(self, replica: Replica) -> None:
+        try:
+            response = await replica.pool.get("/health", timeout=min(self.health_interval, 5.0))
+            healthy = response.status_code == 200
+        except httpx.RequestError:
+            healthy = False
+        if healthy:
+            replica.mark_success()
+        else:
+            replica.mark_failure(self.eject_after)
+
+    # -- routing -----------------------------------------------------------
+
+    def candidates(self, route_key: Optional[str]) -> List[Replica]:
+        """Replicas in preference order for ``route_key`` (healthy ones first)."""
+        healthy = [replica for replica in self.replicas if not replica.ejected] or list(self.replicas)
+        if len(healthy) == 1:
+            return healthy
+        if not route_key:
+            return sorted(healthy, key=lambda replica: replica.load)
+
+        # Walk the ring clockwise from the key's point, each replica once
+        ordered: List[Replica] = []
+        start = bisect.bisect(self._ring, _hash(route_key))
+        for offset in range(len(self._ring)):
+            owner = self._owners[(start + offset) % len(self._ring)]
+            if owner in healthy and owner not in ordered:
+                ordered.append(owner)
+                if len(ordered) == len(healthy):
+                    break
+
+        # Bounded load: skip replicas above load_factor × average (counting this request)
+        capacity = math.ceil(self.load_factor * (sum(replica.load for replica in healthy) + 1) / len(healthy))
+        within = [replica for replica in ordered if replica.load < capacity]
+        if within and within[0] is not ordered[0]:
+            within[0].spilled += 1
+        return within + [replica for replica in ordered if replica not in within]
+
+    async def request(
+        self, method: str, path: str, route_key: Optional[str] = None, **kwargs: Any
+    ) -> httpx.Response:
+        """Send to the preferred replica; a refused connection or full queue moves on to the next one."""
+        candidates = self.candidates(route_key)
+        for attempt, replica in enumerate(candidates):
+            replica.routed += 1
+            try:
+                response = await replica.pool.request(method, path, **kwargs)
+            except httpx.ConnectError:
+                replica.mark_failure(self.eject_after)
+                # Nothing reached the replica, so trying the next one is safe
+                if attempt + 1 < len(candidates):
+                    continue
+                raise
+            except Overloaded:
+                if attempt + 1 < len(candidates):
+                    candidates[attempt + 1].spilled += 1
+                    continue
+                raise
+            if replica.failures and response.status_code < 500:
+                replica.mark_success()
+            return response
+        raise httpx.ConnectError(f"No {self.name} replica available")
+
+    async def get(self, path: str, route_key: Optional[str] = None, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", path, route_key=route_key, admit=False, **kwargs)
+
+    async def post(self, path: str, route_key: Optional[str] = None, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", path, route_key=route_key, **kwargs)
+
+    def snapshot(self) -> Dict[str, Any]:
+        if len(self.replicas) == 1:
+            return self.replicas[0].pool.snapshot()
+        return {
+            "replicas": [
+                {
+                    **replica.pool.snapshot(),
+                    "ejected": replica.ejected,
+                    "consecutive_failures": replica.failures,
+                    "ejections": replica.ejections,
+                    "routed": replica.routed,
+                    "spilled_to": replica.spilled,
+                }
+                for replica in self.replicas
+            ],
+            "load_factor": self.load_factor,
+        }
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionLimiter, Overloaded
+from backends import BackendPool
+
+
+def _limiter(limit=1, max_queue=2, queue_timeout=5.0):
+    return AdmissionLimiter("pdf2json", limit=limit, max_queue=max_queue, queue_timeout=queue_timeout, adaptive=False)
+
+
+def test_waiters_are_admitted_in_fifo_order():
+    async def scenario():
+        limiter, order = _limiter(), []
+
+        async def call(name):
+            async with limiter.slot():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(call("a"), call("b"), call("c"))
+        return limiter, order
+
+    limiter, order = asyncio.run(scenario())
+    assert order == ["a", "b", "c"]
+    assert limiter.snapshot()["admitted"] == 3
+    assert limiter.queued_total == 2
+    assert limiter.in_flight == 0
+
+
+def test_full_queue_is_shed_immediately():
+    async def scenario():
+        limiter = _limiter(max_queue=1)
+        await limiter.acquire()
+        queued = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as shed:
+            await limiter.acquire()
+        limiter.release(0.1)
+        await queued
+        return limiter, shed.value
+
+    limiter, shed = asyncio.run(scenario())
+    assert shed.reason == "queue full"
+    assert shed.retry_after >= 1
+    assert limiter.rejected == 1
+
+
+def test_queue_timeout_sheds_and_frees_the_queue():
+    async def scenario():
+        limiter = _limiter(queue_timeout=0.01)
+        await limiter.acquire()
+        with pytest.raises(Overloaded) as shed:
+            await limiter.acquire()
+        return limiter, shed.value
+
+    limiter, shed = asyncio.run(scenario())
+    assert shed.reason == "queue timeout"
+    assert limiter.queue_timeouts == 1
+    assert limiter.snapshot()["queued"] == 0
+
+
+def test_queue_timeout_defaults_to_the_backend_read_timeout(monkeypatch):
+    monkeypatch.setenv("PDF2JSON_READ_TIMEOUT", "120")
+    assert BackendPool("pdf2json", "http://pdf2json:8000", "PDF2JSON").limiter.queue_timeout == 120.0
+
+    monkeypatch.setenv("PDF2JSON_QUEUE_TIMEOUT", "45")
+    assert BackendPool("pdf2json", "http://pdf2json:8000", "PDF2JSON").limiter.queue_timeout == 45.0
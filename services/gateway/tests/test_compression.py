@@ -0,0 +1,108 @@
+import gzip
+import json
+
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import compression
+from compression import CompressionMiddleware
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        (None, None),
+        ("gzip", "gzip"),
+        ("gzip, zstd", "zstd" if compression.zstandard is not None else "gzip"),
+        ("zstd;q=0, gzip", "gzip"),
+        ("*", compression.supported()[0]),
+        ("gzip;q=0", None),
+        ("br", None),
+    ],
+)
+def test_negotiate(header, expected):
+    assert compression.negotiate(header) == expected
+
+
+def test_accepts_already_encoded_bodies():
+    assert compression.accepts("gzip, deflate", "gzip")
+    assert not compression.accepts("gzip;q=0", "gzip")
+    assert not compression.accepts(None, "gzip")
+
+
+async def echo(request: Request):
+    body = await request.body()
+    return JSONResponse({"length": len(body), "head": body[:16].decode("latin-1")})
+
+
+async def big(request: Request):
+    return JSONResponse({"rows": ["x" * 64] * 200})
+
+
+async def small(request: Request):
+    return JSONResponse({"ok": True})
+
+
+async def pdf(request: Request):
+    return Response(b"%PDF-" + b"0" * 4096, media_type="application/pdf")
+
+
+def _client(max_request_bytes=1024 * 1024):
+    app = Starlette(routes=[
+        Route("/echo", echo, methods=["POST"]),
+        Route("/big", big),
+        Route("/small", small),
+        Route("/pdf", pdf),
+    ])
+    return TestClient(CompressionMiddleware(app, max_request_bytes=max_request_bytes))
+
+
+def test_large_responses_are_compressed_small_and_excluded_ones_pass_through():
+    client = _client()
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert len(response.json()["rows"]) == 200
+
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/pdf", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/big", headers={"Accept-Encoding": "identity"}).headers
+
+
+def test_compressed_request_bodies_are_decoded():
+    payload = json.dumps({"rows": list(range(1000))}).encode()
+    response = _client().post(
+        "/echo", content=gzip.compress(payload), headers={"Content-Encoding": "gzip", "Accept-Encoding": "identity"}
+    )
+    assert response.status_code == 200
+    assert response.json()["length"] == len(payload)
+
+
+@pytest.mark.skipif(compression.zstandard is None, reason="zstandard not installed")
+def test_zstd_request_bodies_are_decoded():
+    payload = b"{" + b" " * 50000 + b"}"
+    response = _client().post(
+        "/echo", content=compression.encode(payload, "zstd"), headers={"Content-Encoding": "zstd"}
+    )
+    assert response.json()["length"] == len(payload)
+
+
+@pytest.mark.parametrize("encoding", compression.supported())
+def test_decoded_request_bodies_are_capped(encoding):
+    bomb = compression.encode(b"\0" * (8 * 1024 * 1024), encoding)
+    assert len(bomb) < 64 * 1024
+    response = _client(max_request_bytes=1024 * 1024).post(
+        "/echo", content=bomb, headers={"Content-Encoding": encoding}
+    )
+    assert response.status_code == 413
+
+
+def test_corrupt_and_unknown_request_encodings_are_rejected():
+    client = _client()
+    assert client.post("/echo", content=b"not gzip", headers={"Content-Encoding": "gzip"}).status_code == 400
+    # Encodings the middleware does not handle reach the app unchanged
+    assert client.post("/echo", content=b"abc", headers={"Content-Encoding": "br"}).json()["head"] == "abc"
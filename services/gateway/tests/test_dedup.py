@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import dedup
+
+
+def _dedup(ttl=300.0):
+    return dedup.Deduplicator(ttl=ttl, idempotency_ttl=3600.0, max_bytes=1 << 20, max_entry_bytes=1 << 16)
+
+
+class Backend:
+    """``produce`` stand-in that blocks until released and counts its calls."""
+
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.fail = fail
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.fail:
+            raise HTTPException(status_code=502, detail="backend down")
+        return dedup.CachedResponse(b"<xml/>", "application/xml", {})
+
+
+def test_concurrent_identical_requests_share_one_call():
+    async def scenario():
+        deduplicator, backend = _dedup(), Backend()
+        first = asyncio.ensure_future(deduplicator.run("fp", backend))
+        second = asyncio.ensure_future(deduplicator.run("fp", backend))
+        await asyncio.sleep(0)
+        backend.release.set()
+        results = await asyncio.gather(first, second)
+        third = await deduplicator.run("fp", backend)
+        return backend.calls, [outcome for _result, outcome in results], third[1]
+
+    calls, outcomes, third = asyncio.run(scenario())
+    assert calls == 1
+    assert outcomes == ["miss", "coalesced"]
+    assert third == "hit"
+
+
+def test_idempotency_key_is_claimed_before_the_call_finishes():
+    async def scenario():
+        deduplicator, backend = _dedup(ttl=0), Backend()
+        first = asyncio.ensure_future(deduplicator.run("fp-a", backend, "key-1"))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as rejected:
+            await deduplicator.run("fp-b", backend, "key-1")
+        backend.release.set()
+        await first
+        replay = await deduplicator.run("fp-a", backend, "key-1")
+        with pytest.raises(HTTPException) as later:
+            await deduplicator.run("fp-b", backend, "key-1")
+        return deduplicator, backend.calls, rejected.value, replay[1], later.value
+
+    deduplicator, calls, rejected, replay, later = asyncio.run(scenario())
+    assert calls == 1
+    assert rejected.status_code == 422 and later.status_code == 422
+    assert replay == "replayed"
+    assert deduplicator.snapshot()["idempotency_claims"] == 0
+
+
+def test_failed_call_frees_the_key_and_is_not_cached():
+    async def scenario():
+        deduplicator, failing = _dedup(), Backend(fail=True)
+        failing.release.set()
+        with pytest.raises(HTTPException):
+            await deduplicator.run("fp-a", failing, "key-1")
+        working = Backend()
+        working.release.set()
+        return await deduplicator.run("fp-b", working, "key-1"), working.calls
+
+    (_result, outcome), calls = asyncio.run(scenario())
+    assert outcome == "miss"
+    assert calls == 1
@@ -0,0 +1,85 @@
+import asyncio
+import io
+import json
+
+import httpx
+import pytest
+from starlette.datastructures import Headers, UploadFile
+
+import compression
+import main
+
+
+class Backend:
+    """``post`` stand-in that records each call's form fields and answers from a queue."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    async def post(self, path, content, headers, stream=False, route_key=None):
+        if isinstance(content, bytes):
+            encoding = headers.get("Content-Encoding")
+            body = compression.decode(content, encoding, 1 << 20) if encoding else content
+        else:
+            body = b"".join([chunk async for chunk in content])
+        self.calls.append((path, _fields(body, headers["Content-Type"])))
+        return self.responses.pop(0)
+
+
+def _fields(body, content_type):
+    boundary = content_type.split("boundary=", 1)[1].encode()
+    fields = {}
+    for part in body.split(b"--" + boundary)[1:-1]:
+        head, value = part.strip(b"\r\n").split(b"\r\n\r\n", 1)
+        name = head.split(b'name="', 1)[1].split(b'"', 1)[0].decode()
+        if b"filename=" not in head:
+            fields[name] = value.decode()
+    return fields
+
+
+def _upload(content, filename, content_type):
+    return UploadFile(
+        io.BytesIO(content), size=len(content), filename=filename, headers=Headers({"content-type": content_type})
+    )
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    def install(pdf_responses, xml_responses):
+        pdf2json, json2xml = Backend(*pdf_responses), Backend(*xml_responses)
+        monkeypatch.setattr(main, "pdf2json", pdf2json)
+        monkeypatch.setattr(main, "json2xml", json2xml)
+        monkeypatch.setattr(main, "FUSED_XML", True)
+        return pdf2json, json2xml
+
+    return install
+
+
+def _dispatch(file, is_pdf, template):
+    return asyncio.run(main._dispatch(file, is_pdf, "application/xml", None, template, "0"))
+
+
+def test_fused_fallback_converts_with_the_template_profile(backends):
+    data = json.dumps({"doc_id": "a", "data": {}}).encode()
+    pdf2json, json2xml = backends(
+        [httpx.Response(200, content=data, headers={"X-Fused": "0"})],
+        [httpx.Response(200, content=b"<xml/>")],
+    )
+    _response, _media_type, headers = _dispatch(
+        _upload(b"%PDF-1.7", "a.pdf", "application/pdf"), True, "invoice_pt_kass.json"
+    )
+
+    assert headers["X-Stage"] == "pdf2json,json2xml"
+    assert pdf2json.calls == [("/process-xml", {"template": "invoice_pt_kass.json", "pretty": "0"})]
+    assert json2xml.calls == [("/process", {"template": "invoice_pt_kass.json", "pretty": "0"})]
+
+
+def test_json_uploads_convert_with_the_template_profile(backends):
+    _pdf2json, json2xml = backends([], [httpx.Response(200, content=b"<xml/>")])
+    _dispatch(_upload(b"{}", "a.json", "application/json"), False, "invoice_pt_rittal.json")
+    assert json2xml.calls == [("/process", {"template": "invoice_pt_rittal.json", "pretty": "0"})]
+
+    json2xml.responses.append(httpx.Response(200, content=b"<xml/>"))
+    _dispatch(_upload(b"{}", "a.json", "application/json"), False, None)
+    assert json2xml.calls[1] == ("/process", {"pretty": "0"})
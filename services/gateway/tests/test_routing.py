@@ -0,0 +1,64 @@
+from routing import ReplicaSet
+
+URLS = ["http://pdf2json-a:8000", "http://pdf2json-b:8000", "http://pdf2json-c:8000"]
+TEMPLATES = [f"invoice_pt_vendor_{index}.json" for index in range(200)]
+
+
+def _replicas(urls=URLS):
+    return ReplicaSet("pdf2json", ",".join(urls), "PDF2JSON", max_concurrency=4)
+
+
+def _owners(replica_set):
+    return {template: replica_set.candidates(template)[0].pool.base_url for template in TEMPLATES}
+
+
+def _set_load(replica, load):
+    replica.pool.limiter.in_flight = load
+
+
+def test_templates_stick_to_one_replica_and_spread_over_all():
+    replica_set = _replicas()
+    owners = _owners(replica_set)
+    assert owners == _owners(replica_set)
+    assert set(owners.values()) == set(URLS)
+    assert all(len(replica_set.candidates(template)) == len(URLS) for template in TEMPLATES[:5])
+
+
+def test_adding_a_replica_only_moves_templates_to_it():
+    before = _owners(_replicas())
+    after = _owners(_replicas(URLS + ["http://pdf2json-d:8000"]))
+    moved = [template for template in TEMPLATES if before[template] != after[template]]
+    assert moved
+    assert all(after[template] == "http://pdf2json-d:8000" for template in moved)
+    assert len(moved) < len(TEMPLATES) / 2
+
+
+def test_ejected_replica_is_skipped_until_it_recovers():
+    replica_set = _replicas()
+    template = TEMPLATES[0]
+    preferred = replica_set.candidates(template)[0]
+    for _ in range(replica_set.eject_after):
+        preferred.mark_failure(replica_set.eject_after)
+    assert preferred not in replica_set.candidates(template)
+
+    preferred.mark_success()
+    assert replica_set.candidates(template)[0] is preferred
+
+
+def test_overloaded_owner_spills_to_the_next_replica():
+    replica_set = _replicas()
+    template = TEMPLATES[0]
+    ordered = replica_set.candidates(template)
+    _set_load(ordered[0], 6)
+
+    spilled = replica_set.candidates(template)
+    assert spilled[0] is ordered[1]
+    assert spilled[-1] is ordered[0]
+    assert ordered[1].spilled == 1
+
+
+def test_requests_without_template_go_to_the_least_loaded_replica():
+    replica_set = _replicas()
+    for replica, load in zip(replica_set.replicas, (3, 1, 2)):
+        _set_load(replica, load)
+    assert [replica.load for replica in replica_set.candidates(None)] == [1, 2, 3]
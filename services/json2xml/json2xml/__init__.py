@@ -2,7 +2,7 @@
 
 __version__ = "1.0.0"
 
-from .converter import convert_json_to_xml
+from .converter import compile_mapping, convert_json_to_xml
 from .mapping import load_mapping
 
-__all__ = ["convert_json_to_xml", "load_mapping"]
\ No newline at end of file
+__all__ = ["compile_mapping", "convert_json_to_xml", "load_mapping"]
\ No newline at end of file
@@ -3,8 +3,11 @@
 import ast
 import json
 import operator
+import threading
+from collections import OrderedDict
 from decimal import Decimal
-from typing import Any, Dict, List, Optional, Union
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from lxml import etree
 from .formatting import format_decimal
 from .mapping import resolve_mapping_placeholders
@@ -40,39 +43,61 @@ SAFE_FUNCTIONS = {
 }
 
 
-def parse_jsonpath(path: str, data: Any) -> Any:
-    """Simple JSONPath parser supporting basic selectors like $.field and $.array[*]."""
+@lru_cache(maxsize=1024)
+def compile_jsonpath(path: str) -> Callable[[Any], Any]:
+    """Compile a simple JSONPath ($.field, $.array[*]) into a selector function.
+
+    The path is split once; the returned selector walks the pre-split steps.
+    An invalid path compiles to a selector that raises ``ConversionError`` when
+    used, so the error surfaces at the same point as before compilation.
+    """
     if not path.startswith('$'):
-        raise ConversionError(f"JSONPath must start with '$': {path}")
-    
+        return _fail(f"JSONPath must start with '$': {path}")
+
     # Remove leading '$.'
     path = path[1:]
     if path.startswith('.'):
         path = path[1:]
-    
+
     if not path:
-        return data
-    
-    current = data
-    parts = path.split('.')
-    
-    for part in parts:
-        if '[*]' in part:
-            # Handle array access like "items[*]"
-            field_name = part.replace('[*]', '')
-            if field_name and field_name in current:
-                current = current[field_name]
-            if isinstance(current, list):
-                return current
-            else:
+        return _identity
+
+    steps = tuple((part.replace('[*]', ''), '[*]' in part) for part in path.split('.'))
+
+    def select(data: Any) -> Any:
+        current = data
+        for field_name, is_array in steps:
+            if is_array:
+                # Handle array access like "items[*]"
+                if field_name and field_name in current:
+                    current = current[field_name]
+                if isinstance(current, list):
+                    return current
                 raise ConversionError(f"Expected array at path {path}, got {type(current)}")
-        else:
-            if isinstance(current, dict) and part in current:
-                current = current[part]
+            if isinstance(current, dict) and field_name in current:
+                current = current[field_name]
             else:
                 return None
-    
-    return current
+        return current
+
+    return select
+
+
+
+def parse_jsonpath(path: str, data: Any) -> Any:
+    """Simple JSONPath parser supporting basic selectors like $.field and $.array[*]."""
+    return compile_jsonpath(path)(data)
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _fail(message: str) -> Callable[..., Any]:
+    """A compiled step that raises ``ConversionError(message)`` when it runs."""
+    def fail(*_args: Any) -> Any:
+        raise ConversionError(message)
+    return fail
 
 
 def format_field_value(value: Any, format_config: Optional[Dict[str, Any]] = None) -> str:
@@ -92,168 +117,201 @@ def format_field_value(value: Any, format_config: Optional[Dict[str, Any]] = Non
         return str(value)
 
 
-def _evaluate_expression(expression: str, context: Dict[str, Any]) -> Any:
-    """Safely evaluate a limited arithmetic/string expression."""
+@lru_cache(maxsize=256)
+def compile_expression(expression: str) -> Callable[[Dict[str, Any]], Any]:
+    """Compile a limited arithmetic/string expression into an evaluator over a context dict.
+
+    The expression is parsed and checked once; only the operators in
+    ALLOWED_BINARY_OPERATORS / ALLOWED_UNARY_OPERATORS, constants, context
+    names and SAFE_FUNCTIONS calls are compiled. Anything else compiles to a
+    step that raises ``ConversionError`` when evaluated.
+    """
     try:
         parsed = ast.parse(expression, mode="eval")
     except SyntaxError as exc:
-        raise ConversionError(f"Invalid expression '{expression}': {exc}") from exc
-
-    def _eval(node: ast.AST) -> Any:
-        if isinstance(node, ast.Expression):
-            return _eval(node.body)
-        if isinstance(node, ast.Constant):
-            return node.value
-        if isinstance(node, ast.Num):  # pragma: no cover - legacy for <3.8 ast
-            return node.n
-        if isinstance(node, ast.BinOp):
-            op_type = type(node.op)
-            if op_type not in ALLOWED_BINARY_OPERATORS:
-                raise ConversionError(f"Unsupported binary operator: {ast.dump(node.op)}")
-            left = _eval(node.left)
-            right = _eval(node.right)
-            return ALLOWED_BINARY_OPERATORS[op_type](left, right)
-        if isinstance(node, ast.UnaryOp):
-            op_type = type(node.op)
-            if op_type not in ALLOWED_UNARY_OPERATORS:
-                raise ConversionError(f"Unsupported unary operator: {ast.dump(node.op)}")
-            operand = _eval(node.operand)
-            return ALLOWED_UNARY_OPERATORS[op_type](operand)
-        if isinstance(node, ast.Name):
-            if node.id in context:
-                return context[node.id]
-            if node.id in SAFE_FUNCTIONS:
-                return SAFE_FUNCTIONS[node.id]
-            raise ConversionError(f"Unknown identifier '{node.id}' in expression '{expression}'")
-        if isinstance(node, ast.Call):
-            func = _eval(node.func)
-            if func not in SAFE_FUNCTIONS.values():
+        return _fail(f"Invalid expression '{expression}': {exc}")
+    return _compile_node(parsed.body, expression)
+
+
+
+def _compile_node(node: ast.AST, expression: str) -> Callable[[Dict[str, Any]], Any]:
+    if isinstance(node, ast.Constant):
+        constant = node.value
+        return lambda context: constant
+    if isinstance(node, ast.BinOp):
+        binary_op = ALLOWED_BINARY_OPERATORS.get(type(node.op))
+        if binary_op is None:
+            return _fail(f"Unsupported binary operator: {ast.dump(node.op)}")
+        left = _compile_node(node.left, expression)
+        right = _compile_node(node.right, expression)
+        return lambda context: binary_op(left(context), right(context))
+    if isinstance(node, ast.UnaryOp):
+        unary_op = ALLOWED_UNARY_OPERATORS.get(type(node.op))
+        if unary_op is None:
+            return _fail(f"Unsupported unary operator: {ast.dump(node.op)}")
+        operand = _compile_node(node.operand, expression)
+        return lambda context: unary_op(operand(context))
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name in SAFE_FUNCTIONS:
+            function = SAFE_FUNCTIONS[name]
+            return lambda context: context[name] if name in context else function
+        message = f"Unknown identifier '{name}' in expression '{expression}'"
+
+        def lookup(context: Dict[str, Any]) -> Any:
+            if name in context:
+                return context[name]
+            raise ConversionError(message)
+        return lookup
+    if isinstance(node, ast.Call):
+        func = _compile_node(node.func, expression)
+        args = [_compile_node(arg, expression) for arg in node.args]
+        kwargs = [(kw.arg, _compile_node(kw.value, expression)) for kw in node.keywords]
+
+        def call(context: Dict[str, Any]) -> Any:
+            function = func(context)
+            if function not in SAFE_FUNCTIONS.values():
                 raise ConversionError(f"Unsupported function call in expression '{expression}'")
-            args = [_eval(arg) for arg in node.args]
-            kwargs = {kw.arg: _eval(kw.value) for kw in node.keywords}
-            return func(*args, **kwargs)
-        raise ConversionError(f"Unsupported expression component: {ast.dump(node)}")
+            return function(
+                *[arg(context) for arg in args],
+                **{key: value(context) for key, value in kwargs}
+            )
+        return call
+    return _fail(f"Unsupported expression component: {ast.dump(node)}")
 
-    return _eval(parsed)
 
+def _evaluate_expression(expression: str, context: Dict[str, Any]) -> Any:
+    """Safely evaluate a limited arithmetic/string expression."""
+    return compile_expression(expression)(context)
 
-def _resolve_input_spec(
-    spec: Any,
-    current_data: Any,
-    root_data: Any,
-    field_value: Any
-) -> Any:
-    """Resolve an input specification for computations."""
+
+def _compile_input_spec(spec: Any) -> Callable[[Any, Any, Any], Any]:
+    """Compile an input specification into ``resolve(current_data, root_data, field_value)``."""
     if isinstance(spec, dict):
         source = spec.get("source")
         if source == "field":
-            return field_value
+            return lambda current_data, root_data, field_value: field_value
         if "value" in spec:
-            return spec["value"]
-        context = spec.get("context", "current")
-        target = root_data if context == "root" else current_data
+            constant = spec["value"]
+            return lambda current_data, root_data, field_value: constant
         if "path" in spec:
-            return parse_jsonpath(spec["path"], target)
+            select = compile_jsonpath(spec["path"])
+            if spec.get("context", "current") == "root":
+                return lambda current_data, root_data, field_value: select(root_data)
+            return lambda current_data, root_data, field_value: select(current_data)
     elif isinstance(spec, str):
         if spec == "field":
-            return field_value
+            return lambda current_data, root_data, field_value: field_value
         if spec.startswith("$"):
-            return parse_jsonpath(spec, current_data)
-    return spec
+            select = compile_jsonpath(spec)
+            return lambda current_data, root_data, field_value: select(current_data)
+    return lambda current_data, root_data, field_value: spec
 
 
-def compute_field_value(
+def _resolve_input_spec(
+    spec: Any,
+    current_data: Any,
+    root_data: Any,
+    field_value: Any
+) -> Any:
+    """Resolve an input specification for computations."""
+    return _compile_input_spec(spec)(current_data, root_data, field_value)
+
+
+def _compile_field_source(field_config: Dict[str, Any]) -> Callable[[Any], Any]:
+    """Base value of a field: its path, its literal value, or None."""
+    if "path" in field_config:
+        return compile_jsonpath(field_config["path"])
+    if "value" in field_config:
+        constant = field_config["value"]
+        return lambda current_data: constant
+    return lambda current_data: None
+
+
+def _compile_computation(
     field_config: Dict[str, Any],
-    current_data: Dict[str, Any],
-    root_data: Dict[str, Any],
     computations: Dict[str, Any]
-) -> str:
-    """Compute a derived field value using mapping-provided instructions."""
+) -> Callable[[Any, Any], str]:
+    """Compile a computed field into ``compute(current_data, root_data) -> str``."""
 
     computation_name = field_config.get("compute")
     if not computation_name:
-        raise ConversionError("Field configuration missing 'compute' key")
+        return _fail("Field configuration missing 'compute' key")
 
     computation = computations.get(computation_name)
     if computation is None:
-        raise ConversionError(f"Unknown computation '{computation_name}'")
+        return _fail(f"Unknown computation '{computation_name}'")
+
+    source = _compile_field_source(field_config)
 
     # Check for builtin function (special handling for party resolution, etc.)
     builtin = computation.get("builtin")
     if builtin:
-        if builtin == "resolve_buyer_field":
-            # Special handling for buyer party resolution
-            # Extract buyer_name from path
-            if "path" in field_config:
-                buyer_name = parse_jsonpath(field_config["path"], current_data)
-            elif "value" in field_config:
-                buyer_name = field_config["value"]
-            else:
-                buyer_name = None
-
+        if builtin != "resolve_buyer_field":
+            return _fail(f"Unknown builtin function '{builtin}'")
+        # Get field name from parameters
+        field_name = field_config.get("parameters", {}).get("field") or computation.get("parameters", {}).get("field")
+
+        def resolve_buyer(current_data: Any, root_data: Any) -> str:
+            # Special handling for buyer party resolution: buyer_name comes from path/value
+            buyer_name = source(current_data)
             if not buyer_name:
                 return ""
-
-            # Get field name from parameters
-            field_name = field_config.get("parameters", {}).get("field") or computation.get("parameters", {}).get("field")
             if not field_name:
                 raise ConversionError(f"resolve_buyer_field requires 'field' parameter")
-
             try:
                 result = get_buyer_field(str(buyer_name), field_name)
                 return result or ""
             except Exception as exc:
                 raise ConversionError(f"Buyer field resolution failed: {exc}") from exc
-        else:
-            raise ConversionError(f"Unknown builtin function '{builtin}'")
-
-    # Determine base field value (from path or literal)
-    if "path" in field_config:
-        field_value = parse_jsonpath(field_config["path"], current_data)
-    elif "value" in field_config:
-        field_value = field_config["value"]
-    else:
-        field_value = None
-
-    context: Dict[str, Any] = {}
+        return resolve_buyer
 
     # Merge computation-level inputs with field-level overrides
-    comp_inputs = computation.get("inputs", {})
-    field_inputs = field_config.get("inputs", {})
-    for key in set(comp_inputs.keys()) | set(field_inputs.keys()):
-        if key in field_inputs:
-            spec = field_inputs[key]
-        else:
-            spec = comp_inputs[key]
-        context[key] = _resolve_input_spec(spec, current_data, root_data, field_value)
+    specs = dict(computation.get("inputs", {}))
+    specs.update(field_config.get("inputs", {}))
+    inputs = [(key, _compile_input_spec(spec)) for key, spec in specs.items()]
 
-    if "value" not in context and field_value is not None:
-        context["value"] = field_value
-
-    # Add parameters (constants)
+    # Parameters (constants)
+    constants: Dict[str, Any] = {}
     for params_source in (computation.get("parameters", {}), field_config.get("parameters", {})):
         if params_source:
-            context.update(params_source)
+            constants.update(params_source)
 
     expression = computation.get("expression")
-    if not expression:
-        # For builtin functions, expression is not required
-        if not computation.get("builtin"):
+    evaluate = compile_expression(expression) if expression else None
+    format_cfg = field_config.get("format") or computation.get("format")
+
+    def compute(current_data: Any, root_data: Any) -> str:
+        field_value = source(current_data)
+        context = {key: resolve(current_data, root_data, field_value) for key, resolve in inputs}
+        if "value" not in context and field_value is not None:
+            context["value"] = field_value
+        context.update(constants)
+
+        if evaluate is None:
             raise ConversionError(f"Computation '{computation_name}' missing expression definition")
-        return ""
+        try:
+            result = evaluate(context)
+        except ConversionError as exc:
+            raise ConversionError(f"Computation '{computation_name}' failed: {exc}") from exc
 
-    try:
-        result = _evaluate_expression(expression, context)
-    except ConversionError as exc:
-        raise ConversionError(f"Computation '{computation_name}' failed: {exc}") from exc
+        if result is None:
+            return ""
+        if format_cfg:
+            return format_field_value(result, format_cfg)
+        return str(result)
 
-    if result is None:
-        return ""
+    return compute
 
-    format_cfg = field_config.get("format") or computation.get("format")
-    if format_cfg:
-        return format_field_value(result, format_cfg)
-    return str(result)
+
+def compute_field_value(
+    field_config: Dict[str, Any],
+    current_data: Dict[str, Any],
+    root_data: Dict[str, Any],
+    computations: Dict[str, Any]
+) -> str:
+    """Compute a derived field value using mapping-provided instructions."""
+    return _compile_computation(field_config, computations)(current_data, root_data)
 
 
 def _is_field_definition(value: Dict[str, Any]) -> bool:
@@ -261,6 +319,103 @@ def _is_field_definition(value: Dict[str, Any]) -> bool:
     return any(key in value for key in field_keys)
 
 
+def _compile_field(field_config: Dict[str, Any], computations: Dict[str, Any]) -> Callable[[Any, Any], str]:
+    if field_config.get("compute"):
+        return _compile_computation(field_config, computations)
+    source = _compile_field_source(field_config)
+    format_cfg = field_config.get("format")
+    if format_cfg:
+        return lambda current_data, root_data: format_field_value(source(current_data), format_cfg)
+
+    def plain(current_data: Any, root_data: Any) -> str:
+        raw_value = source(current_data)
+        return "" if raw_value is None else str(raw_value)
+    return plain
+
+
+def compile_structure(
+    structure: Union[str, Dict[str, Any], List[Any]],
+    computations: Dict[str, Any]
+) -> Callable[[etree._Element, Any, Any], None]:
+    """Compile a structure definition into ``emit(parent, data, root_data)``."""
+
+    if isinstance(structure, str):
+        # String value - could be literal or JSONPath
+        if structure.startswith('$'):
+            select = compile_jsonpath(structure)
+
+            def emit_path(parent: etree._Element, data: Any, root_data: Any) -> None:
+                value = select(data)
+                parent.text = str(value) if value is not None else ""
+            return emit_path
+
+        def emit_literal(parent: etree._Element, data: Any, root_data: Any) -> None:
+            parent.text = structure
+        return emit_literal
+
+    if isinstance(structure, dict):
+        children = [
+            _compile_child(key, value, computations)
+            for key, value in structure.items()
+            if key != "_array"
+        ]
+
+        def emit_children(parent: etree._Element, data: Any, root_data: Any) -> None:
+            for emit in children:
+                emit(parent, data, root_data)
+        return emit_children
+
+    return lambda parent, data, root_data: None
+
+
+def _compile_child(key: str, value: Any, computations: Dict[str, Any]) -> Callable[[etree._Element, Any, Any], None]:
+    if isinstance(value, dict) and "_array" in value:
+        resolve_items = _compile_input_spec(value["_array"])
+        item_tag, item_structure = next(
+            ((item_key, item_value) for item_key, item_value in value.items() if item_key != "_array"),
+            (None, None)
+        )
+        emit_item = compile_structure(item_structure, computations) if item_structure and item_tag else None
+
+        def emit_array(parent: etree._Element, data: Any, root_data: Any) -> None:
+            array_data = resolve_items(data, root_data, None)
+            if array_data and isinstance(array_data, list):
+                container = etree.SubElement(parent, key)
+                if emit_item is not None:
+                    for item_data in array_data:
+                        emit_item(etree.SubElement(container, item_tag), item_data, root_data)
+        return emit_array
+
+    if isinstance(value, dict) and _is_field_definition(value):
+        render = _compile_field(value, computations)
+
+        def emit_field(parent: etree._Element, data: Any, root_data: Any) -> None:
+            child = etree.SubElement(parent, key)
+            child.text = render(data, root_data)
+        return emit_field
+
+    if isinstance(value, dict):
+        emit_nested = compile_structure(value, computations)
+
+        def emit_element(parent: etree._Element, data: Any, root_data: Any) -> None:
+            emit_nested(etree.SubElement(parent, key), data, root_data)
+        return emit_element
+
+    if isinstance(value, str) and value.startswith('$'):
+        select = compile_jsonpath(value)
+
+        def emit_selected(parent: etree._Element, data: Any, root_data: Any) -> None:
+            resolved = select(data)
+            etree.SubElement(parent, key).text = "" if resolved is None else str(resolved)
+        return emit_selected
+
+    text = "" if value is None else str(value)
+
+    def emit_text(parent: etree._Element, data: Any, root_data: Any) -> None:
+        etree.SubElement(parent, key).text = text
+    return emit_text
+
+
 def process_structure(
     structure: Union[str, Dict[str, Any], List[Any]], 
     parent: etree.Element, 
@@ -269,71 +424,56 @@ def process_structure(
     computations: Dict[str, Any]
 ) -> None:
     """Recursively process structure definition to build XML."""
+    compile_structure(structure, computations)(parent, data, root_data)
 
-    if isinstance(structure, str):
-        # String value - could be literal or JSONPath
-        if structure.startswith('$'):
-            # JSONPath reference
-            value = parse_jsonpath(structure, data)
-            parent.text = str(value) if value is not None else ""
+
+class CompiledMapping:
+    """A mapping with placeholders resolved and its structure compiled into closures."""
+
+    def __init__(self, mapping: Dict[str, Any]) -> None:
+        root_config = mapping['root']
+        self.root_tag = root_config['tag']
+        self.root_nsmap = root_config.get('nsmap', {})
+        self.emit = compile_structure(mapping.get('structure', {}), mapping.get('computations', {}))
+
+    def build(self, data: Any) -> etree._Element:
+        if self.root_nsmap:
+            root_element = etree.Element(self.root_tag, nsmap=self.root_nsmap)
         else:
-            # Literal value
-            parent.text = structure
-    
-    elif isinstance(structure, dict):
-        # Dictionary structure - process each key-value pair
-        for key, value in structure.items():
-            if key == "_array":
-                continue
-
-            if isinstance(value, dict) and "_array" in value:
-                array_spec = value["_array"]
-                array_data = _resolve_input_spec(array_spec, data, root_data, None)
-
-                if array_data and isinstance(array_data, list):
-                    container = etree.SubElement(parent, key)
-
-                    item_structure = None
-                    item_tag = None
-                    for item_key, item_value in value.items():
-                        if item_key != "_array":
-                            item_tag = item_key
-                            item_structure = item_value
-                            break
-
-                    if item_structure and item_tag:
-                        for item_data in array_data:
-                            item_element = etree.SubElement(container, item_tag)
-                            process_structure(item_structure, item_element, item_data, root_data, computations)
-                continue
-
-            if isinstance(value, dict) and _is_field_definition(value):
-                child = etree.SubElement(parent, key)
-                if value.get("compute"):
-                    child.text = compute_field_value(value, data, root_data, computations)
-                else:
-                    if "path" in value:
-                        raw_value = parse_jsonpath(value["path"], data)
-                    elif "value" in value:
-                        raw_value = value["value"]
-                    else:
-                        raw_value = None
-                    if value.get("format"):
-                        child.text = format_field_value(raw_value, value.get("format"))
-                    else:
-                        child.text = "" if raw_value is None else str(raw_value)
-                continue
-
-            if isinstance(value, dict):
-                child = etree.SubElement(parent, key)
-                process_structure(value, child, data, root_data, computations)
-            else:
-                child = etree.SubElement(parent, key)
-                if isinstance(value, str) and value.startswith('$'):
-                    resolved = parse_jsonpath(value, data)
-                    child.text = "" if resolved is None else str(resolved)
-                else:
-                    child.text = "" if value is None else str(value)
+            root_element = etree.Element(self.root_tag)
+        self.emit(root_element, data, data)
+        return root_element
+
+
+# Compiled plans per (mapping object, params); the mapping is kept so its id stays unique
+_PLAN_CACHE: "OrderedDict[Tuple[int, str], Tuple[Dict[str, Any], CompiledMapping]]" = OrderedDict()
+_PLAN_CACHE_SIZE = 64
+_PLAN_CACHE_LOCK = threading.Lock()
+
+
+def compile_mapping(mapping: Dict[str, Any], params: Optional[Dict[str, str]] = None) -> CompiledMapping:
+    """Resolve placeholders and compile ``mapping``; cached for the same mapping object and params.
+
+    Placeholders falling back to environment variables are resolved when the
+    plan is first compiled.
+    """
+    try:
+        key = (id(mapping), json.dumps(params, sort_keys=True))
+    except (TypeError, ValueError):
+        return CompiledMapping(resolve_mapping_placeholders(mapping, params))
+
+    with _PLAN_CACHE_LOCK:
+        cached = _PLAN_CACHE.get(key)
+        if cached is not None and cached[0] is mapping:
+            _PLAN_CACHE.move_to_end(key)
+            return cached[1]
+
+    compiled = CompiledMapping(resolve_mapping_placeholders(mapping, params))
+    with _PLAN_CACHE_LOCK:
+        _PLAN_CACHE[key] = (mapping, compiled)
+        while len(_PLAN_CACHE) > _PLAN_CACHE_SIZE:
+            _PLAN_CACHE.popitem(last=False)
+    return compiled
 
 
 def convert_json_to_xml(
@@ -353,26 +493,8 @@ def convert_json_to_xml(
     else:
         data = json_data
     
-    # Resolve placeholders in mapping
-    resolved_mapping = resolve_mapping_placeholders(mapping, params)
-    
-    # Get root configuration
-    root_config = resolved_mapping['root']
-    root_tag = root_config['tag']
-    root_nsmap = root_config.get('nsmap', {})
-    
-    # Create root element
-    if root_nsmap:
-        root_element = etree.Element(root_tag, nsmap=root_nsmap)
-    else:
-        root_element = etree.Element(root_tag)
-    
-    # Get structure definition and computations
-    structure = resolved_mapping.get('structure', {})
-    computations = resolved_mapping.get('computations', {})
-    
-    # Process structure
-    process_structure(structure, root_element, data, data, computations)
+    # Resolve placeholders and run the compiled plan
+    root_element = compile_mapping(mapping, params).build(data)
     
     # Convert to bytes
     if pretty:
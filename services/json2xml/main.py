@@ -2,11 +2,11 @@
 Config-driven JSON→XML conversion service.
 
 Endpoints:
-- POST /process — Convert uploaded JSON using a profile defined in the pipeline config
+- POST /process — Convert uploaded JSON using a profile defined in a pipeline config
+- GET /profiles — Loaded pipelines, profiles and mapping cache state
 - GET /health — Health check
 """
 
-import importlib
 import json
 import os
 from pathlib import Path
@@ -15,14 +15,16 @@ from typing import Any, Dict, Optional
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException
 from fastapi.responses import Response
 
-from json2xml.mapping import load_mapping, MappingError
+from json2xml.mapping import MappingError
 from json2xml.converter import ConversionError
+from compression import CompressionMiddleware
+import registry as profile_registry
+from registry import RegistryError
 
 DEFAULT_PIPELINE = os.getenv("PIPELINE_CONFIG") or os.getenv("DEFAULT_PIPELINE") or "invoice_pt_simon.json"
 
 
-def _find_pipeline_config(filename: str) -> Path:
-    name = Path(filename).name
+def _config_dirs() -> list[Path]:
     here = Path(__file__).resolve()
     service_dir = here.parent
     services_dir = service_dir.parent
@@ -33,10 +35,12 @@ def _find_pipeline_config(filename: str) -> Path:
         candidates.append(Path(env_dir))
     candidates.append(services_dir / "config")
     candidates.append(service_dir / "config")
+    return candidates
+
 
-    for base in candidates:
-        if base is None:
-            continue
+def _find_pipeline_config(filename: str) -> Path:
+    name = Path(filename).name
+    for base in _config_dirs():
         candidate = base / name
         if candidate.exists():
             return candidate
@@ -76,9 +80,8 @@ service_mappings_dir = SERVICE_DIR / "mappings"
 if service_mappings_dir not in CONFIG_SEARCH_ROOTS:
     CONFIG_SEARCH_ROOTS.append(service_mappings_dir)
 
-JSON2XML_PROFILES: Dict[str, Dict[str, Any]] = (
-    PIPELINE_CONFIG.get("json2xml", {}) or {}
-).get("profiles", {})
+# Profiles of every enabled pipeline config, resolved and validated once at startup
+PROFILES = profile_registry.from_env(_config_dirs(), CONFIG_SEARCH_ROOTS, PIPELINE_PATH.name)
 
 
 app = FastAPI(
@@ -86,41 +89,8 @@ app = FastAPI(
     description="Convert JSON to XML using config-driven mappings",
     version="1.0.0"
 )
-
-
-def _resolve_profile(profile: str) -> Dict[str, Any]:
-    profile_conf = JSON2XML_PROFILES.get(profile)
-    if profile_conf is None:
-        raise HTTPException(status_code=404, detail=f"Profile '{profile}' not found")
-    if "mapping" not in profile_conf:
-        raise HTTPException(status_code=500, detail=f"Profile '{profile}' missing mapping path")
-    return profile_conf
-
-
-def _load_converter(module_name: str, callable_name: str):
-    try:
-        module = importlib.import_module(module_name)
-    except ModuleNotFoundError as exc:
-        raise HTTPException(status_code=500, detail=f"Converter module '{module_name}' not found") from exc
-    try:
-        return getattr(module, callable_name)
-    except AttributeError as exc:
-        raise HTTPException(status_code=500, detail=f"Converter callable '{callable_name}' not found in module '{module_name}'") from exc
-
-
-def _resolve_mapping_path(relative_path: str) -> Path:
-    provided = Path(relative_path)
-    if provided.is_absolute():
-        if not provided.exists():
-            raise HTTPException(status_code=404, detail=f"Mapping file '{relative_path}' not found")
-        return provided
-
-    for root in CONFIG_SEARCH_ROOTS:
-        candidate = (root / provided).resolve()
-        if candidate.exists():
-            return candidate
-
-    raise HTTPException(status_code=404, detail=f"Mapping file '{relative_path}' not found")
+# gzip/zstd responses and request bodies on the gateway hop
+app.add_middleware(CompressionMiddleware)
 
 
 @app.get("/health")
@@ -129,25 +99,34 @@ async def health_check():
     return {"status": "healthy", "service": "json2xml"}
 
 
+@app.get("/profiles")
+async def list_profiles():
+    """Loaded pipelines, profiles and mapping cache counters"""
+    return PROFILES.snapshot()
+
+
 @app.post("/process")
 async def process_json_to_xml(
     file: UploadFile = File(...),
     profile: str = Form("default"),
     pretty: str = Form("0"),
-    params: Optional[str] = Form(None)
+    params: Optional[str] = Form(None),
+    template: Optional[str] = Form(None)
 ):
-    """Convert JSON payload to XML using a configured profile."""
+    """Convert JSON payload to XML using a configured profile.
 
-    profile_conf = _resolve_profile(profile)
-    mapping_rel = profile_conf["mapping"]
-    converter_conf = profile_conf.get("converter", {})
-    module_name = converter_conf.get("module", "json2xml.converter")
-    callable_name = converter_conf.get("callable", "convert_json_to_xml")
+    ``template`` selects the pipeline config whose profiles are used; the
+    default pipeline applies when it is omitted.
+    """
 
-    converter = _load_converter(module_name, callable_name)
-    mapping_path = _resolve_mapping_path(mapping_rel)
+    try:
+        resolved, mapping_config = PROFILES.resolve(profile, template)
+    except RegistryError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=exc.detail) from exc
+    except MappingError as exc:
+        raise HTTPException(status_code=422, detail=f"Mapping error: {exc}") from exc
 
-    base_params = profile_conf.get("params") or {}
+    base_params = resolved.params
     request_params: Optional[Dict[str, Any]] = None
     if params:
         try:
@@ -162,8 +141,6 @@ async def process_json_to_xml(
         except (UnicodeDecodeError, json.JSONDecodeError) as exc:
             raise HTTPException(status_code=400, detail=f"Invalid JSON file: {exc}") from exc
 
-        mapping_config = load_mapping(str(mapping_path))
-
         is_pretty = pretty == "1"
 
         combined_params = dict(base_params)
@@ -172,7 +149,7 @@ async def process_json_to_xml(
 
         params_payload = combined_params if combined_params else None
 
-        xml_bytes = converter(
+        xml_bytes = resolved.converter(
             json_data,
             mapping_config,
             params=params_payload,
@@ -0,0 +1,263 @@
+"""
+Profile and mapping registry for the json2xml service.
+
+Every enabled pipeline config (``*.json`` with a ``json2xml`` section in the
+config directories) contributes its ``json2xml.profiles``. At startup each
+profile is resolved once: converter callable imported, mapping path found in
+the search roots, mapping file loaded and validated. Requests then only do a
+dictionary lookup.
+
+Files are watched by mtime: at most every JSON2XML_RELOAD_INTERVAL seconds
+(default 2, 0 checks on every request) changed pipeline configs are re-read,
+new ones picked up, and changed mapping files recompiled. Loading, reloads
+and lookups hold one lock, so a registry can be shared by worker threads
+(the fused route in pdf2json converts in its pipeline pool).
+
+Resolution problems are kept on the profile and raised when it is used, with
+the same status codes as before (unknown profile 404, missing mapping file
+404, broken converter 500, invalid mapping 422 via ``MappingError``).
+"""
+
+import importlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from json2xml.mapping import MappingError, load_mapping
+
+
+class RegistryError(Exception):
+    """A profile cannot be used; ``status_code`` is the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _mtime(path: Path) -> Optional[float]:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return None
+
+
+class Profile:
+    """One resolved ``json2xml.profiles`` entry of a pipeline config."""
+
+    def __init__(self, pipeline: str, name: str, conf: Dict[str, Any]) -> None:
+        self.pipeline = pipeline
+        self.name = name
+        self.conf = conf
+        self.params: Dict[str, Any] = dict(conf.get("params") or {})
+        self.converter: Optional[Callable[..., bytes]] = None
+        self.mapping_path: Optional[Path] = None
+        self.error: Optional[RegistryError] = None
+
+
+class MappingCache:
+    """Validated mappings keyed by resolved path, recompiled when the file's mtime changes."""
+
+    def __init__(self) -> None:
+        self._entries: Dict[Path, Tuple[Optional[float], Any]] = {}
+        self.loads = 0
+
+    def get(self, path: Path, check: bool) -> Dict[str, Any]:
+        entry = self._entries.get(path)
+        if entry is None or (check and entry[0] != _mtime(path)):
+            entry = self._load(path)
+        value = entry[1]
+        if isinstance(value, MappingError):
+            raise value
+        return value
+
+    def _load(self, path: Path) -> Tuple[Optional[float], Any]:
+        mtime = _mtime(path)
+        try:
+            value: Any = load_mapping(str(path))
+        except MappingError as exc:
+            value = exc
+        self.loads += 1
+        self._entries[path] = (mtime, value)
+        return self._entries[path]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ProfileRegistry:
+    """All json2xml profiles of the enabled pipelines, with their compiled mappings."""
+
+    def __init__(
+        self,
+        config_dirs: List[Path],
+        search_roots: List[Path],
+        default_pipeline: str,
+        reload_interval: float = 2.0,
+    ) -> None:
+        self.config_dirs = config_dirs
+        self.search_roots = search_roots
+        self.default_pipeline = Path(default_pipeline).name
+        self.reload_interval = reload_interval
+        self.mappings = MappingCache()
+        self._pipelines: Dict[str, Tuple[Path, Optional[float]]] = {}
+        self._profiles: Dict[Tuple[str, str], Profile] = {}
+        self._checked_at = 0.0
+        self.reloads = 0
+        self._lock = threading.RLock()
+
+    # -- loading -----------------------------------------------------------
+
+    def load(self) -> None:
+        """(Re)load every enabled pipeline config and compile its mappings."""
+        with self._lock:
+            for path in self._discover():
+                self._load_pipeline(path)
+            self._checked_at = time.monotonic()
+
+    def _discover(self) -> List[Path]:
+        # Earlier directories win for the same file name (as in _find_pipeline_config)
+        found: Dict[str, Path] = {}
+        for directory in self.config_dirs:
+            if not directory.is_dir():
+                continue
+            for path in sorted(directory.glob("*.json")):
+                found.setdefault(path.name, path)
+        return list(found.values())
+
+    def _load_pipeline(self, path: Path) -> None:
+        mtime = _mtime(path)
+        for key in [key for key in self._profiles if key[0] == path.name]:
+            del self._profiles[key]
+        self._pipelines[path.name] = (path, mtime)
+        try:
+            config = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return
+        if not isinstance(config, dict) or config.get("enabled") is False:
+            return
+        profiles = (config.get("json2xml") or {}).get("profiles") or {}
+        for name, conf in profiles.items():
+            profile = Profile(path.name, name, conf or {})
+            self._resolve(profile, path.parent)
+            self._profiles[(path.name, name)] = profile
+
+    def _resolve(self, profile: Profile, pipeline_dir: Path) -> None:
+        if "mapping" not in profile.conf:
+            profile.error = RegistryError(500, f"Profile '{profile.name}' missing mapping path")
+            return
+        converter_conf = profile.conf.get("converter", {})
+        module_name = converter_conf.get("module", "json2xml.converter")
+        callable_name = converter_conf.get("callable", "convert_json_to_xml")
+        try:
+            module = importlib.import_module(module_name)
+        except ModuleNotFoundError:
+            profile.error = RegistryError(500, f"Converter module '{module_name}' not found")
+            return
+        try:
+            profile.converter = getattr(module, callable_name)
+        except AttributeError:
+            profile.error = RegistryError(
+                500, f"Converter callable '{callable_name}' not found in module '{module_name}'"
+            )
+            return
+        profile.mapping_path = self._resolve_mapping_path(profile.conf["mapping"], pipeline_dir)
+        if profile.mapping_path is None:
+            profile.error = RegistryError(404, f"Mapping file '{profile.conf['mapping']}' not found")
+            return
+        profile.error = None
+        try:
+            self.mappings.get(profile.mapping_path, check=False)
+        except MappingError:
+            # Raised again (as 422) when the profile is used
+            pass
+
+    def _resolve_mapping_path(self, relative_path: str, pipeline_dir: Path) -> Optional[Path]:
+        provided = Path(relative_path)
+        if provided.is_absolute():
+            return provided if provided.exists() else None
+        for root in [pipeline_dir] + [root for root in self.search_roots if root != pipeline_dir]:
+            candidate = (root / provided).resolve()
+            if candidate.exists():
+                return candidate
+        return None
+
+    def refresh(self) -> bool:
+        """Reload what changed on disk; returns True when mtimes were checked."""
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> bool:
+        now = time.monotonic()
+        if self.reload_interval and now - self._checked_at < self.reload_interval:
+            return False
+        self._checked_at = now
+        discovered = {path.name: path for path in self._discover()}
+        for name, path in discovered.items():
+            known = self._pipelines.get(name)
+            if known is None or known[0] != path or known[1] != _mtime(path):
+                self._load_pipeline(path)
+                self.reloads += 1
+        for name in [name for name in self._pipelines if name not in discovered]:
+            del self._pipelines[name]
+            for key in [key for key in self._profiles if key[0] == name]:
+                del self._profiles[key]
+            self.reloads += 1
+        # Mapping files that were missing may have appeared since
+        for profile in self._profiles.values():
+            if profile.mapping_path is None and profile.error is not None and profile.error.status_code == 404:
+                self._resolve(profile, self._pipelines[profile.pipeline][0].parent)
+        return True
+
+    # -- lookup ------------------------------------------------------------
+
+    def resolve(self, profile: str, pipeline: Optional[str] = None) -> Tuple[Profile, Dict[str, Any]]:
+        """Profile and its validated mapping; raises RegistryError or MappingError."""
+        with self._lock:
+            checked = self._refresh()
+            pipeline_name = Path(pipeline).name if pipeline else self.default_pipeline
+            entry = self._profiles.get((pipeline_name, profile))
+            if entry is None:
+                if pipeline and pipeline_name not in self._pipelines:
+                    raise RegistryError(404, f"Pipeline '{pipeline_name}' not found")
+                raise RegistryError(404, f"Profile '{profile}' not found")
+            if entry.error is not None:
+                raise entry.error
+            return entry, self.mappings.get(entry.mapping_path, check=checked)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return {
+            "default_pipeline": self.default_pipeline,
+            "pipelines": len(self._pipelines),
+            "profiles": [
+                {
+                    "pipeline": profile.pipeline,
+                    "profile": profile.name,
+                    "mapping": str(profile.mapping_path) if profile.mapping_path else profile.conf.get("mapping"),
+                    "error": profile.error.detail if profile.error else None,
+                }
+                for profile in self._profiles.values()
+            ],
+            "mappings_cached": len(self.mappings),
+            "mapping_loads": self.mappings.loads,
+            "reloads": self.reloads,
+            "reload_interval_s": self.reload_interval,
+        }
+
+
+def from_env(config_dirs: List[Path], search_roots: List[Path], default_pipeline: str) -> ProfileRegistry:
+    registry = ProfileRegistry(
+        config_dirs,
+        search_roots,
+        default_pipeline,
+        reload_interval=float(os.getenv("JSON2XML_RELOAD_INTERVAL", "2")),
+    )
+    registry.load()
+    return registry
@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+SERVICE_ROOT = Path(__file__).resolve().parents[1]
+SHARED_DIR = SERVICE_ROOT.parent / "shared"
+for path in (SERVICE_ROOT, SHARED_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,68 @@
+"""The compiled converter against XML recorded with the interpreting one.
+
+The ``fixtures/*.xml`` files were produced by the converter as it was before
+mappings were compiled into closure plans, from ``kass_invoice.json`` with
+buyer resolution stubbed to ``<field>:<NAME>``.
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from json2xml import converter
+from json2xml.mapping import load_mapping
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+MAPPINGS = Path(__file__).resolve().parents[1] / "mappings"
+PARAMS = {"SELLER_TIN": "0715420659018000", "DOC_PREFIX": "KASS-"}
+
+
+@pytest.fixture(autouse=True)
+def stub_buyer_lookup(monkeypatch):
+    monkeypatch.setattr(converter, "get_buyer_field", lambda name, field: f"{field}:{name.upper()}")
+    for name in ("SELLER_TIN", "CURRENCY", "DOC_PREFIX"):
+        monkeypatch.delenv(name, raising=False)
+
+
+def _payload():
+    return json.loads((FIXTURES / "kass_invoice.json").read_text(encoding="utf-8"))
+
+
+@pytest.mark.parametrize(
+    "mapping_path, params, expected",
+    [
+        (MAPPINGS / "pt_simon_kass_v1.json", None, "pt_simon_kass_v1.xml"),
+        (MAPPINGS / "pt_simon_invoice_v1.json", None, "pt_simon_invoice_v1.xml"),
+        (FIXTURES / "coverage_mapping.json", None, "coverage.xml"),
+        (FIXTURES / "coverage_mapping.json", PARAMS, "coverage_params.xml"),
+    ],
+)
+def test_compiled_output_matches_the_interpreted_converter(mapping_path, params, expected):
+    mapping = load_mapping(str(mapping_path))
+    xml = converter.convert_json_to_xml(_payload(), mapping, params=params, pretty=True)
+    assert xml == (FIXTURES / expected).read_bytes()
+    # A second run goes through the cached plan and must not differ
+    assert converter.convert_json_to_xml(_payload(), mapping, params=params, pretty=True) == xml
+
+
+def test_plans_are_cached_per_mapping_object_and_params():
+    mapping = load_mapping(str(FIXTURES / "coverage_mapping.json"))
+    plan = converter.compile_mapping(mapping, PARAMS)
+    assert converter.compile_mapping(mapping, dict(PARAMS)) is plan
+    assert converter.compile_mapping(mapping) is not plan
+    assert converter.compile_mapping(load_mapping(str(FIXTURES / "coverage_mapping.json")), PARAMS) is not plan
+
+
+def test_errors_surface_when_the_plan_runs():
+    mapping = load_mapping(str(FIXTURES / "coverage_mapping.json"))
+    mapping["structure"]["Broken"] = {"_array": "$.data.invoice[*]", "Line": {"No": "$.no"}}
+    plan = converter.compile_mapping(mapping)
+    with pytest.raises(converter.ConversionError, match="Expected array"):
+        plan.build(_payload())
+
+    mapping = load_mapping(str(FIXTURES / "coverage_mapping.json"))
+    mapping["computations"]["unsafe"] = {"expression": "__import__('os')"}
+    mapping["structure"]["Unsafe"] = {"path": "$.data.doc_id", "compute": "unsafe"}
+    with pytest.raises(converter.ConversionError, match="unsafe"):
+        converter.convert_json_to_xml(_payload(), mapping)
@@ -0,0 +1,145 @@
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from json2xml.mapping import MappingError
+from registry import ProfileRegistry, RegistryError
+
+MAPPINGS = Path(__file__).resolve().parents[1] / "mappings"
+
+
+def _write_pipeline(path: Path, profiles, enabled=True):
+    path.write_text(json.dumps({"enabled": enabled, "json2xml": {"profiles": profiles}}), encoding="utf-8")
+    _touch(path)
+
+
+def _touch(path: Path):
+    # Move the mtime forward explicitly; some filesystems only keep whole seconds
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10 + _touch.count))
+    _touch.count += 1
+
+
+_touch.count = 0
+
+
+@pytest.fixture
+def tree(tmp_path):
+    config_dir = tmp_path / "config"
+    mapping_dir = config_dir / "mappings"
+    mapping_dir.mkdir(parents=True)
+    shutil.copy(MAPPINGS / "pt_simon_kass_v1.json", mapping_dir / "kass.json")
+    _write_pipeline(config_dir / "invoice_pt_kass.json", {"default": {"mapping": "mappings/kass.json"}})
+    registry = ProfileRegistry([config_dir], [config_dir], "invoice_pt_kass.json", reload_interval=0)
+    registry.load()
+    return registry, config_dir
+
+
+def test_mappings_are_loaded_once_and_shared(tree):
+    registry, _config_dir = tree
+    profile, mapping = registry.resolve("default")
+    assert profile.converter.__name__ == "convert_json_to_xml"
+    assert registry.resolve("default", "invoice_pt_kass.json")[1] is mapping
+    assert registry.mappings.loads == 1
+    assert registry.reloads == 0
+
+
+def test_changed_mapping_file_is_recompiled(tree):
+    registry, config_dir = tree
+    _profile, before = registry.resolve("default")
+    mapping_path = config_dir / "mappings" / "kass.json"
+    data = json.loads(mapping_path.read_text(encoding="utf-8"))
+    data["structure"]["TIN"] = "1234567890123456"
+    mapping_path.write_text(json.dumps(data), encoding="utf-8")
+    _touch(mapping_path)
+
+    _profile, after = registry.resolve("default")
+    assert after is not before
+    assert after["structure"]["TIN"] == "1234567890123456"
+    assert registry.mappings.loads == 2
+
+
+def test_invalid_mapping_raises_until_fixed(tree):
+    registry, config_dir = tree
+    mapping_path = config_dir / "mappings" / "kass.json"
+    original = mapping_path.read_text(encoding="utf-8")
+    mapping_path.write_text("{not json", encoding="utf-8")
+    _touch(mapping_path)
+    with pytest.raises(MappingError):
+        registry.resolve("default")
+
+    mapping_path.write_text(original, encoding="utf-8")
+    _touch(mapping_path)
+    assert registry.resolve("default")[1]["root"]["tag"] == "TaxInvoiceBulk"
+
+
+def test_new_changed_and_removed_pipelines_are_picked_up(tree):
+    registry, config_dir = tree
+    with pytest.raises(RegistryError) as missing:
+        registry.resolve("default", "invoice_pt_new.json")
+    assert missing.value.status_code == 404
+
+    new_pipeline = config_dir / "invoice_pt_new.json"
+    _write_pipeline(new_pipeline, {"default": {"mapping": "mappings/kass.json"}})
+    assert registry.resolve("default", "invoice_pt_new.json")[0].pipeline == "invoice_pt_new.json"
+
+    _write_pipeline(new_pipeline, {"other": {"mapping": "mappings/kass.json"}})
+    with pytest.raises(RegistryError):
+        registry.resolve("default", "invoice_pt_new.json")
+    assert registry.resolve("other", "invoice_pt_new.json")[0].name == "other"
+
+    new_pipeline.unlink()
+    with pytest.raises(RegistryError) as removed:
+        registry.resolve("other", "invoice_pt_new.json")
+    assert removed.value.detail == "Pipeline 'invoice_pt_new.json' not found"
+    assert registry.reloads == 3
+
+
+def test_missing_mapping_file_resolves_once_it_appears(tree):
+    registry, config_dir = tree
+    _write_pipeline(config_dir / "invoice_pt_late.json", {"default": {"mapping": "mappings/late.json"}})
+    with pytest.raises(RegistryError) as missing:
+        registry.resolve("default", "invoice_pt_late.json")
+    assert missing.value.status_code == 404
+
+    shutil.copy(config_dir / "mappings" / "kass.json", config_dir / "mappings" / "late.json")
+    assert registry.resolve("default", "invoice_pt_late.json")[1]["root"]["tag"] == "TaxInvoiceBulk"
+
+
+def test_disabled_pipelines_and_broken_converters(tree):
+    registry, config_dir = tree
+    _write_pipeline(config_dir / "invoice_pt_off.json", {"default": {"mapping": "mappings/kass.json"}}, enabled=False)
+    _write_pipeline(
+        config_dir / "invoice_pt_bad.json",
+        {"default": {"mapping": "mappings/kass.json", "converter": {"module": "json2xml.nowhere"}}},
+    )
+    with pytest.raises(RegistryError) as disabled:
+        registry.resolve("default", "invoice_pt_off.json")
+    assert disabled.value.status_code == 404
+    with pytest.raises(RegistryError) as broken:
+        registry.resolve("default", "invoice_pt_bad.json")
+    assert broken.value.status_code == 500
+
+
+def test_reload_interval_throttles_mtime_checks(tree):
+    registry, config_dir = tree
+    registry.reload_interval = 3600
+    registry.load()
+    _write_pipeline(config_dir / "invoice_pt_new.json", {"default": {"mapping": "mappings/kass.json"}})
+    with pytest.raises(RegistryError):
+        registry.resolve("default", "invoice_pt_new.json")
+    assert registry.refresh() is False
+
+
+def test_concurrent_resolves_share_one_load(tree):
+    registry, config_dir = tree
+    _write_pipeline(config_dir / "invoice_pt_new.json", {"default": {"mapping": "mappings/kass.json"}})
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: registry.resolve("default", "invoice_pt_new.json"), range(64)))
+    assert len({id(mapping) for _profile, mapping in results}) == 1
+    assert registry.reloads == 1
+    assert registry.mappings.loads == 1
@@ -0,0 +1,188 @@
+"""
+Shared Postgres access for the pdf2json worker.
+
+Stages run as one-shot subprocesses, so any connection they open dies with
+the document. Database work that happens for every document is done here,
+in the long-lived worker process instead:
+
+- a bounded connection pool (DB_POOL_MIN / DB_POOL_MAX, default 1 / 4),
+- schema setup run once per process (at startup, or on first use),
+- hot statements executed as server-side prepared statements, which stay
+  prepared on the pooled connection across documents,
+- a per-connection statement_timeout (DB_STATEMENT_TIMEOUT_MS, default 5000),
+  so a slow server delays a request by a bounded time instead of stalling it.
+
+Only the worker's own queries go through the pool; a stage that needs
+Postgres itself (s04_rag with --retriever pg / --persist) holds its own
+connection for its run.
+
+Everything is a no-op when DATABASE_URL is unset or psycopg is missing.
+"""
+
+import os
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    import psycopg
+    from psycopg.types.json import Json
+except ImportError:  # pragma: no cover - environment dependent
+    psycopg = None
+    Json = None
+
+
+PARSER_RESULTS_DDL = """
+CREATE TABLE IF NOT EXISTS parser_results (
+    doc_id TEXT PRIMARY KEY,
+    final JSONB NOT NULL,
+    manifest JSONB NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+)
+"""
+
+UPSERT_PARSER_RESULT = """
+INSERT INTO parser_results (doc_id, final, manifest)
+VALUES (%s, %s, %s)
+ON CONFLICT (doc_id) DO UPDATE
+SET final = EXCLUDED.final,
+    manifest = EXCLUDED.manifest,
+    updated_at = NOW()
+"""
+
+# Env var the worker sets for stage subprocesses: s10 then leaves persistence to this module
+PERSIST_OWNER_ENV = "PDF2JSON_PERSIST_OWNER"
+
+
+class ConnectionPool:
+    """Small bounded pool of autocommit psycopg connections.
+
+    At most ``max_size`` connections exist; callers block up to ``timeout``
+    seconds for a free one. Broken connections are dropped, not returned.
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 4, timeout: float = 10.0) -> None:
+        self.dsn = dsn
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._lock = threading.Lock()
+        self._opened = 0
+        for _ in range(max(0, min(min_size, self.max_size))):
+            self._idle.put(self._connect())
+
+    def _connect(self):
+        kwargs: Dict[str, Any] = {"connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", "5"))}
+        statement_timeout_ms = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+        if statement_timeout_ms > 0:
+            kwargs["options"] = f"-c statement_timeout={statement_timeout_ms}"
+        conn = psycopg.connect(self.dsn, autocommit=True, **kwargs)
+        with self._lock:
+            self._opened += 1
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No database connection available within {self.timeout}s")
+        conn = None
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            if conn.closed:
+                conn = self._connect()
+            yield conn
+        except Exception:
+            if conn is not None and (conn.closed or conn.broken):
+                conn = None
+            raise
+        finally:
+            if conn is not None and not conn.closed:
+                self._idle.put(conn)
+            self._slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {"max_size": self.max_size, "idle": self._idle.qsize(), "opened": self._opened}
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+_schema_ready = False
+
+
+def enabled() -> bool:
+    return psycopg is not None and bool(os.getenv("DATABASE_URL"))
+
+
+def get_pool() -> Optional[ConnectionPool]:
+    """The process-wide pool, created on first use (None when disabled)."""
+    global _pool
+    if not enabled():
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ["DATABASE_URL"],
+                    min_size=int(os.getenv("DB_POOL_MIN", "1")),
+                    max_size=int(os.getenv("DB_POOL_MAX", "4")),
+                    timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+                )
+    return _pool
+
+
+def init() -> bool:
+    """Open the pool and create the schema once; call at worker startup."""
+    global _schema_ready
+    pool = get_pool()
+    if pool is None:
+        return False
+    if not _schema_ready:
+        with _pool_lock:
+            if not _schema_ready:
+                with pool.connection() as conn:
+                    conn.execute(PARSER_RESULTS_DDL)
+                _schema_ready = True
+    return True
+
+
+def persist_parser_result(doc_id: str, final_doc: Dict[str, Any], manifest: Dict[str, Any]) -> bool:
+    """Upsert a parser result through the pool; failures are logged, never raised."""
+    if not doc_id or not enabled():
+        return False
+    try:
+        init()
+        with get_pool().connection() as conn:
+            conn.execute(UPSERT_PARSER_RESULT, (doc_id, Json(final_doc), Json(manifest)), prepare=True)
+        return True
+    except Exception as exc:
+        print(f"[db] failed to persist results for doc_id={doc_id}: {exc}", file=sys.stderr, flush=True)
+        return False
+
+
+def stage_env() -> Dict[str, str]:
+    """Environment for stage subprocesses; marks persistence as owned by the worker."""
+    env = dict(os.environ)
+    if enabled():
+        env[PERSIST_OWNER_ENV] = "worker"
+    return env
+
+
+def close() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
@@ -3,22 +3,34 @@ FastAPI PDF Processing Service
 
 Endpoints:
 - POST /process - Single PDF → JSON
+- POST /process-xml - Single PDF → XML (pipeline's json2xml profile, in-process)
 - POST /batch - Multiple PDFs → JSON array  
 - GET /health - Health check
 """
 
+import asyncio
 import io
 import json
 import os
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import List
+from typing import Any, Callable, List, Optional
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
 import traceback
 from fastapi.responses import JSONResponse, Response
 
+import compression
+import db
+import xml_output
+from compression import CompressionMiddleware
 from processor import (
+    CancelToken,
+    PipelineCancelled,
+    PreflightRejected,
+    check_page_selection,
     process_pdf_from_pipeline_config,
     process_pdf_from_pipeline_config_with_artifacts,
 )
@@ -28,6 +40,68 @@ app = FastAPI(
     description="Convert PDF invoices to structured JSON using 10-stage pipeline",
     version="1.0.0"
 )
+app.add_middleware(CompressionMiddleware)
+
+# Pipelines run off the event loop so /health stays responsive and disconnects are noticed.
+# PIPELINE_WORKERS is how many pipelines one uvicorn worker runs at once (each spawns
+# Camelot/ghostscript stages); raise it at most to the gateway's per-replica admission limit.
+PIPELINE_WORKERS = max(1, int(os.getenv("PIPELINE_WORKERS", "1")))
+_pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+# Concurrent pipelines share the CPUs for s03's per-page pool instead of each taking all of them
+os.environ.setdefault("S03_MAX_WORKERS", str(max(1, (os.cpu_count() or 1) // PIPELINE_WORKERS)))
+# Deadline budget (seconds) sent by the gateway
+DEADLINE_HEADER = "X-Request-Timeout"
+# When the caller accepts gzip/zstd, store the ZIP members and compress the whole archive once for transport
+ARTIFACTS_ZIP_STORE_ENCODED = os.getenv("ARTIFACTS_ZIP_STORE_ENCODED", "1").lower() in {"1", "true", "yes"}
+# (pipeline, reason) pairs already reported as falling back from /process-xml
+_FUSED_UNAVAILABLE_LOGGED: set = set()
+
+
+async def _run_cancellable(request: Request, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a pipeline call in the worker pool, cancelling it if the client goes away.
+
+    The deadline from ``X-Request-Timeout`` travels with the token; a
+    disconnect cancels it, which kills the running stage's process group.
+    """
+    try:
+        timeout = float(request.headers.get(DEADLINE_HEADER) or 0) or None
+    except ValueError:
+        timeout = None
+    cancel = CancelToken(timeout)
+    future = asyncio.get_running_loop().run_in_executor(
+        _pipeline_executor, partial(func, *args, cancel=cancel, **kwargs)
+    )
+    while True:
+        done, _ = await asyncio.wait({future}, timeout=0.5)
+        if done:
+            return future.result()
+        if not cancel.cancelled and await request.is_disconnected():
+            cancel.cancel("client disconnected")
+            print(f"[pdf2json] client disconnected, cancelling {request.url.path}", flush=True)
+
+
+def _cancelled_error(exc: PipelineCancelled) -> HTTPException:
+    if exc.deadline_exceeded:
+        return HTTPException(status_code=504, detail="Deadline exceeded")
+    # Nobody is listening any more; 499 only shows up in logs
+    return HTTPException(status_code=499, detail=str(exc))
+
+
+@app.on_event("startup")
+async def init_database():
+    """Open the Postgres pool and create the schema once per worker process."""
+    try:
+        db.init()
+    except Exception as exc:
+        # Persistence is best effort; the first request retries
+        print(f"[db] startup init failed: {exc}", flush=True)
+
+
+@app.on_event("shutdown")
+async def close_database():
+    db.close()
+    _pipeline_executor.shutdown(wait=False, cancel_futures=True)
+
 
 @app.get("/health")
 async def health_check():
@@ -108,7 +182,7 @@ async def get_templates():
         raise HTTPException(status_code=500, detail=f"Failed to read templates: {str(e)}")
 
 @app.post("/process")
-async def process_single_pdf(file: UploadFile = File(...), template: str | None = Form(None)):
+async def process_single_pdf(request: Request, file: UploadFile = File(...), template: str | None = Form(None)):
     """Process a single PDF file and return JSON"""
     
     # Validate file type
@@ -123,7 +197,9 @@ async def process_single_pdf(file: UploadFile = File(...), template: str | None
         # Pick pipeline config (template param or default from env)
         pipeline = template or os.getenv("PIPELINE_CONFIG") or os.getenv("DEFAULT_PIPELINE") or "invoice_pt_simon.json"
         # Process PDF through pipeline (always config‑driven)
-        processed_data = process_pdf_from_pipeline_config(pdf_bytes, doc_id, pipeline, include_refs=False)
+        processed_data = await _run_cancellable(
+            request, process_pdf_from_pipeline_config, pdf_bytes, doc_id, pipeline, include_refs=False
+        )
         
         result = {
             "doc_id": doc_id,
@@ -134,17 +210,113 @@ async def process_single_pdf(file: UploadFile = File(...), template: str | None
         
         return JSONResponse(content=result)
         
+    except PreflightRejected as e:
+        raise HTTPException(status_code=422, detail=f"Preflight rejected: {e.reason}")
+    except PipelineCancelled as e:
+        raise _cancelled_error(e)
     except Exception as e:
         _log_processing_error("/process", file.filename, pipeline, e)
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
 
+@app.post("/process-xml")
+async def process_single_pdf_to_xml(
+    request: Request,
+    file: UploadFile = File(...),
+    template: str | None = Form(None),
+    profile: str = Form("default"),
+    pretty: str = Form("0"),
+    params: Optional[str] = Form(None),
+):
+    """Process a single PDF and convert it to XML in the same process.
+
+    Uses the converter and mapping from the pipeline's ``json2xml.profiles``.
+    If they cannot be loaded here, the ``/process`` JSON is returned instead
+    (``X-Fused: 0``) so the caller can convert it with the json2xml service.
+    Converter errors carry ``X-Failed-Stage: json2xml``.
+    """
+
+    if not file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+
+    request_params = None
+    if params:
+        try:
+            request_params = json.loads(params)
+        except json.JSONDecodeError as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid params payload: {exc}")
+
+    pipeline = template or os.getenv("PIPELINE_CONFIG") or os.getenv("DEFAULT_PIPELINE") or "invoice_pt_simon.json"
+    try:
+        pdf_bytes = await file.read()
+        doc_id = Path(file.filename).stem
+        processed_data = await _run_cancellable(
+            request, process_pdf_from_pipeline_config, pdf_bytes, doc_id, pipeline, include_refs=False
+        )
+        result = {
+            "doc_id": doc_id,
+            "filename": file.filename,
+            "status": "success",
+            "data": processed_data
+        }
+    except PreflightRejected as e:
+        raise HTTPException(status_code=422, detail=f"Preflight rejected: {e.reason}")
+    except PipelineCancelled as e:
+        raise _cancelled_error(e)
+    except Exception as e:
+        _log_processing_error("/process-xml", file.filename, pipeline, e)
+        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+
+    try:
+        # Registry load and the lxml build are blocking; keep them off the event loop
+        xml_bytes = await asyncio.get_running_loop().run_in_executor(
+            _pipeline_executor,
+            partial(
+                xml_output.convert,
+                result,
+                pipeline,
+                profile=profile,
+                pretty=pretty == "1",
+                params=request_params,
+            ),
+        )
+    except xml_output.FusedUnavailable as e:
+        if (pipeline, str(e)) not in _FUSED_UNAVAILABLE_LOGGED:
+            _FUSED_UNAVAILABLE_LOGGED.add((pipeline, str(e)))
+            print(f"[pdf2json] fused XML unavailable for {pipeline}, returning JSON: {e}", flush=True)
+        return JSONResponse(content=result, headers={"X-Fused": "0"})
+    except xml_output.ConversionFailed as e:
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers={"X-Failed-Stage": "json2xml"})
+    except Exception as e:
+        _log_processing_error("/process-xml", file.filename, pipeline, e)
+        return JSONResponse(status_code=500, content={"detail": f"Internal server error: {e}"}, headers={"X-Failed-Stage": "json2xml"})
+
+    return Response(
+        content=xml_bytes,
+        media_type="application/xml",
+        headers={"Content-Type": "application/xml; charset=utf-8", "X-Fused": "1"}
+    )
+
 @app.post("/process-with-artifacts")
-async def process_pdf_with_artifacts_endpoint(file: UploadFile = File(...), template: str | None = Form(None)):
-    """Process a single PDF file and return artifacts as ZIP"""
+async def process_pdf_with_artifacts_endpoint(
+    request: Request,
+    file: UploadFile = File(...),
+    template: str | None = Form(None),
+    overlay: bool = Form(True),
+    overlay_pages: str | None = Form(None),
+):
+    """Process a single PDF file and return artifacts as ZIP.
+
+    The segments overlay PDF is rendered only here (``overlay``), optionally
+    for selected pages (``overlay_pages``, e.g. "1,3-4").
+    """
     
     # Validate file type
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="File must be a PDF")
+    try:
+        overlay_pages = check_page_selection(overlay_pages)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     try:
         # Read file content
@@ -153,24 +325,45 @@ async def process_pdf_with_artifacts_endpoint(file: UploadFile = File(...), temp
         
         # Choose pipeline config
         pipeline = template or os.getenv("PIPELINE_CONFIG") or os.getenv("DEFAULT_PIPELINE") or "invoice_pt_simon.json"
+        encoding = compression.negotiate(request.headers.get("Accept-Encoding")) if ARTIFACTS_ZIP_STORE_ENCODED else None
         # Process PDF through pipeline and get artifacts (always config‑driven)
-        processed_data, zip_bytes = process_pdf_from_pipeline_config_with_artifacts(pdf_bytes, doc_id, pipeline, include_refs=False)
+        processed_data, zip_bytes = await _run_cancellable(
+            request,
+            process_pdf_from_pipeline_config_with_artifacts,
+            pdf_bytes,
+            doc_id,
+            pipeline,
+            include_refs=False,
+            overlay=overlay,
+            overlay_pages=overlay_pages,
+            **({"zip_level": 0} if encoding else {}),
+        )
+        
+        headers = {"Content-Disposition": f"attachment; filename=\"{doc_id}-artifacts.zip\""}
+        if encoding:
+            # One transport pass over the stored archive instead of deflating each member
+            zip_bytes = await asyncio.get_running_loop().run_in_executor(
+                _pipeline_executor, compression.encode, zip_bytes, encoding
+            )
+            headers.update({"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
         
         # Return ZIP file with artifacts
         return Response(
             content=zip_bytes,
             media_type="application/zip",
-            headers={
-                "Content-Disposition": f"attachment; filename=\"{doc_id}-artifacts.zip\""
-            }
+            headers=headers
         )
         
+    except PreflightRejected as e:
+        raise HTTPException(status_code=422, detail=f"Preflight rejected: {e.reason}")
+    except PipelineCancelled as e:
+        raise _cancelled_error(e)
     except Exception as e:
         _log_processing_error("/process-with-artifacts", file.filename, pipeline, e)
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
 
 @app.post("/batch")
-async def process_batch_pdfs(files: List[UploadFile] = File(...)):
+async def process_batch_pdfs(request: Request, files: List[UploadFile] = File(...)):
     """Process multiple PDF files and return array of JSON results"""
     
     if not files:
@@ -195,7 +388,9 @@ async def process_batch_pdfs(files: List[UploadFile] = File(...)):
             
             # Process PDF through default pipeline
             pipeline = os.getenv("PIPELINE_CONFIG") or os.getenv("DEFAULT_PIPELINE") or "invoice_pt_simon.json"
-            processed_data = process_pdf_from_pipeline_config(pdf_bytes, doc_id, pipeline, include_refs=False)
+            processed_data = await _run_cancellable(
+                request, process_pdf_from_pipeline_config, pdf_bytes, doc_id, pipeline, include_refs=False
+            )
             
             result = {
                 "doc_id": doc_id,
@@ -206,6 +401,15 @@ async def process_batch_pdfs(files: List[UploadFile] = File(...)):
             
             results.append(result)
             
+        except PreflightRejected as e:
+            results.append({
+                "filename": file.filename,
+                "status": "rejected",
+                "error": f"Preflight rejected: {e.reason}"
+            })
+        except PipelineCancelled as e:
+            # Client gone or deadline passed: stop the batch instead of running the rest
+            raise _cancelled_error(e)
         except Exception as e:
             results.append({
                 "filename": file.filename,
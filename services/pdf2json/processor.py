@@ -9,25 +9,130 @@ Hardcoded stage orders are avoided so the pipeline file is the single source of
 import io
 import json
 import os
+import re
 import shlex
+import signal
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 import zipfile
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, Tuple, List, Optional
 
+import db
+
+# Deflate level for the artifacts ZIP (0 stores members uncompressed)
+ARTIFACTS_ZIP_LEVEL = int(os.getenv("ARTIFACTS_ZIP_LEVEL", "6"))
+
+
+class PreflightRejected(RuntimeError):
+    """Raised when s00_preflight rejects the document before the pipeline runs."""
+
+    def __init__(self, reason: str, report: Optional[Dict[str, Any]] = None) -> None:
+        super().__init__(f"Preflight rejected document: {reason}")
+        self.reason = reason
+        self.report = report or {}
+
+
+class PipelineCancelled(RuntimeError):
+    """Raised when a run is abandoned: the client went away or its deadline passed."""
+
+    def __init__(self, reason: str, deadline_exceeded: bool = False) -> None:
+        super().__init__(f"Pipeline cancelled: {reason}")
+        self.reason = reason
+        self.deadline_exceeded = deadline_exceeded
+
+
+class CancelToken:
+    """Cancellation flag plus optional deadline shared between a request and its pipeline run."""
+
+    def __init__(self, timeout: Optional[float] = None) -> None:
+        self._event = threading.Event()
+        self.reason = ""
+        self.deadline = time.monotonic() + timeout if timeout else None
+
+    def cancel(self, reason: str) -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def check(self) -> None:
+        if self.expired:
+            raise PipelineCancelled("deadline exceeded", deadline_exceeded=True)
+        if self._event.is_set():
+            raise PipelineCancelled(self.reason or "cancelled")
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep up to ``seconds``; True as soon as the run should stop."""
+        if self.deadline is not None:
+            seconds = max(0.0, min(seconds, self.deadline - time.monotonic()))
+        return self._event.wait(seconds) or self.expired
+
+
+# Poll interval while a stage runs, and grace period between SIGTERM and SIGKILL
+CANCEL_POLL_SECONDS = 0.2
+KILL_GRACE_SECONDS = 2.0
+
+
+def _kill_group(proc: subprocess.Popen) -> None:
+    """Terminate a stage and everything it spawned (it leads its own process group)."""
+    for sig, grace in ((signal.SIGTERM, KILL_GRACE_SECONDS), (signal.SIGKILL, None)):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            proc.wait(timeout=grace)
+            return
+        except subprocess.TimeoutExpired:
+            continue
+
 
 def log_cmd(cmd: list[str]) -> None:
     """Log command before execution"""
     print("$ " + shlex.join(cmd), flush=True)
 
 
-def run(cmd: list[str]) -> subprocess.CompletedProcess:
-    """Run a command, echo it, stream outputs on error, return process."""
+def run(
+    cmd: list[str],
+    env: Optional[Dict[str, str]] = None,
+    cancel: Optional[CancelToken] = None,
+) -> subprocess.CompletedProcess:
+    """Run a command, echo it, stream outputs on error, return process.
+
+    With a ``cancel`` token the command runs in its own process group, which
+    is killed as soon as the token is cancelled or its deadline passes.
+    """
     log_cmd(cmd)
-    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if cancel is None:
+        proc = subprocess.run(cmd, capture_output=True, text=True, env=env)
+    else:
+        cancel.check()
+        popen = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env, start_new_session=True
+        )
+        while True:
+            try:
+                stdout, stderr = popen.communicate(timeout=CANCEL_POLL_SECONDS)
+                break
+            except subprocess.TimeoutExpired:
+                if cancel.wait(0):
+                    _kill_group(popen)
+                    popen.communicate()
+                    print(f"[pipeline] killed {Path(cmd[1]).name if len(cmd) > 1 else cmd[0]}", file=sys.stderr, flush=True)
+                    cancel.check()
+        proc = subprocess.CompletedProcess(cmd, popen.returncode, stdout, stderr)
     if proc.stdout:
         print(proc.stdout.strip(), flush=True)
     if proc.returncode != 0:
@@ -63,47 +168,15 @@ def process_pdf_with_artifacts(pdf_bytes: bytes, doc_id: str, include_refs: bool
     return process_pdf_from_pipeline_config_with_artifacts(pdf_bytes, doc_id, pipeline, include_refs=include_refs)
 
 
-# For testing purposes (config‑driven CLI)
-if __name__ == "__main__":
-    import argparse
+# -------------------------- Pipeline config lookup --------------------------
 
-    parser = argparse.ArgumentParser(description="Run PDF → JSON with a pipeline config")
-    parser.add_argument("--pdf", required=True, help="PDF file path")
-    parser.add_argument("--config", "--pipeline", dest="pipeline", required=False,
-                        help="Pipeline config JSON filename (e.g., invoice_pt_simon.json). Defaults to $PIPELINE_CONFIG or invoice_pt_simon.json")
-    parser.add_argument("--refs", action="store_true", help="Include refs in output")
-    parser.add_argument("--artifacts", action="store_true", help="Also produce artifacts ZIP (discarded in CLI)")
-    args = parser.parse_args()
+def _config_dirs() -> List[Path]:
+    """Directories searched for pipeline configs, in priority order.
 
-    pdf_path = Path(args.pdf)
-    if not pdf_path.exists():
-        raise SystemExit(f"PDF not found: {pdf_path}")
-
-    pdf_bytes = pdf_path.read_bytes()
-    doc_id = pdf_path.stem
-    pipeline = args.pipeline or os.getenv("PIPELINE_CONFIG") or os.getenv("DEFAULT_PIPELINE") or "invoice_pt_simon.json"
-
-    if args.artifacts:
-        result, _zip = process_pdf_from_pipeline_config_with_artifacts(pdf_bytes, doc_id, pipeline, include_refs=args.refs)
-        print(json.dumps(result, ensure_ascii=False, indent=2))
-    else:
-        result = process_pdf_from_pipeline_config(pdf_bytes, doc_id, pipeline, include_refs=args.refs)
-        print(json.dumps(result, ensure_ascii=False, indent=2))
-
-
-# -------------------------- Config-driven runner (V2) --------------------------
-
-def _find_pipeline_config(config_filename: str) -> Path:
-    """Locate a pipeline config file by name across known directories.
-
-    Search order:
     - $CONFIG_DIR (if set)
     - services/config (sibling to pdf2json service)
     - local config directory (services/pdf2json/config)
     """
-    name = Path(config_filename).name
-
-    # Candidate directories
     here = Path(__file__).resolve()
     pdf2json_dir = here.parent
     services_dir = pdf2json_dir.parent
@@ -116,7 +189,13 @@ def _find_pipeline_config(config_filename: str) -> Path:
     candidates.append(services_dir / "config")
     # fallback to service-local config dir
     candidates.append(pdf2json_dir / "config")
+    return candidates
 
+
+def _find_pipeline_config(config_filename: str) -> Path:
+    """Locate a pipeline config file by name across ``_config_dirs()``."""
+    name = Path(config_filename).name
+    candidates = _config_dirs()
     for base in candidates:
         p = (base / name)
         if p.exists():
@@ -124,17 +203,143 @@ def _find_pipeline_config(config_filename: str) -> Path:
     raise FileNotFoundError(f"Pipeline config not found: {name} in {', '.join(str(c) for c in candidates)}")
 
 
-def process_pdf_from_pipeline_config(
+# -------------------------- Tiered execution --------------------------
+
+# Per-process tier outcomes; every tiered manifest carries a snapshot of these.
+_TIER_STATS: Dict[str, Dict[str, int]] = {}
+_TIER_STATS_LOCK = threading.Lock()
+
+
+def _execution_tiers(pipeline_cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Return the ordered tiers to try. The declared stages are always the last tier.
+
+    A tiered pipeline config looks like:
+      "execution": {
+        "mode": "tiered",
+        "tiers": [{"name": "tokens",
+                   "overrides": {"s04_camelot_grid_config.py": {"extra_args": ["--engine", "tokens"]}},
+                   "skip": ["s04_rag.py"]}],
+        "accept": {"min_confidence": 0.9, "min_row_pass_rate": 1.0, "require_subtotal_pass": true}
+      }
+    """
+    execution = pipeline_cfg.get("execution") or {}
+    if not isinstance(execution, dict) or str(execution.get("mode") or "").lower() != "tiered":
+        return [{"name": "full"}]
+    tiers = [t for t in (execution.get("tiers") or []) if isinstance(t, dict)]
+    for idx, tier in enumerate(tiers):
+        tier.setdefault("name", f"tier{idx + 1}")
+    return tiers + [{"name": "full"}]
+
+
+def _tier_stages(stages: List[Dict[str, Any]], tier: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Apply a tier's skips and per-script overrides to the declared stages."""
+    skip = set(tier.get("skip") or [])
+    overrides = tier.get("overrides") or {}
+    planned: List[Dict[str, Any]] = []
+    for step in stages:
+        script = step.get("script")
+        if script in skip:
+            continue
+        override = overrides.get(script)
+        if isinstance(override, dict):
+            merged = dict(step)
+            merged.update({k: v for k, v in override.items() if k != "extra_args"})
+            extra_args = override.get("extra_args") or []
+            if extra_args:
+                merged["args"] = list(merged.get("args") or []) + list(extra_args)
+            step = merged
+        planned.append(step)
+    return planned
+
+
+def _tier_accepts(validation_fp: Path, confidence_fp: Path, accept_cfg: Dict[str, Any]) -> Tuple[bool, Dict[str, Any]]:
+    """Check s08 arithmetic and s09 confidence against the tier acceptance rules."""
+    try:
+        with open(validation_fp, "r", encoding="utf-8") as f:
+            validation = json.load(f)
+        with open(confidence_fp, "r", encoding="utf-8") as f:
+            confidence = json.load(f)
+    except Exception as e:
+        return False, {"error": f"validation/confidence unavailable: {e}"}
+
+    checks: Dict[str, Any] = {}
+    rows = validation.get("rows") or {}
+    item_count = int(rows.get("total") or 0)
+    checks["items"] = {"value": item_count, "pass": item_count > 0}
+
+    score = confidence.get("score")
+    min_conf = float(accept_cfg.get("min_confidence", 0.9))
+    checks["confidence"] = {"value": score, "min": min_conf, "pass": score is not None and float(score) >= min_conf}
+
+    pass_rate = rows.get("pass_rate")
+    min_rate = float(accept_cfg.get("min_row_pass_rate", 1.0))
+    checks["row_pass_rate"] = {"value": pass_rate, "min": min_rate, "pass": pass_rate is not None and float(pass_rate) >= min_rate}
+
+    if accept_cfg.get("require_subtotal_pass", True):
+        subtotal = ((validation.get("totals") or {}).get("checks") or {}).get("subtotal") or {}
+        checks["subtotal"] = {"value": subtotal.get("pass"), "pass": subtotal.get("pass") is True}
+
+    return all(c["pass"] for c in checks.values()), checks
+
+
+def _record_tier(name: str, accepted: bool) -> None:
+    with _TIER_STATS_LOCK:
+        entry = _TIER_STATS.setdefault(name, {"attempted": 0, "accepted": 0})
+        entry["attempted"] += 1
+        if accepted:
+            entry["accepted"] += 1
+
+
+def tier_hit_rates() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of per-tier attempts/acceptances in this worker process."""
+    with _TIER_STATS_LOCK:
+        return {
+            name: {**entry, "hit_rate": round(entry["accepted"] / entry["attempted"], 4) if entry["attempted"] else 0.0}
+            for name, entry in _TIER_STATS.items()
+        }
+
+
+# Overlay page selections accepted from requests ("1,3-4")
+MAX_PAGE_SELECTION_CHARS = 256
+_PAGE_SELECTION = re.compile(r"^\s*\d+\s*(?:-\s*\d+\s*)?(?:,\s*\d+\s*(?:-\s*\d+\s*)?)*$")
+
+
+def check_page_selection(spec: Optional[str]) -> Optional[str]:
+    """Validate an ``overlay_pages`` value; raises ValueError unless it looks like "1,3-4".
+
+    s03 clamps ranges to the document's page count when rendering.
+    """
+    if spec is None or not spec.strip():
+        return None
+    if len(spec) > MAX_PAGE_SELECTION_CHARS or not _PAGE_SELECTION.match(spec):
+        raise ValueError(f"Invalid overlay_pages: {spec[:40]!r}")
+    for part in spec.split(","):
+        lo, _, hi = part.partition("-")
+        if int(lo) < 1 or (hi and int(hi) < int(lo)):
+            raise ValueError(f"Invalid overlay_pages range: {part.strip()!r}")
+    return spec.strip()
+
+
+# -------------------------- Config-driven runner --------------------------
+
+def _run_pipeline(
     pdf_bytes: bytes,
     doc_id: str,
     pipeline_config_filename: str,
-    include_refs: bool = False,
-) -> Dict[str, Any]:
-    """Run the 10-stage pipeline using a declarative pipeline config file.
-
-    The config must contain a "stages" array with entries like:
-      {"script": "s01_tokenizer.py"}
-      {"script": "s03_segmenter.py", "config": "simon_segmenter_configV3.json"}
+    include_refs: bool,
+    with_artifacts: bool,
+    overlay: bool = True,
+    overlay_pages: Optional[str] = None,
+    cancel: Optional[CancelToken] = None,
+    zip_level: int = ARTIFACTS_ZIP_LEVEL,
+) -> Tuple[Dict[str, Any], Optional[bytes]]:
+    """Run the declarative pipeline in a temp dir; optionally zip the stage artifacts.
+
+    The s03 overlay PDF is only rendered for the artifacts ZIP (``overlay``),
+    from the stored segments, optionally limited to ``overlay_pages`` ("1,3-4").
+    A cancelled ``cancel`` token kills the running stage and raises
+    ``PipelineCancelled``; the temp dir is removed on the way out.
+    ``zip_level`` 0 stores the ZIP members, 1-9 deflates them at that level.
     """
 
     python_exec = sys.executable
@@ -152,6 +357,7 @@ def process_pdf_from_pipeline_config(
         out_root = temp_path / "output"
         out_root.mkdir(parents=True, exist_ok=True)
 
+        preflight_fp = out_root / "preflight" / f"{doc_id}-preflight.json"
         tokens_fp = out_root / "tokenizer" / f"{doc_id}.tokens.json"
         normalized_fp = out_root / "normalize" / f"{doc_id}-normalized.json"
         segments_fp = out_root / "segment" / f"{doc_id}-segmentized.json"
@@ -177,6 +383,9 @@ def process_pdf_from_pipeline_config(
         if not stages:
             raise RuntimeError("Pipeline config missing 'stages' array")
 
+        # s10 leaves persistence to the worker's pooled connection (see db.py)
+        stage_env = db.stage_env()
+
         # Helper to resolve a stage's config file (when present)
         def resolve_stage_config(name: Optional[str]) -> Optional[str]:
             if not name:
@@ -193,6 +402,7 @@ def process_pdf_from_pipeline_config(
             common_words = stages_dir.parent / "common" / "common-words.json"
             return {
                 "pdf": str(pdf_path),
+                "preflight": str(preflight_fp),
                 "tokens": str(tokens_fp),
                 "normalized": str(normalized_fp),
                 "segments": str(segments_fp),
@@ -220,208 +430,141 @@ def process_pdf_from_pipeline_config(
                 out.append(new_token)
             return out
 
-        try:
-            for step in stages:
-                script = step.get("script")
-                if not script:
-                    raise RuntimeError("Stage entry missing 'script'")
-                args_tmpl = step.get("args")
-                if not isinstance(args_tmpl, list) or not args_tmpl:
-                    raise RuntimeError(f"Stage '{script}' missing non-empty 'args' array (data-driven mode)")
-                script_path = stages_dir / script
-                if not script_path.exists():
-                    raise RuntimeError(f"Stage script not found: {script}")
-
-                # Build placeholders
-                mp = placeholder_map()
-                stage_cfg_path = resolve_stage_config(step.get("config"))
-                if stage_cfg_path:
-                    mp["config"] = stage_cfg_path
-
-                # Ensure output directories exist
-                for k in ("tokens","normalized","segments","cells_raw","cells","items","fields","validation","confidence","final","manifest"):
-                    try:
-                        ensure_dir(Path(mp[k]))
-                    except Exception:
-                        pass
-
-                # Write manifest before parser stage if referenced
-                if script == "s10_parser.py" and "manifest" in mp:
-                    manifest = {
-                        "doc_id": doc_id,
-                        "created_at": datetime.utcnow().isoformat() + "Z",
-                        "inputs": {
-                            "pdf": mp["pdf"],
-                            "tokens": mp["tokens"],
-                            "normalized": mp["normalized"],
-                            "segments": mp["segments"],
-                            "cells": mp["cells"],
-                            "items": mp["items"],
-                            "fields": mp["fields"],
-                            "validation": mp["validation"],
-                            "confidence": mp["confidence"],
-                        },
-                        "outputs": {"final": mp["final"]},
-                        "version": "1.0",
-                    }
-                    with open(mp["manifest"], "w", encoding="utf-8") as mf:
-                        json.dump(manifest, mf, ensure_ascii=False, indent=2)
-
-                cmd = [python_exec, str(script_path)] + format_args(args_tmpl, mp)
-                run(cmd)
-
-            # Read and return final result
-            with open(final_fp, "r", encoding="utf-8") as f:
-                final_doc = json.load(f)
-            if not include_refs:
-                final_doc = strip_refs(final_doc)
-            return final_doc
-
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Pipeline stage failed: {e}")
-        except Exception as e:
-            raise RuntimeError(f"Processing failed: {e}")
-
-
-def process_pdf_from_pipeline_config_with_artifacts(
-    pdf_bytes: bytes,
-    doc_id: str,
-    pipeline_config_filename: str,
-    include_refs: bool = False,
-) -> Tuple[Dict[str, Any], bytes]:
-    """Run the pipeline using a declarative config and return (final_json, zip_bytes)."""
-
-    python_exec = sys.executable
-    stages_dir = Path(__file__).resolve().parent / "stages"
-
-    with tempfile.TemporaryDirectory(prefix=f"pdf_process_{doc_id}_") as temp_dir:
-        temp_path = Path(temp_dir)
-        pdf_path = temp_path / f"{doc_id}.pdf"
-        pdf_path.write_bytes(pdf_bytes)
-
-        out_root = temp_path / "output"
-        out_root.mkdir(parents=True, exist_ok=True)
-
-        tokens_fp = out_root / "tokenizer" / f"{doc_id}.tokens.json"
-        normalized_fp = out_root / "normalize" / f"{doc_id}-normalized.json"
-        segments_fp = out_root / "segment" / f"{doc_id}-segmentized.json"
-        cells_raw_fp = out_root / "cells" / f"{doc_id}-cells.json"
-        cells_norm_fp = out_root / "cells" / f"{doc_id}-cells_normalized.json"
-        items_fp = out_root / "items" / f"{doc_id}-items.json"
-        fields_fp = out_root / "fields" / f"{doc_id}-fields.json"
-        validate_dir = out_root / "validate"
-        validation_fp = validate_dir / f"{doc_id}-validation.json"
-        confidence_fp = validate_dir / f"{doc_id}-confidence.json"
-        manifest_fp = out_root / "manifest" / f"{doc_id}-manifest.json"
-        final_fp = out_root / "final" / f"{doc_id}.json"
-
-        cfg_path = _find_pipeline_config(pipeline_config_filename)
-        try:
-            with open(cfg_path, "r", encoding="utf-8") as f:
-                pipeline_cfg = json.load(f)
-        except Exception as e:
-            raise RuntimeError(f"Failed to read pipeline config '{cfg_path}': {e}")
-
-        stages: List[Dict[str, Any]] = pipeline_cfg.get("stages") or []
-        if not stages:
-            raise RuntimeError("Pipeline config missing 'stages' array")
-
-        def resolve_stage_config(name: Optional[str]) -> Optional[str]:
-            if not name:
-                return None
-            local = stages_dir.parent / "config" / Path(name).name
-            if local.exists():
-                return str(local)
-            svc = (stages_dir.parent.parent / "config" / Path(name).name)
-            if svc.exists():
-                return str(svc)
-            return str(name)
-
-        def placeholder_map() -> Dict[str, str]:
-            common_words = stages_dir.parent / "common" / "common-words.json"
-            return {
-                "pdf": str(pdf_path),
-                "tokens": str(tokens_fp),
-                "normalized": str(normalized_fp),
-                "segments": str(segments_fp),
-                "cells_raw": str(cells_raw_fp),
-                "cells": str(cells_norm_fp),
-                "items": str(items_fp),
-                "fields": str(fields_fp),
-                "validation": str(validation_fp),
-                "confidence": str(confidence_fp),
-                "final": str(final_fp),
-                "manifest": str(manifest_fp),
-                "common_words": str(common_words) if common_words.exists() else "",
-            }
-
-        def format_args(args_tmpl: List[str], mapping: Dict[str, str]) -> List[str]:
-            import re
-            out: List[str] = []
-            for token in args_tmpl:
-                def repl(m):
-                    key = m.group(1)
-                    if key not in mapping:
-                        raise RuntimeError(f"Unknown placeholder '{{{key}}}' in args token: {token}")
-                    return mapping[key]
-                new_token = re.sub(r"\{([A-Za-z0-9_]+)\}", repl, token)
-                out.append(new_token)
-            return out
+        def run_step(step: Dict[str, Any], execution: Optional[Dict[str, Any]]) -> None:
+            script = step.get("script")
+            if not script:
+                raise RuntimeError("Stage entry missing 'script'")
+            args_tmpl = step.get("args")
+            if not isinstance(args_tmpl, list) or not args_tmpl:
+                raise RuntimeError(f"Stage '{script}' missing non-empty 'args' array (data-driven mode)")
+            script_path = stages_dir / script
+            if not script_path.exists():
+                raise RuntimeError(f"Stage script not found: {script}")
+
+            # Build placeholders
+            mp = placeholder_map()
+            stage_cfg_path = resolve_stage_config(step.get("config"))
+            if stage_cfg_path:
+                mp["config"] = stage_cfg_path
+
+            # Ensure output directories exist
+            for k in ("preflight","tokens","normalized","segments","cells_raw","cells","items","fields","validation","confidence","final","manifest"):
+                try:
+                    ensure_dir(Path(mp[k]))
+                except Exception:
+                    pass
+
+            # Write manifest before parser stage if referenced
+            if script == "s10_parser.py" and "manifest" in mp:
+                manifest = {
+                    "doc_id": doc_id,
+                    "created_at": datetime.utcnow().isoformat() + "Z",
+                    "inputs": {
+                        "pdf": mp["pdf"],
+                        "preflight": mp["preflight"],
+                        "tokens": mp["tokens"],
+                        "normalized": mp["normalized"],
+                        "segments": mp["segments"],
+                        "cells": mp["cells"],
+                        "items": mp["items"],
+                        "fields": mp["fields"],
+                        "validation": mp["validation"],
+                        "confidence": mp["confidence"],
+                    },
+                    "outputs": {"final": mp["final"]},
+                    "version": "1.0",
+                }
+                if execution:
+                    manifest["execution"] = execution
+                with open(mp["manifest"], "w", encoding="utf-8") as mf:
+                    json.dump(manifest, mf, ensure_ascii=False, indent=2)
+
+            cmd = [python_exec, str(script_path)] + format_args(args_tmpl, mp)
+            try:
+                run(cmd, env=stage_env, cancel=cancel)
+            except PipelineCancelled:
+                raise
+            except RuntimeError:
+                # Surface a preflight rejection as such instead of a generic stage failure
+                if script == "s00_preflight.py" and preflight_fp.exists():
+                    with open(preflight_fp, "r", encoding="utf-8") as f:
+                        report = json.load(f)
+                    if report.get("status") == "rejected":
+                        raise PreflightRejected(str(report.get("reason")), report) from None
+                raise
 
         try:
-            for step in stages:
-                script = step.get("script")
-                if not script:
-                    raise RuntimeError("Stage entry missing 'script'")
-                args_tmpl = step.get("args")
-                if not isinstance(args_tmpl, list) or not args_tmpl:
-                    raise RuntimeError(f"Stage '{script}' missing non-empty 'args' array (data-driven mode)")
-                script_path = stages_dir / script
-                if not script_path.exists():
-                    raise RuntimeError(f"Stage script not found: {script}")
-                mp = placeholder_map()
-                stage_cfg_path = resolve_stage_config(step.get("config"))
-                if stage_cfg_path:
-                    mp["config"] = stage_cfg_path
-
-                for k in ("tokens","normalized","segments","cells_raw","cells","items","fields","validation","confidence","final","manifest"):
-                    try:
-                        ensure_dir(Path(mp[k]))
-                    except Exception:
-                        pass
-
-                if script == "s10_parser.py" and "manifest" in mp:
-                    manifest = {
-                        "doc_id": doc_id,
-                        "created_at": datetime.utcnow().isoformat() + "Z",
-                        "inputs": {
-                            "pdf": mp["pdf"],
-                            "tokens": mp["tokens"],
-                            "normalized": mp["normalized"],
-                            "segments": mp["segments"],
-                            "cells": mp["cells"],
-                            "items": mp["items"],
-                            "fields": mp["fields"],
-                            "validation": mp["validation"],
-                            "confidence": mp["confidence"],
-                        },
-                        "outputs": {"final": mp["final"]},
-                        "version": "1.0",
+            tiers = _execution_tiers(pipeline_cfg)
+            accept_cfg = dict((pipeline_cfg.get("execution") or {}).get("accept") or {})
+            if "min_confidence" not in accept_cfg and pipeline_cfg.get("confidence_threshold") is not None:
+                accept_cfg["min_confidence"] = pipeline_cfg["confidence_threshold"]
+
+            execution: Optional[Dict[str, Any]] = None
+            attempts: List[Dict[str, Any]] = []
+            # Steps whose outputs are currently on disk, in order
+            completed: List[Dict[str, Any]] = []
+            plan: List[Dict[str, Any]] = []
+            parser_at = 0
+            for tier_idx, tier in enumerate(tiers):
+                plan = _tier_stages(stages, tier)
+                parser_at = next((i for i, st in enumerate(plan) if st.get("script") == "s10_parser.py"), len(plan))
+                final_tier = tier_idx == len(tiers) - 1
+
+                # Stages shared with the previous tier already produced their outputs
+                start = 0
+                while start < min(len(completed), parser_at) and completed[start] == plan[start]:
+                    start += 1
+                del completed[start:]
+                try:
+                    for step in plan[start:parser_at]:
+                        run_step(step, None)
+                        completed.append(step)
+                except (PreflightRejected, PipelineCancelled):
+                    raise
+                except (RuntimeError, subprocess.CalledProcessError) as e:
+                    # A cheap tier failing must not fail a document the next tier may handle
+                    if final_tier:
+                        raise
+                    _record_tier(tier["name"], False)
+                    attempts.append({"tier": tier["name"], "accepted": False, "error": str(e)})
+                    print(f"[pipeline] tier={tier['name']} failed: {e}", flush=True)
+                    continue
+
+                if len(tiers) == 1:
+                    break
+                accepted, checks = _tier_accepts(validation_fp, confidence_fp, accept_cfg)
+                _record_tier(tier["name"], accepted)
+                attempts.append({"tier": tier["name"], "accepted": accepted, "checks": checks})
+                print(f"[pipeline] tier={tier['name']} accepted={accepted}", flush=True)
+                if accepted or final_tier:
+                    execution = {
+                        "mode": "tiered",
+                        "served_by": tier["name"],
+                        "attempts": attempts,
+                        "hit_rates": tier_hit_rates(),
                     }
-                    with open(mp["manifest"], "w", encoding="utf-8") as mf:
-                        json.dump(manifest, mf, ensure_ascii=False, indent=2)
+                    break
 
-                cmd = [python_exec, str(script_path)] + format_args(args_tmpl, mp)
-                run(cmd)
+            for step in plan[parser_at:]:
+                run_step(step, execution)
 
+            # Read and return final result
             with open(final_fp, "r", encoding="utf-8") as f:
                 final_doc = json.load(f)
+            if db.enabled() and manifest_fp.exists():
+                with open(manifest_fp, "r", encoding="utf-8") as f:
+                    db.persist_parser_result(final_doc.get("doc_id"), final_doc, json.load(f))
             if not include_refs:
                 final_doc = strip_refs(final_doc)
+            if not with_artifacts:
+                return final_doc, None
 
             zip_buffer = io.BytesIO()
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            zip_method = zipfile.ZIP_DEFLATED if zip_level > 0 else zipfile.ZIP_STORED
+            zip_options = {"compresslevel": zip_level} if zip_level > 0 else {}
+            with zipfile.ZipFile(zip_buffer, 'w', zip_method, **zip_options) as zip_file:
                 stage_files = [
+                    (preflight_fp, "00-preflight.json"),
                     (tokens_fp, "01-tokens.json"),
                     (normalized_fp, "02-normalized.json"),
                     (segments_fp, "03-segments.json"),
@@ -434,17 +577,129 @@ def process_pdf_from_pipeline_config_with_artifacts(
                     (manifest_fp, "10-manifest.json"),
                     (final_fp, "11-final.json"),
                 ]
-                # Include s03 overlay PDF when available
-                overlay_pdf = pdf_path.with_name(f"{pdf_path.stem}-overlay.pdf")
-                if overlay_pdf.exists():
-                    stage_files.append((overlay_pdf, "03-segments-overlay.pdf"))
+                # Render the s03 overlay PDF on demand from the stored segments
+                if overlay:
+                    overlay_pdf = _render_overlay(python_exec, stages_dir, segments_fp, pdf_path, overlay_pages, cancel)
+                    if overlay_pdf is not None:
+                        stage_files.append((overlay_pdf, "03-segments-overlay.pdf"))
                 for file_path, archive_name in stage_files:
                     if file_path.exists():
                         zip_file.write(file_path, archive_name)
             zip_bytes = zip_buffer.getvalue()
             zip_buffer.close()
             return final_doc, zip_bytes
+
+        except (PreflightRejected, PipelineCancelled):
+            raise
         except subprocess.CalledProcessError as e:
             raise RuntimeError(f"Pipeline stage failed: {e}")
         except Exception as e:
             raise RuntimeError(f"Processing failed: {e}")
+
+
+def _render_overlay(
+    python_exec: str,
+    stages_dir: Path,
+    segments_fp: Path,
+    pdf_path: Path,
+    pages: Optional[str] = None,
+    cancel: Optional[CancelToken] = None,
+) -> Optional[Path]:
+    """Render the s03 segments overlay PDF; returns None when it cannot be produced."""
+    overlay_pdf = pdf_path.with_name(f"{pdf_path.stem}-overlay.pdf")
+    # Pipelines that still pass --overlay to s03 have already written it
+    if overlay_pdf.exists() and not pages:
+        return overlay_pdf
+    if not segments_fp.exists():
+        return None
+    cmd = [
+        python_exec, str(stages_dir / "s03_segmenter.py"),
+        "--from-segments", str(segments_fp),
+        "--overlay", str(pdf_path),
+        "--out", str(overlay_pdf),
+    ]
+    if pages:
+        cmd += ["--pages", str(pages)]
+    try:
+        run(cmd, cancel=cancel)
+    except PipelineCancelled:
+        raise
+    except RuntimeError as e:
+        # The overlay is a debugging aid; never fail the artifacts for it
+        print(f"[pipeline] overlay skipped: {e}", file=sys.stderr, flush=True)
+        return None
+    return overlay_pdf if overlay_pdf.exists() else None
+
+
+def process_pdf_from_pipeline_config(
+    pdf_bytes: bytes,
+    doc_id: str,
+    pipeline_config_filename: str,
+    include_refs: bool = False,
+    cancel: Optional[CancelToken] = None,
+) -> Dict[str, Any]:
+    """Run the 10-stage pipeline using a declarative pipeline config file.
+
+    The config must contain a "stages" array with entries like:
+      {"script": "s01_tokenizer.py"}
+      {"script": "s03_segmenter.py", "config": "simon_segmenter_configV3.json"}
+    """
+    final_doc, _ = _run_pipeline(
+        pdf_bytes, doc_id, pipeline_config_filename, include_refs, with_artifacts=False, cancel=cancel
+    )
+    return final_doc
+
+
+def process_pdf_from_pipeline_config_with_artifacts(
+    pdf_bytes: bytes,
+    doc_id: str,
+    pipeline_config_filename: str,
+    include_refs: bool = False,
+    overlay: bool = True,
+    overlay_pages: Optional[str] = None,
+    cancel: Optional[CancelToken] = None,
+    zip_level: int = ARTIFACTS_ZIP_LEVEL,
+) -> Tuple[Dict[str, Any], bytes]:
+    """Run the pipeline using a declarative config and return (final_json, zip_bytes)."""
+    final_doc, zip_bytes = _run_pipeline(
+        pdf_bytes,
+        doc_id,
+        pipeline_config_filename,
+        include_refs,
+        with_artifacts=True,
+        overlay=overlay,
+        overlay_pages=overlay_pages,
+        cancel=cancel,
+        zip_level=zip_level,
+    )
+    return final_doc, zip_bytes or b""
+
+
+# For testing purposes (config‑driven CLI)
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run PDF → JSON with a pipeline config")
+    parser.add_argument("--pdf", required=True, help="PDF file path")
+    parser.add_argument("--config", "--pipeline", dest="pipeline", required=False,
+                        help="Pipeline config JSON filename (e.g., invoice_pt_simon.json). Defaults to $PIPELINE_CONFIG or invoice_pt_simon.json")
+    parser.add_argument("--refs", action="store_true", help="Include refs in output")
+    parser.add_argument("--artifacts", action="store_true", help="Also produce artifacts ZIP (discarded in CLI)")
+    args = parser.parse_args()
+
+    pdf_path = Path(args.pdf)
+    if not pdf_path.exists():
+        raise SystemExit(f"PDF not found: {pdf_path}")
+
+    pdf_bytes = pdf_path.read_bytes()
+    doc_id = pdf_path.stem
+    pipeline = args.pipeline or os.getenv("PIPELINE_CONFIG") or os.getenv("DEFAULT_PIPELINE") or "invoice_pt_simon.json"
+
+    if args.artifacts:
+        result, _zip = process_pdf_from_pipeline_config_with_artifacts(pdf_bytes, doc_id, pipeline, include_refs=args.refs)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        result = process_pdf_from_pipeline_config(pdf_bytes, doc_id, pipeline, include_refs=args.refs)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# Stage 0 — PDF Preflight (fast rejection + page-level work plan)
+#
+# Inputs : --in  /path/to/invoice.pdf
+# Outputs: --out /path/to/<doc>-preflight.json
+#
+# One lightweight pass over the PDF (PyMuPDF, pdfplumber fallback) before s01:
+# - Rejects encrypted PDFs, PDFs with no text layer (scans), empty PDFs and
+#   PDFs above --max-pages. The JSON is still written; the exit code is 3.
+# - Per page: word count, word density (words per 10k pt²), ruling lines
+#   (horizontal/vertical), image count, numeric-heavy line count.
+# - Plan: process_pages (pages with text), blank_pages, scanned_pages
+#   (images but no text) and table_pages (ruled grid or several numeric
+#   lines, plus continuation pages of a table spanning pages). Later stages
+#   (s04 --plan) use table_pages to skip pages.
+
+from __future__ import annotations
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:  # PyMuPDF (fitz) is preferred: it parses a page in a few milliseconds
+    import fitz  # type: ignore
+except ImportError:  # pragma: no cover - environment dependent
+    fitz = None
+
+EXIT_REJECTED = 3
+NUMERIC_WORD_RE = re.compile(r"^\(?-?\d[\d.,]*\)?%?$")
+RULING_THIN_PT = 2.0
+RULING_MIN_LEN_PT = 20.0
+
+
+def _numeric_lines(words: List[Tuple[float, float, str]], tolerance: float = 2.0) -> int:
+    """Count text lines (grouped by y) holding at least two numeric words."""
+    lines: List[Tuple[float, int]] = []
+    for y, _x, text in sorted(words):
+        is_num = 1 if NUMERIC_WORD_RE.match(text.strip()) else 0
+        if lines and abs(y - lines[-1][0]) <= tolerance:
+            lines[-1] = (lines[-1][0], lines[-1][1] + is_num)
+        else:
+            lines.append((y, is_num))
+    return sum(1 for _, n in lines if n >= 2)
+
+
+def _extend_table_pages(pages: List[Dict[str, Any]]) -> None:
+    """Mark continuation pages of a multi-page item table as table pages.
+
+    An unruled continuation page may hold a single item row (one numeric
+    line), which the per-page test misses. Text pages between the first and
+    last table page are kept, as are text pages right after the last one that
+    still hold a numeric line.
+    """
+    table_idx = [idx for idx, entry in enumerate(pages) if entry["has_table"]]
+    if not table_idx:
+        return
+    for entry in pages[table_idx[0]:table_idx[-1]]:
+        if entry["has_text"] and not entry["has_table"]:
+            entry["has_table"] = entry["table_continuation"] = True
+    for entry in pages[table_idx[-1] + 1:]:
+        if not entry["has_text"] or entry["numeric_lines"] < 1:
+            break
+        entry["has_table"] = entry["table_continuation"] = True
+
+
+def _classify_segment(x0: float, y0: float, x1: float, y1: float) -> Tuple[int, int]:
+    """Return (horizontal, vertical) ruling counts for a line or thin rectangle."""
+    w = abs(x1 - x0)
+    h = abs(y1 - y0)
+    if h <= RULING_THIN_PT and w >= RULING_MIN_LEN_PT:
+        return 1, 0
+    if w <= RULING_THIN_PT and h >= RULING_MIN_LEN_PT:
+        return 0, 1
+    if w >= RULING_MIN_LEN_PT and h >= RULING_MIN_LEN_PT:
+        return 2, 2  # boxed cell: two edges each way
+    return 0, 0
+
+
+def _scan_pymupdf(pdf_path: Path, max_pages: int) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    doc_info: Dict[str, Any] = {"engine": "pymupdf"}
+    pages: List[Dict[str, Any]] = []
+    with fitz.open(pdf_path) as doc:  # type: ignore[attr-defined]
+        doc_info["encrypted"] = bool(doc.needs_pass or doc.is_encrypted)
+        doc_info["page_count"] = int(doc.page_count)
+        if doc_info["encrypted"] or doc.page_count > max_pages:
+            return doc_info, pages
+        for pidx in range(doc.page_count):
+            page = doc.load_page(pidx)
+            width = float(page.rect.width)
+            height = float(page.rect.height)
+            words = [(float(w[1]), float(w[0]), str(w[4])) for w in (page.get_text("words") or []) if len(w) >= 5 and str(w[4]).strip()]
+            horizontal = vertical = 0
+            for path in page.get_drawings():
+                for item in path.get("items", []):
+                    kind = item[0]
+                    if kind == "l":
+                        p1, p2 = item[1], item[2]
+                        h, v = _classify_segment(p1.x, p1.y, p2.x, p2.y)
+                    elif kind == "re":
+                        r = item[1]
+                        h, v = _classify_segment(r.x0, r.y0, r.x1, r.y1)
+                    else:
+                        continue
+                    horizontal += h
+                    vertical += v
+            pages.append({
+                "page": pidx + 1,
+                "width": width,
+                "height": height,
+                "words": words,
+                "rulings": {"h": horizontal, "v": vertical},
+                "images": len(page.get_images(full=False) or []),
+            })
+    return doc_info, pages
+
+
+def _scan_pdfplumber(pdf_path: Path, max_pages: int) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    import pdfplumber
+
+    doc_info: Dict[str, Any] = {"engine": "pdfplumber", "encrypted": False}
+    pages: List[Dict[str, Any]] = []
+    try:
+        pdf = pdfplumber.open(str(pdf_path))
+    except Exception as exc:
+        if "password" in str(exc).lower() or "encrypt" in exc.__class__.__name__.lower():
+            doc_info["encrypted"] = True
+            doc_info["page_count"] = 0
+            return doc_info, pages
+        raise
+    with pdf:
+        doc_info["page_count"] = len(pdf.pages)
+        if len(pdf.pages) > max_pages:
+            return doc_info, pages
+        for pidx, page in enumerate(pdf.pages):
+            words = [(float(w["top"]), float(w["x0"]), str(w["text"])) for w in page.extract_words() if str(w["text"]).strip()]
+            horizontal = vertical = 0
+            for seg in list(page.lines) + list(page.rects):
+                h, v = _classify_segment(float(seg["x0"]), float(seg["top"]), float(seg["x1"]), float(seg["bottom"]))
+                horizontal += h
+                vertical += v
+            pages.append({
+                "page": pidx + 1,
+                "width": float(page.width),
+                "height": float(page.height),
+                "words": words,
+                "rulings": {"h": horizontal, "v": vertical},
+                "images": len(page.images),
+            })
+    return doc_info, pages
+
+
+def preflight(
+    pdf_path: Path,
+    max_pages: int = 50,
+    min_words: int = 3,
+    min_rulings: int = 3,
+    min_numeric_lines: int = 2,
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    reason: Optional[str] = None
+    try:
+        if fitz is not None:
+            doc_info, raw_pages = _scan_pymupdf(pdf_path, max_pages)
+        else:
+            doc_info, raw_pages = _scan_pdfplumber(pdf_path, max_pages)
+    except Exception as exc:
+        doc_info, raw_pages = {"engine": "pymupdf" if fitz is not None else "pdfplumber", "page_count": 0}, []
+        reason = f"unreadable: {exc.__class__.__name__}: {exc}"
+
+    page_count = int(doc_info.get("page_count") or 0)
+    if reason is None:
+        if doc_info.get("encrypted"):
+            reason = "encrypted"
+        elif page_count == 0:
+            reason = "empty"
+        elif page_count > max_pages:
+            reason = f"too_many_pages ({page_count} > {max_pages})"
+
+    pages_out: List[Dict[str, Any]] = []
+    plan: Dict[str, List[int]] = {"process_pages": [], "table_pages": [], "blank_pages": [], "scanned_pages": []}
+    for entry in raw_pages:
+        words = entry["words"]
+        area = max(1.0, entry["width"] * entry["height"])
+        numeric_lines = _numeric_lines(words)
+        rulings = entry["rulings"]
+        has_text = len(words) >= min_words
+        ruled = rulings["h"] >= min_rulings and rulings["v"] >= 1
+        has_table = has_text and (ruled or numeric_lines >= min_numeric_lines)
+        page_no = entry["page"]
+        if has_text:
+            plan["process_pages"].append(page_no)
+        elif entry["images"]:
+            plan["scanned_pages"].append(page_no)
+        else:
+            plan["blank_pages"].append(page_no)
+        pages_out.append({
+            "page": page_no,
+            "words": len(words),
+            "density": round(len(words) / area * 10000.0, 3),
+            "rulings": rulings,
+            "images": entry["images"],
+            "numeric_lines": numeric_lines,
+            "has_text": has_text,
+            "has_table": has_table,
+            "table_continuation": False,
+        })
+
+    _extend_table_pages(pages_out)
+    plan["table_pages"] = [entry["page"] for entry in pages_out if entry["has_table"]]
+
+    if reason is None and not plan["process_pages"]:
+        reason = "no_text_layer" if plan["scanned_pages"] else "no_text"
+
+    return {
+        "doc_id": pdf_path.name,
+        "stage": "preflight",
+        "version": "1.0",
+        "status": "rejected" if reason else "ok",
+        "reason": reason,
+        "engine": doc_info.get("engine"),
+        "page_count": page_count,
+        "limits": {"max_pages": max_pages, "min_words": min_words, "min_rulings": min_rulings, "min_numeric_lines": min_numeric_lines},
+        "pages": pages_out,
+        "plan": plan,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 2),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Stage 0 — PDF preflight (fast rejection + page plan)")
+    ap.add_argument("--in", dest="inp", required=True, help="Path to input PDF")
+    ap.add_argument("--out", dest="out", required=True, help="Path to output preflight JSON")
+    ap.add_argument("--max-pages", type=int, default=50, help="Reject PDFs with more pages than this (default: 50)")
+    ap.add_argument("--min-words", type=int, default=3, help="Words needed for a page to count as having text (default: 3)")
+    ap.add_argument("--min-rulings", type=int, default=3, help="Horizontal rulings needed to call a page ruled (default: 3)")
+    ap.add_argument("--min-numeric-lines", type=int, default=2, help="Lines with 2+ numbers that mark an unruled table page (default: 2)")
+    args = ap.parse_args()
+
+    pdf_path = Path(args.inp).expanduser().resolve()
+    out_path = Path(args.out).expanduser().resolve()
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    data = preflight(
+        pdf_path,
+        max_pages=int(args.max_pages),
+        min_words=int(args.min_words),
+        min_rulings=int(args.min_rulings),
+        min_numeric_lines=int(args.min_numeric_lines),
+    )
+    out_path.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+
+    print(json.dumps({
+        "stage": data["stage"],
+        "doc_id": data["doc_id"],
+        "status": data["status"],
+        "reason": data["reason"],
+        "page_count": data["page_count"],
+        "table_pages": data["plan"]["table_pages"],
+        "blank_pages": data["plan"]["blank_pages"],
+        "elapsed_ms": data["elapsed_ms"],
+        "out": str(out_path),
+    }, ensure_ascii=False, separators=(",", ":")))
+
+    if data["status"] == "rejected":
+        print(f"[s00_preflight] rejected {data['doc_id']}: {data['reason']}", file=sys.stderr)
+        sys.exit(EXIT_REJECTED)
+
+
+if __name__ == "__main__":
+    main()
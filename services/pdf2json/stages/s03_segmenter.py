@@ -34,6 +34,9 @@ import argparse
 import json
 import re
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional, Tuple, Union, Callable, Sequence, Set
@@ -51,6 +54,13 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Documents shorter than this are segmented in-process: pool start-up would
+# cost more than the per-page phase itself.
+PARALLEL_MIN_PAGES = 8
+# Upper bound for the automatic pool size; the pdf2json worker sets it to its
+# share of the CPUs when it runs several pipelines at once.
+MAX_WORKERS = int(os.getenv("S03_MAX_WORKERS", "0")) or (os.cpu_count() or 1)
+
 
 # ============================================================================
 # Data Models
@@ -155,6 +165,8 @@ class Context:
     defaults: Dict[str, Any] = field(default_factory=dict)
     lines: Optional[List[Dict[str, Any]]] = None
     lines_available: bool = False
+    # Shared by every region evaluated on the same page view (anchor hits, line candidates)
+    memo: Optional[Dict[Any, Any]] = None
 
 
 @dataclass  
@@ -350,7 +362,7 @@ class DetectionModes:
             margin = ctx.defaults["margin"]
 
         # 1) Find start anchor
-        start_match = AnchorMatcher.match(ctx.tokens, start_anchor)
+        start_match = AnchorMatcher.match(ctx.tokens, start_anchor, memo=ctx.memo)
         if not start_match:
             return None
 
@@ -369,7 +381,7 @@ class DetectionModes:
             # Optional end anchor path (legacy anchor-to-anchor box)
             end_match = None
             if end_anchor:
-                end_match = AnchorMatcher.match(ctx.tokens, end_anchor, start_match)
+                end_match = AnchorMatcher.match(ctx.tokens, end_anchor, start_match, memo=ctx.memo)
                 if not end_match:
                     return None
 
@@ -423,49 +435,16 @@ class DetectionModes:
         if not line_records:
             return None
 
-        candidates: List[Dict[str, Any]] = []
-        for line in line_records:
-            text = str(line.get("text", "")).strip()
-            bbox_obj = line.get("bbox")
-            if not text or bbox_obj is None:
-                continue
-
-            if isinstance(bbox_obj, BBox):
-                bbox = bbox_obj
-            elif isinstance(bbox_obj, dict):
-                try:
-                    bbox = BBox(
-                        float(bbox_obj["x0"]),
-                        float(bbox_obj["y0"]),
-                        float(bbox_obj["x1"]),
-                        float(bbox_obj["y1"]),
-                    )
-                except (KeyError, TypeError, ValueError):
-                    continue
-            else:
-                try:
-                    x0, y0, x1, y1 = bbox_obj
-                    bbox = BBox(float(x0), float(y0), float(x1), float(y1))
-                except (TypeError, ValueError):
-                    continue
-
-            candidates.append({
-                "norm": text,
-                "text": text,
-                "page": ctx.page,
-                "bbox": {
-                    "x0": bbox.x0,
-                    "y0": bbox.y0,
-                    "x1": bbox.x1,
-                    "y1": bbox.y1,
-                },
-                "_source_line": line,
-            })
+        memo = ctx.memo if ctx.memo is not None else {}
+        candidates = memo.get("line_candidates")
+        if candidates is None:
+            candidates = DetectionModes._line_candidates(ctx.page, line_records)
+            memo["line_candidates"] = candidates
 
         if not candidates:
             return None
 
-        start_match = AnchorMatcher.match(candidates, start_anchor)
+        start_match = AnchorMatcher.match(candidates, start_anchor, memo=memo)
         if not start_match:
             return None
 
@@ -495,7 +474,7 @@ class DetectionModes:
         else:
             end_match = None
             if end_anchor:
-                end_match = AnchorMatcher.match(candidates, end_anchor, start_match)
+                end_match = AnchorMatcher.match(candidates, end_anchor, start_match, memo=memo)
                 if not end_match:
                     return None
 
@@ -529,6 +508,50 @@ class DetectionModes:
             },
         )
 
+    @staticmethod
+    def _line_candidates(page: int, line_records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Line records shaped like tokens so AnchorMatcher can run over them."""
+        candidates: List[Dict[str, Any]] = []
+        for line in line_records:
+            text = str(line.get("text", "")).strip()
+            bbox_obj = line.get("bbox")
+            if not text or bbox_obj is None:
+                continue
+
+            if isinstance(bbox_obj, BBox):
+                bbox = bbox_obj
+            elif isinstance(bbox_obj, dict):
+                try:
+                    bbox = BBox(
+                        float(bbox_obj["x0"]),
+                        float(bbox_obj["y0"]),
+                        float(bbox_obj["x1"]),
+                        float(bbox_obj["y1"]),
+                    )
+                except (KeyError, TypeError, ValueError):
+                    continue
+            else:
+                try:
+                    x0, y0, x1, y1 = bbox_obj
+                    bbox = BBox(float(x0), float(y0), float(x1), float(y1))
+                except (TypeError, ValueError):
+                    continue
+
+            candidates.append({
+                "norm": text,
+                "text": text,
+                "page": page,
+                "bbox": {
+                    "x0": bbox.x0,
+                    "y0": bbox.y0,
+                    "x1": bbox.x1,
+                    "y1": bbox.y1,
+                },
+                "_source_line": line,
+            })
+
+        return candidates
+
     @staticmethod
     def _refine_line_match_with_tokens(ctx: Context,
                                        line_bbox: Sequence[float],
@@ -593,31 +616,19 @@ class DetectionModes:
 
         full_text_str = "".join(full_text)
 
-        # Compile the anchor pattern and find the match
-        patterns = anchor_config.get("patterns", anchor_config.get("pattern", ""))
-        if isinstance(patterns, str):
-            patterns = [patterns]
-
-        flags = anchor_config.get("flags", {})
-        regex_flags = 0
-        if flags.get("ignore_case", False):
-            regex_flags |= re.IGNORECASE
+        # Find the match with the precompiled anchor patterns
+        compiled = AnchorMatcher.compile(anchor_config)
 
         # Normalize space if required
         search_text = full_text_str
-        if flags.get("normalize_space", False):
+        if compiled.normalize_space:
             search_text = " ".join(search_text.split())
 
-        # Find the match
         match_obj = None
-        for pattern in patterns:
-            try:
-                pattern_re = re.compile(pattern, regex_flags)
-                match_obj = pattern_re.search(search_text)
-                if match_obj:
-                    break
-            except re.error as e:
-                ctx.logger.warning(f"Invalid regex '{pattern}': {e}")
+        for pattern_re in compiled.regexes:
+            match_obj = pattern_re.search(search_text)
+            if match_obj:
+                break
 
         if not match_obj:
             ctx.logger.debug("Regex did not match in token-refined text")
@@ -1007,55 +1018,128 @@ class DetectionModes:
 # Anchor Matching
 # ============================================================================
 
+@dataclass
+class CompiledAnchor:
+    """Anchor patterns compiled once, with per-text hit memo."""
+    key: Tuple[Any, ...]
+    regexes: List[re.Pattern]
+    normalize_space: bool
+    hits: Dict[str, Optional[str]] = field(default_factory=dict)
+
+    def hit(self, text: str) -> Optional[str]:
+        """Return the first matching pattern for text (memoized), else None."""
+        if text in self.hits:
+            return self.hits[text]
+        found = None
+        for pattern_re in self.regexes:
+            if pattern_re.search(text):
+                found = pattern_re.pattern
+                break
+        self.hits[text] = found
+        return found
+
+
 class AnchorMatcher:
     """Utility for matching anchor patterns in tokens."""
-    
+
+    # Anchor index: (patterns, ignore_case, normalize_space) -> CompiledAnchor.
+    # Filled from the segmenter config up front; unseen specs compile on first use.
+    _index: Dict[Tuple[Any, ...], CompiledAnchor] = {}
+
     @staticmethod
-    def match(tokens: List[Dict[str, Any]], anchor_config: Dict[str, Any],
-              reference: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
-        """Match anchor pattern and return best match with metadata."""
-        # Get patterns
+    def spec_key(anchor_config: Dict[str, Any]) -> Tuple[Any, ...]:
         patterns = anchor_config.get("patterns", anchor_config.get("pattern", ""))
         if isinstance(patterns, str):
             patterns = [patterns]
-        
-        # Compile patterns
-        flags = anchor_config.get("flags", {})
-        regex_flags = 0
-        if flags.get("ignore_case", False):
-            regex_flags |= re.IGNORECASE
-        
-        compiled = []
+        flags = anchor_config.get("flags", {}) or {}
+        return (
+            tuple(str(p) for p in patterns),
+            bool(flags.get("ignore_case", False)),
+            bool(flags.get("normalize_space", False)),
+        )
+
+    @staticmethod
+    def compile(anchor_config: Dict[str, Any]) -> CompiledAnchor:
+        """Compiled form of an anchor spec, shared by every spec with the same patterns/flags."""
+        key = AnchorMatcher.spec_key(anchor_config)
+        compiled = AnchorMatcher._index.get(key)
+        if compiled is not None:
+            return compiled
+
+        patterns, ignore_case, normalize_space = key
+        regex_flags = re.IGNORECASE if ignore_case else 0
+        regexes = []
         for pattern in patterns:
             try:
-                compiled.append(re.compile(pattern, regex_flags))
+                regexes.append(re.compile(pattern, regex_flags))
             except re.error as e:
                 logger.warning(f"Invalid regex '{pattern}': {e}")
-        
-        if not compiled:
-            return None
-        
-        # Find matches
+
+        compiled = CompiledAnchor(key=key, regexes=regexes, normalize_space=normalize_space)
+        AnchorMatcher._index[key] = compiled
+        return compiled
+
+    @staticmethod
+    def precompile(config: Dict[str, Any]) -> int:
+        """Compile every anchor spec found in the config; returns the index size."""
+        def walk(node: Any) -> None:
+            if isinstance(node, dict):
+                for key, value in node.items():
+                    if key.endswith("anchor") and isinstance(value, dict) and (
+                        "patterns" in value or "pattern" in value
+                    ):
+                        AnchorMatcher.compile(value)
+                    walk(value)
+            elif isinstance(node, list):
+                for item in node:
+                    walk(item)
+
+        walk(config.get("regions", []))
+        return len(AnchorMatcher._index)
+
+    @staticmethod
+    def find_all(tokens: List[Dict[str, Any]], anchor_config: Dict[str, Any],
+                 memo: Optional[Dict[Any, Any]] = None) -> List[Dict[str, Any]]:
+        """All tokens matching the anchor, in token order (memoized per token list)."""
+        compiled = AnchorMatcher.compile(anchor_config)
+        if not compiled.regexes:
+            return []
+
+        memo_key = ("anchor_hits", id(tokens), compiled.key)
+        if memo is not None and memo_key in memo:
+            return memo[memo_key][1]
+
         matches = []
         for token in tokens:
             text = token.get("norm", token.get("text", ""))
-            
-            if flags.get("normalize_space", False):
+
+            if compiled.normalize_space:
                 text = " ".join(text.split())
-            
-            for pattern_re in compiled:
-                if pattern_re.search(text):
-                    matches.append({
-                        "token": token,
-                        "bbox": [
-                            token["bbox"]["x0"], token["bbox"]["y0"],
-                            token["bbox"]["x1"], token["bbox"]["y1"]
-                        ],
-                        "matched_text": text,
-                        "pattern": pattern_re.pattern
-                    })
-                    break
-        
+
+            pattern = compiled.hit(text)
+            if pattern is not None:
+                matches.append({
+                    "token": token,
+                    "bbox": [
+                        token["bbox"]["x0"], token["bbox"]["y0"],
+                        token["bbox"]["x1"], token["bbox"]["y1"]
+                    ],
+                    "matched_text": text,
+                    "pattern": pattern
+                })
+
+        if memo is not None:
+            # Keep the token list alive with the entry so its id() cannot be reused
+            memo[memo_key] = (tokens, matches)
+        return matches
+
+    @staticmethod
+    def match(tokens: List[Dict[str, Any]], anchor_config: Dict[str, Any],
+              reference: Optional[Dict[str, Any]] = None,
+              memo: Optional[Dict[Any, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Match anchor pattern and return best match with metadata."""
+        matches = AnchorMatcher.find_all(tokens, anchor_config, memo)
+
         if not matches:
             return None
         
@@ -1169,12 +1253,14 @@ class PageResolver:
 class AgnosticSegmenter:
     """Agnostic region-based document segmenter with strict grammar."""
     
-    def __init__(self, config_path: Optional[Path] = None):
-        """Initialize with configuration."""
-        if config_path is None:
-            config_path = Path(__file__).parent.parent / "config" / "segmenter_config.json"
-        
-        self.config = self._load_config(config_path)
+    def __init__(self, config_path: Optional[Path] = None, config: Optional[Dict[str, Any]] = None):
+        """Initialize with configuration (a path, or an already loaded config dict)."""
+        if config is None:
+            if config_path is None:
+                config_path = Path(__file__).parent.parent / "config" / "segmenter_config.json"
+            config = self._load_config(config_path)
+
+        self.config = config
         self.table_provider = TableProvider()
         self.mode_handlers = self._build_mode_registry()
         self._marker_pattern_cache: Dict[Tuple[str, ...], List[re.Pattern]] = {}
@@ -1183,6 +1269,13 @@ class AgnosticSegmenter:
         self._region_index: Dict[str, Dict[str, Any]] = {
             r.get("id"): r for r in self.config.get("regions", []) if isinstance(r, dict) and r.get("id")
         }
+        # Detect/fallback chains normalized once per region, anchors compiled once per config
+        self._mode_chains: Dict[str, List[Dict[str, Any]]] = {
+            rid: ModeNormalizer.normalize_chain(r) for rid, r in self._region_index.items()
+        }
+        AnchorMatcher.precompile(self.config)
+        # Page views (scoped tokens, rows, line records, anchor memo) for the page being segmented
+        self._page_views: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
     
     def _load_config(self, config_path: Path) -> Dict[str, Any]:
         """Load and validate configuration."""
@@ -1799,7 +1892,10 @@ class AgnosticSegmenter:
     
     def _detect_region(self, ctx: Context, region_config: Dict[str, Any]) -> Optional[DetectionResult]:
         """Detect a region using its mode chain."""
-        mode_chain = ModeNormalizer.normalize_chain(region_config)
+        region_id = region_config.get("id")
+        mode_chain = self._mode_chains.get(region_id) if self._region_index.get(region_id) is region_config else None
+        if mode_chain is None:
+            mode_chain = ModeNormalizer.normalize_chain(region_config)
         
         if not mode_chain:
             logger.warning(f"No detection modes for region {region_config.get('id')}")
@@ -1827,15 +1923,90 @@ class AgnosticSegmenter:
         
         return None
     
-    def _process_region(
+    def _cross_page_probe(
+        self,
+        region_config: Dict[str, Any],
+        page_tokens: List[Dict[str, Any]],
+    ) -> Optional[Tuple[bool, bool]]:
+        """(start found, end found) on one page for auto-scope anchor regions."""
+        detect_cfg = region_config.get("detect", {}) or {}
+        if detect_cfg.get("by", "") not in ("anchors", "line_anchors"):
+            return None
+        if str(detect_cfg.get("anchor_scope", "auto")).lower() != "auto":
+            return None
+        start_spec = detect_cfg.get("start_anchor")
+        end_spec = detect_cfg.get("end_anchor")
+        if not (start_spec and end_spec):
+            return None
+        sm = AnchorMatcher.match(page_tokens, start_spec)
+        if not sm:
+            return (False, False)
+        return (True, bool(AnchorMatcher.match(page_tokens, end_spec, sm)))
+
+    def _segment_page(
+        self,
+        page: int,
+        page_tokens: List[Dict[str, Any]],
+        page_lines: Optional[List[Dict[str, Any]]],
+        total_pages: int,
+        root_regions: List[Dict[str, Any]],
+        child_regions: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Per-page phase: everything that only needs this page's tokens and lines.
+
+        Root regions are detected once and reused as parents for the child
+        regions; keep policies and cross-page anchors are left to the merge.
+        """
+        lines_by_page = {page: page_lines} if page_lines is not None else None
+        self._page_views.clear()
+        roots: Dict[str, Dict[str, Any]] = {}
+        probes: Dict[str, Tuple[bool, bool]] = {}
+        parent_results: Dict[str, DetectionResult] = {}
+
+        for region_config in root_regions:
+            region_id = region_config["id"]
+            probe = self._cross_page_probe(region_config, page_tokens)
+            if probe is not None:
+                probes[region_id] = probe
+            guard_ok = True
+            if "only_if_contains" in region_config:
+                guard_ok = self._check_guard(page_tokens, region_config["only_if_contains"])
+            segment = self._process_region_on_page(
+                region_config,
+                page,
+                page_tokens,
+                total_pages,
+                lines_by_page=lines_by_page,
+            )
+            roots[region_id] = {"segment": segment, "guard": guard_ok}
+            if segment:
+                parent_results[region_id] = DetectionResult(
+                    bbox=BBox.from_list(segment["bbox"]),
+                    metadata=segment.get("metadata", {}),
+                )
+
+        children = self.segment_page_with_dependencies(
+            child_regions,
+            page,
+            page_tokens,
+            total_pages,
+            lines_by_page=lines_by_page,
+            parent_results=parent_results,
+        ) if child_regions else []
+        self._page_views.clear()
+
+        return {"page": page, "roots": roots, "probes": probes, "children": children}
+
+    def _merge_root_region(
         self,
         region_config: Dict[str, Any],
         pages: List[int],
+        page_passes: Dict[int, Dict[str, Any]],
         tokens: List[Dict[str, Any]],
         total_pages: int,
         lines_by_page: Optional[Dict[int, List[Dict[str, Any]]]] = None,
     ) -> List[Dict[str, Any]]:
-        """Process a region across specified pages."""
+        """Merge phase for one root region: cross-page anchors, then keep policy."""
         region_id = region_config["id"]
         keep_policy = region_config.get("keep", "all")
 
@@ -1844,30 +2015,20 @@ class AgnosticSegmenter:
         # Cross-page anchors path (document scope) — optional and backward compatible
         detect_cfg = region_config.get("detect", {}) or {}
         detection_by = detect_cfg.get("by", "")
-        is_anchors_mode = detection_by in ("anchors", "line_anchors")
-        if is_anchors_mode:
+        if detection_by in ("anchors", "line_anchors"):
             anchor_scope = str(detect_cfg.get("anchor_scope", "auto")).lower()
-            max_gap_value = detect_cfg.get("max_page_gap", 1)
-            max_gap = int(max_gap_value) if max_gap_value is not None else 999
-            val_policy = str(detect_cfg.get("value_part_policy", "end")).lower()
 
             try_cross_page = False
             if anchor_scope == "document":
                 try_cross_page = True
-            elif anchor_scope == "auto" and detect_cfg.get("end_anchor") is not None:
+            elif anchor_scope == "auto":
                 # Heuristic: if a start anchor is found on some page but end is missing on same page
                 # then we attempt cross-page detection. Only applies when end_anchor is configured.
-                start_spec = detect_cfg.get("start_anchor")
-                end_spec = detect_cfg.get("end_anchor")
-                if start_spec and end_spec:
-                    for p in pages:
-                        page_tokens = [t for t in tokens if t.get("page") == p]
-                        sm = AnchorMatcher.match(page_tokens, start_spec)
-                        if sm:
-                            em = AnchorMatcher.match(page_tokens, end_spec, sm)
-                            if not em:
-                                try_cross_page = True
-                            break
+                for p in pages:
+                    probe = page_passes[p]["probes"].get(region_id)
+                    if probe and probe[0]:
+                        try_cross_page = not probe[1]
+                        break
 
             if try_cross_page:
                 cross = self._detect_anchors_cross_page(
@@ -1883,30 +2044,16 @@ class AgnosticSegmenter:
 
         # Collect results from all pages
         page_results = []
-        
         for page in pages:
-            # Check guard condition
-            if "only_if_contains" in region_config:
-                page_tokens = [t for t in tokens if t["page"] == page]
-                if not self._check_guard(page_tokens, region_config["only_if_contains"]):
-                    continue
-            
-            # Process this page
-            segment = self._process_region_on_page(
-                region_config,
-                page,
-                tokens,
-                total_pages,
-                lines_by_page=lines_by_page,
-            )
-            if segment:
-                page_results.append(segment)
-        
+            entry = page_passes[page]["roots"].get(region_id)
+            if entry and entry["guard"] and entry["segment"]:
+                page_results.append(entry["segment"])
+
         # Apply keep policy
         if not page_results:
             logger.info(f"End region '{region_id}': no results")
             return []
-        
+
         if keep_policy == "first":
             results = [page_results[0]]
             logger.info(f"End region '{region_id}': keeping first (page {results[0]['page']})")
@@ -1916,22 +2063,39 @@ class AgnosticSegmenter:
         else:  # "all"
             results = page_results
             logger.info(f"End region '{region_id}': keeping all ({len(results)} pages)")
-        
+
         return results
-    
-    def _process_region_on_page(
+
+    def _page_view(
         self,
         region_config: Dict[str, Any],
         page: int,
         tokens: List[Dict[str, Any]],
-        total_pages: int,
-        parent_bbox: Optional[BBox] = None,
-        lines_by_page: Optional[Dict[int, List[Dict[str, Any]]]] = None,
-    ) -> Optional[Dict[str, Any]]:
-        """Process a single region on a specific page."""
-        region_id = region_config["id"]
+        parent_bbox: Optional[BBox],
+        lines_by_page: Optional[Dict[int, List[Dict[str, Any]]]],
+    ) -> Dict[str, Any]:
+        """Scoped tokens, rows and line records for a region on a page.
+
+        Regions sharing the same scope (page, parent bbox, page-marker filter)
+        share one view, and with it the anchor hits memoized on it.
+        """
+        marker_patterns: List[re.Pattern] = []
+        marker_band = None
+        if self._should_drop_page_markers(region_config):
+            marker_patterns = self._get_marker_patterns(region_config)
+            if marker_patterns:
+                marker_band = self._get_marker_y_band(region_config)
+
+        key = (
+            page,
+            tuple(parent_bbox.to_list()) if parent_bbox else None,
+            tuple(p.pattern for p in marker_patterns),
+            marker_band,
+        )
+        view = self._page_views.get(key)
+        if view is not None:
+            return view
 
-        # Prepare tokens scoped to the optional parent bbox
         page_tokens = [t for t in tokens if t["page"] == page]
         if parent_bbox:
             tol = self.config.get("tolerances", {}).get("parent_overlap_tol", 0.0)
@@ -1944,21 +2108,17 @@ class AgnosticSegmenter:
         if lines_by_page is not None:
             raw_lines = list(lines_by_page.get(page, []) or [])
 
-        drop_markers = self._should_drop_page_markers(region_config)
-        if drop_markers:
-            marker_patterns = self._get_marker_patterns(region_config)
-            if marker_patterns:
-                marker_band = self._get_marker_y_band(region_config)
-                filtered_tokens, filtered_lines, _ = self._filter_page_markers_for_page(
-                    page,
-                    page_tokens,
-                    raw_lines,
-                    marker_patterns,
-                    marker_band,
-                )
-                page_tokens = filtered_tokens
-                if raw_lines is not None:
-                    raw_lines = filtered_lines or []
+        if marker_patterns:
+            filtered_tokens, filtered_lines, _ = self._filter_page_markers_for_page(
+                page,
+                page_tokens,
+                raw_lines,
+                marker_patterns,
+                marker_band,
+            )
+            page_tokens = filtered_tokens
+            if raw_lines is not None:
+                raw_lines = filtered_lines or []
 
         # Group tokens into rows
         rows = self._group_rows_from_tokens(page_tokens)
@@ -1971,6 +2131,34 @@ class AgnosticSegmenter:
             raw_lines=raw_lines,
         )
 
+        view = {
+            "tokens": page_tokens,
+            "rows": rows,
+            "lines": page_lines,
+            "lines_available": lines_available,
+            "memo": {},
+        }
+        self._page_views[key] = view
+        return view
+
+    def _process_region_on_page(
+        self,
+        region_config: Dict[str, Any],
+        page: int,
+        tokens: List[Dict[str, Any]],
+        total_pages: int,
+        parent_bbox: Optional[BBox] = None,
+        lines_by_page: Optional[Dict[int, List[Dict[str, Any]]]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Process a single region on a specific page."""
+        region_id = region_config["id"]
+
+        view = self._page_view(region_config, page, tokens, parent_bbox, lines_by_page)
+        page_tokens = view["tokens"]
+        rows = view["rows"]
+        page_lines = view["lines"]
+        lines_available = view["lines_available"]
+
         # Build context with defaults
         ctx = Context(
             page=page,
@@ -1984,6 +2172,7 @@ class AgnosticSegmenter:
             defaults=self.config.get("defaults", {}),
             lines=page_lines,
             lines_available=lines_available,
+            memo=view["memo"],
         )
         
         # Detect region
@@ -2013,10 +2202,11 @@ class AgnosticSegmenter:
         tokens: List[Dict[str, Any]],
         total_pages: int,
         lines_by_page: Optional[Dict[int, List[Dict[str, Any]]]] = None,
+        parent_results: Optional[Dict[str, DetectionResult]] = None,
     ) -> List[Dict[str, Any]]:
         """Process regions on a page with dependency resolution."""
         segments = []
-        parent_results = {}  # region_id -> DetectionResult
+        parent_results = dict(parent_results or {})  # region_id -> DetectionResult
         
         # Process in dependency order
         for region_config in regions:
@@ -2062,12 +2252,57 @@ class AgnosticSegmenter:
         
         return segments
     
+    def _run_page_phase(
+        self,
+        tokens: List[Dict[str, Any]],
+        lines_by_page: Optional[Dict[int, List[Dict[str, Any]]]],
+        page_count: int,
+        root_regions: List[Dict[str, Any]],
+        child_regions: List[Dict[str, Any]],
+        region_pages: Dict[str, List[int]],
+        workers: int = 0,
+    ) -> Dict[int, Dict[str, Any]]:
+        """Run `_segment_page` for every page, in a process pool on long documents.
+
+        workers: 0 = auto (pool only from PARALLEL_MIN_PAGES pages), 1 = sequential.
+        """
+        tokens_by_page: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+        for t in tokens:
+            tokens_by_page[t.get("page")].append(t)
+
+        jobs = []
+        for page in range(1, page_count + 1):
+            page_roots = [r for r in root_regions if page in region_pages[r["id"]]]
+            page_children = [r for r in child_regions if page in region_pages[r["id"]]]
+            page_lines = lines_by_page.get(page, []) if lines_by_page is not None else None
+            jobs.append((page, tokens_by_page.get(page, []), page_lines, page_count, page_roots, page_children))
+
+        if workers <= 0:
+            workers = min(MAX_WORKERS, len(jobs)) if len(jobs) >= PARALLEL_MIN_PAGES else 1
+        workers = min(workers, len(jobs)) if jobs else 1
+
+        if workers > 1:
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=workers,
+                    initializer=_init_page_worker,
+                    initargs=(self.config,),
+                ) as pool:
+                    results = list(pool.map(_segment_page_worker, jobs))
+                logger.info(f"Page phase: {len(jobs)} pages on {workers} workers")
+                return {r["page"]: r for r in results}
+            except (OSError, BrokenProcessPool) as e:
+                logger.warning(f"Process pool unavailable ({e}); segmenting pages sequentially")
+
+        return {job[0]: self._segment_page(*job) for job in jobs}
+
     def segment(
         self,
         in_path: Path,
         out_path: Path,
         tokenizer: str,
         overlay_pdf: Optional[Path] = None,
+        workers: int = 0,
     ) -> Dict[str, Any]:
         """Main segmentation entry point."""
         # Load input
@@ -2101,53 +2336,38 @@ class AgnosticSegmenter:
         root_regions = [r for r in ordered_regions if not r.get("inside")]
         child_regions = [r for r in ordered_regions if r.get("inside")]
         
+        region_pages = {
+            r["id"]: PageResolver.resolve(r.get("on_pages", "all"), page_count)
+            for r in ordered_regions
+        }
+        page_passes = self._run_page_phase(
+            tokens,
+            lines_by_page,
+            page_count,
+            root_regions,
+            child_regions,
+            region_pages,
+            workers,
+        )
+
         all_segments = []
-        
-        # Process root regions with keep policy
+
+        # Merge phase: root regions in config order (keep policy, cross-page anchors)
         for region_config in root_regions:
-            on_pages = region_config.get("on_pages", "all")
-            pages = PageResolver.resolve(on_pages, page_count)
-            
+            pages = region_pages[region_config["id"]]
             if pages:
-                segments = self._process_region(
+                all_segments.extend(self._merge_root_region(
                     region_config,
                     pages,
+                    page_passes,
                     tokens,
                     page_count,
                     lines_by_page=lines_by_page,
-                )
-                all_segments.extend(segments)
-        
-        # Process child regions page by page with dependencies
-        if child_regions:
-            for page in range(1, page_count + 1):
-                # Filter regions that apply to this page
-                page_regions = []
-                for region_config in child_regions:
-                    on_pages = region_config.get("on_pages", "all")
-                    if page in PageResolver.resolve(on_pages, page_count):
-                        page_regions.append(region_config)
-                
-                if page_regions:
-                    # Include root regions for this page as potential parents
-                    all_page_regions = []
-                    for r in root_regions:
-                        on_pages = r.get("on_pages", "all")
-                        if page in PageResolver.resolve(on_pages, page_count):
-                            all_page_regions.append(r)
-                    all_page_regions.extend(page_regions)
-                    
-                    segments = self.segment_page_with_dependencies(
-                        all_page_regions,
-                        page,
-                        tokens,
-                        page_count,
-                        lines_by_page=lines_by_page,
-                    )
-                    
-                    # Filter to only child segments (parents already added)
-                    child_segments = [s for s in segments if s["id"] in {r["id"] for r in page_regions}]
-                    all_segments.extend(child_segments)
+                ))
+
+        # Child regions were resolved per page against their parents
+        for page in range(1, page_count + 1):
+            all_segments.extend(page_passes[page]["children"])
 
         # Post-process: stitch multi-page fragments when configured/eligible
         all_segments = self._stitch_fragments(all_segments)
@@ -3291,109 +3511,206 @@ class AgnosticSegmenter:
         return out
     
     def _generate_overlay(self, segments_data: Dict[str, Any], pdf_path: Path) -> bool:
-        """Generate PDF overlay with visual segments."""
-        try:
-            doc = fitz.open(str(pdf_path))
-            
-            # Group segments by page
-            by_page: Dict[int, List[Dict[str, Any]]] = {}
-            raw_segments = segments_data["segments"]
-            for segment in raw_segments:
-                page = int(segment.get("page", 0) or 0)
-                if page > 0:
-                    by_page.setdefault(page, []).append(segment)
-            # Also draw cross-page parts if present
-            for segment in raw_segments:
-                if segment.get("spanning") and segment.get("parts"):
-                    for idx, part in enumerate(segment["parts"], start=1):
-                        ppage = int(part.get("page", 0) or 0)
-                        if ppage <= 0:
-                            continue
-                        ghost = {
-                            "id": f"{segment.get('id')}#part{idx}",
-                            "type": "region",
-                            "page": ppage,
-                            "bbox": part.get("bbox"),
-                            "label": f"{segment.get('id')} [p{idx}]",
-                            "metadata": {"role": "fragment", "ghost": True}
-                        }
-                        by_page.setdefault(ppage, []).append(ghost)
-            
-            # Draw on each page
-            for page_num, segments in by_page.items():
-                if page_num - 1 >= len(doc):
-                    continue
-                
-                page = doc[page_num - 1]
-                for segment in segments:
-                    self._draw_segment(page, segment)
-            
-            # Save overlay
-            overlay_path = pdf_path.parent / f"{pdf_path.stem}-overlay.pdf"
-            doc.save(str(overlay_path))
-            doc.close()
-            
-            logger.info(f"Overlay saved to: {overlay_path}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Failed to generate overlay: {e}")
-            return False
-    
-    def _draw_segment(self, page: 'fitz.Page', segment: Dict[str, Any]) -> None:
-        """Draw a segment on a PDF page."""
-        # Get page dimensions
-        rect = page.rect
-        w, h = rect.width, rect.height
-        
-        # Convert normalized coords to PDF coords
-        bbox = segment["bbox"]
-        pdf_rect = fitz.Rect(
-            bbox[0] * w, bbox[1] * h,
-            bbox[2] * w, bbox[3] * h
-        )
-        
-        # Get color based on ID
-        colors = {
-            "header": (0, 0, 1),
-            "footer": (1, 0, 0),
-            "invoice_number": (0, 1, 0),
-            "amount": (1, 0, 1),
-        }
-        # Alternate color for ghost parts
-        if segment.get("metadata", {}).get("ghost"):
-            color = (0.2, 0.7, 0.2)
-        else:
-            color = colors.get(segment["id"], (0.5, 0.5, 0.5))
-        
-        # Draw rectangle
-        page.draw_rect(pdf_rect, color=color, width=2)
-        
-        # Add label
-        label = segment.get("label", segment["id"])
-        page.insert_text(
-            fitz.Point(pdf_rect.x0, pdf_rect.y0 - 2),
-            label,
-            fontsize=10,
-            color=color
-        )
+        """Generate PDF overlay with visual segments next to the source PDF."""
+        return render_overlay(segments_data, pdf_path, pdf_path.parent / f"{pdf_path.stem}-overlay.pdf")
+
+
+# ============================================================================
+# Overlay rendering (on demand, from stored segments)
+# ============================================================================
+
+def parse_pages(spec: Optional[str], page_count: Optional[int] = None) -> Optional[Set[int]]:
+    """Parse a page selection like "1,3-4" into a set of 1-based pages (None = all).
+
+    Ranges are clamped to ``page_count`` so "1-1000000000" costs no more than
+    the document's pages; malformed parts raise ValueError.
+    """
+    if not spec or not str(spec).strip():
+        return None
+    pages: Set[int] = set()
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        first = int(lo)
+        last = int(hi) if hi else first
+        if first < 1 or last < first:
+            raise ValueError(f"Invalid page range: {part!r}")
+        if page_count is not None:
+            last = min(last, page_count)
+        pages.update(range(first, last + 1))
+    return pages
+
+
+def _pdf_page_count(pdf_path: Path) -> int:
+    if not PDF_OVERLAY_AVAILABLE:
+        return 0
+    with fitz.open(str(pdf_path)) as doc:
+        return len(doc)
+
+
+def render_overlay(
+    segments_data: Dict[str, Any],
+    pdf_path: Path,
+    out_path: Path,
+    pages: Optional[Set[int]] = None,
+) -> bool:
+    """Draw segments onto a copy of the PDF; with `pages`, only those pages are kept."""
+    if not PDF_OVERLAY_AVAILABLE:
+        logger.error("PyMuPDF not available; cannot render overlay")
+        return False
+    try:
+        doc = fitz.open(str(pdf_path))
+
+        # Group segments by page
+        by_page: Dict[int, List[Dict[str, Any]]] = {}
+        raw_segments = segments_data["segments"]
+        for segment in raw_segments:
+            page = int(segment.get("page", 0) or 0)
+            if page > 0:
+                by_page.setdefault(page, []).append(segment)
+        # Also draw cross-page parts if present
+        for segment in raw_segments:
+            if segment.get("spanning") and segment.get("parts"):
+                for idx, part in enumerate(segment["parts"], start=1):
+                    ppage = int(part.get("page", 0) or 0)
+                    if ppage <= 0:
+                        continue
+                    ghost = {
+                        "id": f"{segment.get('id')}#part{idx}",
+                        "type": "region",
+                        "page": ppage,
+                        "bbox": part.get("bbox"),
+                        "label": f"{segment.get('id')} [p{idx}]",
+                        "metadata": {"role": "fragment", "ghost": True}
+                    }
+                    by_page.setdefault(ppage, []).append(ghost)
+
+        # Draw on each page
+        for page_num, segments in by_page.items():
+            if page_num - 1 >= len(doc) or (pages is not None and page_num not in pages):
+                continue
+
+            page = doc[page_num - 1]
+            for segment in segments:
+                _draw_segment(page, segment)
+
+        if pages is not None:
+            keep = sorted(p - 1 for p in pages if 0 < p <= len(doc))
+            if not keep:
+                doc.close()
+                logger.error(f"No pages of {pdf_path.name} match selection {sorted(pages)}")
+                return False
+            doc.select(keep)
+
+        # Save overlay
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        doc.save(str(out_path))
+        doc.close()
+
+        logger.info(f"Overlay saved to: {out_path}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Failed to generate overlay: {e}")
+        return False
+
+
+def _draw_segment(page: 'fitz.Page', segment: Dict[str, Any]) -> None:
+    """Draw a segment on a PDF page."""
+    # Get page dimensions
+    rect = page.rect
+    w, h = rect.width, rect.height
+
+    # Convert normalized coords to PDF coords
+    bbox = segment["bbox"]
+    pdf_rect = fitz.Rect(
+        bbox[0] * w, bbox[1] * h,
+        bbox[2] * w, bbox[3] * h
+    )
+
+    # Get color based on ID
+    colors = {
+        "header": (0, 0, 1),
+        "footer": (1, 0, 0),
+        "invoice_number": (0, 1, 0),
+        "amount": (1, 0, 1),
+    }
+    # Alternate color for ghost parts
+    if segment.get("metadata", {}).get("ghost"):
+        color = (0.2, 0.7, 0.2)
+    else:
+        color = colors.get(segment["id"], (0.5, 0.5, 0.5))
+
+    # Draw rectangle
+    page.draw_rect(pdf_rect, color=color, width=2)
+
+    # Add label
+    label = segment.get("label", segment["id"])
+    page.insert_text(
+        fitz.Point(pdf_rect.x0, pdf_rect.y0 - 2),
+        label,
+        fontsize=10,
+        color=color
+    )
+
+
+# ============================================================================
+# Page-parallel worker (process pool)
+# ============================================================================
+
+_WORKER_SEGMENTER: Optional[AgnosticSegmenter] = None
+
+
+def _init_page_worker(config: Dict[str, Any]) -> None:
+    global _WORKER_SEGMENTER
+    _WORKER_SEGMENTER = AgnosticSegmenter(config=config)
+
+
+def _segment_page_worker(job: Tuple[Any, ...]) -> Dict[str, Any]:
+    return _WORKER_SEGMENTER._segment_page(*job)
 
 
 def main():
     """CLI entry point."""
     parser = argparse.ArgumentParser(description="Agnostic Region-Based Segmenter")
-    parser.add_argument("--in", dest="inp", required=True, help="Input normalized JSON")
-    parser.add_argument("--out", required=True, help="Output segmented JSON")
+    parser.add_argument("--in", dest="inp", help="Input normalized JSON")
+    parser.add_argument("--out", required=True, help="Output segmented JSON (overlay PDF with --from-segments)")
     parser.add_argument(
         "--tokenizer",
-        required=True,
         choices=["plumber", "pymupdf"],
         help="Tokenizer engine to consume from Stage 2 output",
     )
     parser.add_argument("--config", help="Configuration file")
     parser.add_argument("--overlay", help="Source PDF for overlay generation")
+    parser.add_argument(
+        "--from-segments",
+        help="Render only the overlay from an existing segments JSON (no segmentation; needs --overlay)",
+    )
+    parser.add_argument("--pages", help="Overlay page selection, e.g. 1,3-4 (default: all pages)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help=f"Per-page worker processes (0 = auto from {PARALLEL_MIN_PAGES} pages, 1 = sequential)",
+    )
     
     args = parser.parse_args()
+
+    if args.from_segments:
+        if not args.overlay:
+            parser.error("--from-segments requires --overlay <pdf>")
+        segments_data = json.loads(Path(args.from_segments).read_text(encoding="utf-8"))
+        try:
+            pages = parse_pages(args.pages, _pdf_page_count(Path(args.overlay)) if args.pages else None)
+        except ValueError as e:
+            parser.error(str(e))
+        ok = render_overlay(segments_data, Path(args.overlay), Path(args.out), pages)
+        raise SystemExit(0 if ok else 1)
+
+    if not args.inp or not args.tokenizer:
+        parser.error("--in and --tokenizer are required")
     
     segmenter = AgnosticSegmenter(
         Path(args.config) if args.config else None
@@ -3403,7 +3720,8 @@ def main():
         Path(args.inp),
         Path(args.out),
         args.tokenizer,
-        Path(args.overlay) if args.overlay else None
+        Path(args.overlay) if args.overlay else None,
+        workers=args.workers,
     )
 
 
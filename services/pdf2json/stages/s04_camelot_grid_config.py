@@ -181,6 +181,7 @@ def _split_trailing_fragment(text: Optional[str]) -> Tuple[str, Optional[str]]:
 
 
 NUMERIC_FAMILIES = {"QTY", "UNIT_PRICE", "DISCOUNT", "TOTAL_PRICE", "TOTAL", "AMOUNT"}
+DEFAULT_SEGMENT_REGIONS = ("table", "table_body", "items")
 NUMERIC_ANCHOR_RE = re.compile(r"^[0-9][0-9.,]*$")
 NUMERIC_X_THRESHOLD_FRACTION = 0.45
 NUMERIC_TOKEN_RE = re.compile(r"-?\d[\d.,]*")
@@ -281,6 +282,8 @@ class TemplateConfig:
     page_row_limit: Dict[int, int]
     row_fix: RowFixOptions
     token_engine: str
+    segment_regions: List[str] = field(default_factory=lambda: list(DEFAULT_SEGMENT_REGIONS))
+    segment_pad: float = 0.005
 
 
 def _validate_config(cfg: Dict[str, Any]) -> TemplateConfig:
@@ -500,6 +503,17 @@ def _validate_config(cfg: Dict[str, Any]) -> TemplateConfig:
     if token_engine not in {"plumber", "pymupdf", "combined"}:
         token_engine = "plumber"
 
+    segments_cfg = cfg.get("segments") or {}
+    region_ids = segments_cfg.get("table_region") if isinstance(segments_cfg, dict) else None
+    if isinstance(region_ids, str):
+        region_ids = [region_ids]
+    if not isinstance(region_ids, list) or not region_ids:
+        region_ids = list(DEFAULT_SEGMENT_REGIONS)
+    try:
+        segment_pad = max(0.0, float(segments_cfg.get("pad", 0.005))) if isinstance(segments_cfg, dict) else 0.005
+    except Exception:
+        segment_pad = 0.005
+
     return TemplateConfig(
         header_aliases={str(k): list(v or []) for k, v in cfg["header_aliases"].items()},
         totals_keywords=list(cfg["totals_keywords"]),
@@ -516,6 +530,8 @@ def _validate_config(cfg: Dict[str, Any]) -> TemplateConfig:
         page_row_limit=page_row_limit,
         row_fix=row_fix,
         token_engine=token_engine,
+        segment_regions=[str(r) for r in region_ids if r],
+        segment_pad=segment_pad,
     )
 
 
@@ -585,8 +601,8 @@ def load_tokens(tokens_path: Path, preferred_engine: Optional[str] = None) -> To
     return TokensData(doc_id=raw.get("doc_id"), tokens=tokens, page_meta=pages_meta, engine=engine_used)
 
 
-def load_totals_guardrails(tokens_path: Path, totals_keywords: Iterable[str]) -> Dict[int, float]:
-    s03_path = tokens_path.with_name("s03.json")
+def load_totals_guardrails(tokens_path: Path, totals_keywords: Iterable[str], segments_path: Optional[Path] = None) -> Dict[int, float]:
+    s03_path = segments_path or tokens_path.with_name("s03.json")
     if not s03_path.exists():
         return {}
     try:
@@ -631,6 +647,84 @@ def load_totals_guardrails(tokens_path: Path, totals_keywords: Iterable[str]) ->
     return guardrails
 
 
+def load_segment_regions(segments_path: Optional[Path], region_ids: Iterable[str], pad: float = 0.0) -> Dict[int, Dict[str, Any]]:
+    """Items bands per page taken from the s03 table region(s).
+
+    A stitched region (``parts``, one fragment per page) contributes every
+    part; its own page/bbox is only the canonical fragment. The band bottom is
+    an area hint, not an end anchor: s03 regions such as ``on_pages: "first"``
+    or a document-scoped canonical fragment do not mark where the items end.
+    """
+    if segments_path is None or not segments_path.exists():
+        return {}
+    try:
+        payload = json.loads(segments_path.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+    wanted = {str(r) for r in region_ids}
+    bands: Dict[int, Dict[str, Any]] = {}
+    for seg in payload.get("segments") or []:
+        if not isinstance(seg, dict) or str(seg.get("id")) not in wanted:
+            continue
+        if (seg.get("metadata") or {}).get("ghost"):
+            continue
+        parts = [part for part in (seg.get("parts") or []) if isinstance(part, dict)]
+        source = "segment_parts" if parts else "segments"
+        for frag in parts or [seg]:
+            bbox = frag.get("bbox")
+            if not (isinstance(bbox, (list, tuple)) and len(bbox) == 4):
+                continue
+            try:
+                page = int(frag.get("page"))
+                x0, y0, x1, y1 = (float(v) for v in bbox)
+            except Exception:
+                continue
+            x0, x1 = max(0.0, min(x0, x1) - pad), min(1.0, max(x0, x1) + pad)
+            y0, y1 = max(0.0, min(y0, y1) - pad), min(1.0, max(y0, y1) + pad)
+            current = bands.get(page)
+            if current is not None:
+                x0, y0 = min(x0, current["x0"]), min(y0, current["y0"])
+                x1, y1 = max(x1, current["x1"]), max(y1, current["y1"])
+                if current["source"] == "segment_parts":
+                    source = "segment_parts"
+            bands[page] = {
+                "page": page,
+                "x0": x0,
+                "x1": x1,
+                "y0": y0,
+                "y1": y1,
+                "start_anchor": None,
+                "end_anchor": None,
+                "source": source,
+            }
+    return bands
+
+
+def plan_items_regions(
+    segment_bands: Dict[int, Dict[str, Any]],
+    resolve_fallback,
+    table_pages: Optional[List[int]],
+    document_pages: List[int],
+) -> Tuple[Dict[int, Dict[str, Any]], Optional[List[int]]]:
+    """Pick the items bands and the pages to process.
+
+    s03 bands restrict the pages only when they cover the table page by page:
+    a stitched region, or one band on every page the s00 plan (or, without a
+    plan, the document) lists. Otherwise the plan/all pages are processed,
+    with s03 bands where they exist and the token-anchor bands elsewhere.
+    ``resolve_fallback`` is only called when needed.
+    """
+    if not segment_bands:
+        return resolve_fallback(), table_pages
+    expected = set(table_pages or document_pages)
+    stitched = any(band.get("source") == "segment_parts" for band in segment_bands.values())
+    if stitched or expected <= set(segment_bands):
+        return segment_bands, sorted(segment_bands)
+    regions = dict(resolve_fallback())
+    regions.update(segment_bands)
+    return regions, table_pages
+
+
 # ---------------------------------------------------------------------------
 # Items region resolver
 # ---------------------------------------------------------------------------
@@ -919,6 +1013,7 @@ def run_camelot_tables(
     tokens: TokensData,
     table_areas: Optional[Dict[int, str]] = None,
     fallback_on_empty: bool = False,
+    only_pages: Optional[Iterable[int]] = None,
 ) -> Dict[int, List[Tuple[Any, str, str]]]:
     import camelot  # type: ignore
 
@@ -950,6 +1045,9 @@ def run_camelot_tables(
 
     by_page: Dict[int, List[Tuple[Any, str, str]]] = {}
     pages = sorted({int(t["page"]) for t in tokens.tokens})
+    if only_pages is not None:
+        allowed = {int(p) for p in only_pages}
+        pages = [p for p in pages if p in allowed]
     for page_no in pages:
         tables: List[Tuple[Any, str, str]] = []
         area = table_areas.get(page_no) if table_areas else None
@@ -1007,13 +1105,43 @@ class BaseTable:
     bbox: Dict[str, float]
 
 
-def build_base_tables(pdf_path: Path, tokens_path: Path, out_path: Path, cfg: TemplateConfig, tokens: TokensData) -> List[BaseTable]:
+def load_page_plan(plan_path: Optional[Path]) -> Optional[List[int]]:
+    """Return the table pages from an s00 preflight report, or None to process every page."""
+    if plan_path is None or not plan_path.exists():
+        return None
+    try:
+        payload = json.loads(plan_path.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    pages = (payload.get("plan") or {}).get("table_pages")
+    if not isinstance(pages, list) or not pages:
+        return None
+    return [int(p) for p in pages]
+
+
+def build_base_tables(
+    pdf_path: Path,
+    tokens_path: Path,
+    out_path: Path,
+    cfg: TemplateConfig,
+    tokens: TokensData,
+    table_pages: Optional[List[int]] = None,
+    segments_path: Optional[Path] = None,
+) -> List[BaseTable]:
     by_page_tokens: Dict[int, List[Dict[str, Any]]] = {}
     for t in tokens.tokens:
         by_page_tokens.setdefault(int(t["page"]), []).append(t)
 
-    totals_guardrails = load_totals_guardrails(tokens_path, cfg.totals_keywords)
-    items_regions = resolve_items_regions(cfg.items_region, by_page_tokens)
+    totals_guardrails = load_totals_guardrails(tokens_path, cfg.totals_keywords, segments_path)
+    # s03 table bands narrow the Camelot pass when they cover the table page by page
+    segment_bands = load_segment_regions(segments_path, cfg.segment_regions, cfg.segment_pad)
+    items_regions, table_pages = plan_items_regions(
+        segment_bands,
+        lambda: resolve_items_regions(cfg.items_region, by_page_tokens),
+        table_pages,
+        sorted(by_page_tokens),
+    )
+    skip_note = "skipped_by_segments" if segment_bands and table_pages == sorted(segment_bands) else "skipped_by_plan"
     table_areas: Dict[int, str] = {}
     if cfg.ranking.use_items_roi:
         for page, band in items_regions.items():
@@ -1027,6 +1155,7 @@ def build_base_tables(pdf_path: Path, tokens_path: Path, out_path: Path, cfg: Te
         tokens,
         table_areas=table_areas if table_areas else None,
         fallback_on_empty=bool(table_areas),
+        only_pages=table_pages,
     )
 
     family_of_header = _build_family_matcher(cfg.header_aliases)
@@ -1446,7 +1575,9 @@ def build_base_tables(pdf_path: Path, tokens_path: Path, out_path: Path, cfg: Te
             "candidates": [],
             "selected_index": selected_index,
         }
-        if not tables:
+        if table_pages is not None and page_no not in table_pages:
+            page_record["note"] = skip_note
+        elif not tables:
             page_record["note"] = "no_tables_detected"
         elif not page_candidates:
             page_record["note"] = "no_valid_candidates"
@@ -1480,6 +1611,243 @@ def build_base_tables(pdf_path: Path, tokens_path: Path, out_path: Path, cfg: Te
     return pages_out
 
 
+# ---------------------------------------------------------------------------
+# Token-geometry grid (cheap tier, no Camelot)
+# ---------------------------------------------------------------------------
+
+TOKEN_GRID_COLUMN_GAP = 0.012
+
+
+def _group_line_columns(tokens: List[Dict[str, Any]], gap: float = TOKEN_GRID_COLUMN_GAP) -> List[List[Dict[str, Any]]]:
+    groups: List[List[Dict[str, Any]]] = []
+    group_right = 0.0
+    for tok in sorted(tokens, key=_tok_left):
+        if groups and _tok_left(tok) - group_right <= gap:
+            groups[-1].append(tok)
+            group_right = max(group_right, _tok_right(tok))
+            continue
+        groups.append([tok])
+        group_right = _tok_right(tok)
+    return groups
+
+
+TOKEN_HEADER_MAX_LINES = 4
+TOKEN_HEADER_LINE_GAP = 0.012
+
+
+def _is_numeric_line(line: Dict[str, Any]) -> bool:
+    return any(NUMERIC_ANCHOR_RE.fullmatch(_token_text(t).replace(" ", "").strip("()")) for t in line["tokens"])
+
+
+def _find_token_header(
+    lines: List[Dict[str, Any]],
+    family_of_header,
+    band: Optional[Dict[str, Any]],
+) -> Optional[Tuple[int, int, List[List[Dict[str, Any]]], List[Optional[str]]]]:
+    """Locate the header block: ``(first_line, last_line, column groups, families)``.
+
+    Headers may wrap ("QTY." over "(PCS)", "UNIT PRI" / "CE" / "IDR"), so up
+    to TOKEN_HEADER_MAX_LINES closely spaced, non-numeric lines are read as
+    one block; its tokens are grouped into columns by horizontal overlap and
+    each column's text is matched against the header families. The block with
+    the most distinct families wins (fewest lines on a tie).
+    """
+    y_min = 0.0
+    y_max = 1.0
+    if band:
+        start_anchor = band.get("start_anchor") or {}
+        try:
+            y_min = float(start_anchor.get("y0")) - 0.005
+        except Exception:
+            y_min = float(band.get("y0", 0.0)) - 0.05
+        y_max = float(band.get("y1", 1.0))
+
+    def in_band(line: Dict[str, Any]) -> bool:
+        return y_min <= line["center"] <= y_max
+
+    best: Optional[Tuple[int, int, int, List[List[Dict[str, Any]]], List[Optional[str]]]] = None
+    for first, line in enumerate(lines):
+        if not in_band(line) or _is_numeric_line(line):
+            continue
+        last = first
+        while True:
+            block_tokens = [tok for ln in lines[first:last + 1] for tok in ln["tokens"]]
+            line_of = {id(tok): idx for idx in range(first, last + 1) for tok in lines[idx]["tokens"]}
+            # Each column's tokens in reading order: line by line, left to right
+            groups = [
+                sorted(grp, key=lambda t: (line_of[id(t)], _tok_left(t)))
+                for grp in _group_line_columns(block_tokens)
+            ]
+            families = [family_of_header(" ".join(_token_text(t) for t in grp)) for grp in groups]
+            hits = len({fam for fam in families if fam})
+            if hits >= 2 and (best is None or hits > best[0]):
+                best = (hits, first, last, groups, families)
+            nxt = last + 1
+            if (
+                nxt - first >= TOKEN_HEADER_MAX_LINES
+                or nxt >= len(lines)
+                or lines[nxt]["center"] - lines[last]["center"] > TOKEN_HEADER_LINE_GAP
+                or not in_band(lines[nxt])
+                or _is_numeric_line(lines[nxt])
+            ):
+                break
+            last = nxt
+    if best is None:
+        return None
+    return best[1], best[2], best[3], best[4]
+
+
+def build_token_tables(
+    cfg: TemplateConfig,
+    tokens: TokensData,
+    segments_path: Optional[Path] = None,
+    table_pages: Optional[List[int]] = None,
+) -> List[BaseTable]:
+    """Rebuild the item grid from token geometry alone.
+
+    Columns come from the header line (token clusters separated by horizontal
+    gaps, split at the midpoints between clusters); rows start on lines that
+    carry a number in a numeric column and absorb the text-only lines below
+    them. The output matches :func:`build_base_tables` so the row fixer and
+    later stages do not care which engine produced it.
+    """
+    by_page_tokens: Dict[int, List[Dict[str, Any]]] = {}
+    for t in tokens.tokens:
+        by_page_tokens.setdefault(int(t["page"]), []).append(t)
+
+    segment_bands = load_segment_regions(segments_path, cfg.segment_regions, cfg.segment_pad)
+    items_regions, table_pages = plan_items_regions(
+        segment_bands,
+        lambda: resolve_items_regions(cfg.items_region, by_page_tokens),
+        table_pages,
+        sorted(by_page_tokens),
+    )
+    if table_pages:
+        by_page_tokens = {page: toks for page, toks in by_page_tokens.items() if page in table_pages}
+    family_of_header = _build_family_matcher(cfg.header_aliases)
+    header_prefix_map: Dict[str, List[str]] = {}
+    for fam, aliases in cfg.header_aliases.items():
+        values = [a for a in aliases if a]
+        values.append(fam)
+        uniq = {v.strip() for v in values if v and v.strip()}
+        header_prefix_map[fam.upper()] = sorted(uniq, key=lambda s: (-len(s), s.lower()))
+    totals_keys = [_canon(k) for k in cfg.totals_keywords if k]
+
+    pages_out: List[BaseTable] = []
+    prev_layout: Optional[Tuple[List[float], List[str], List[str]]] = None
+
+    for page_no in sorted(by_page_tokens.keys()):
+        band = items_regions.get(page_no)
+        lines = _cluster_tokens_by_line(by_page_tokens[page_no])
+        header = _find_token_header(lines, family_of_header, band)
+
+        if header is not None:
+            header_first, header_idx, groups, families = header
+            x_left = float(band.get("x0", 0.0)) if band else 0.0
+            x_right = float(band.get("x1", 1.0)) if band else 1.0
+            bounds = [x_left]
+            for left_grp, right_grp in zip(groups, groups[1:]):
+                gap_left = max(_tok_right(t) for t in left_grp)
+                gap_right = min(_tok_left(t) for t in right_grp)
+                bounds.append((gap_left + gap_right) / 2.0)
+            bounds.append(x_right)
+            col_map = [fam or f"COL{c+1}" for c, fam in enumerate(families)]
+            header_texts = [" ".join(_token_text(t) for t in grp).strip() for grp in groups]
+            body_lines = lines[header_idx + 1:]
+            table_top = lines[header_first]["y0"]
+        elif prev_layout is not None:
+            bounds, col_map, header_texts = prev_layout
+            body_lines = lines
+            table_top = lines[0]["y0"] if lines else 0.0
+        else:
+            pages_out.append(BaseTable(page=page_no, flavor=None, header_row_index=None, header_cells=[], rows=[], bbox={}))
+            continue
+
+        stop_y: Optional[float] = None
+        if band and isinstance(band.get("end_anchor"), dict):
+            try:
+                stop_y = float(band["end_anchor"].get("y0"))
+            except Exception:
+                stop_y = None
+        extra_keys = [_canon(k) for k in cfg.page_stop_keywords.get(page_no, []) if k]
+
+        cols = len(col_map)
+        numeric_cols = [c for c, name in enumerate(col_map) if name.upper() in NUMERIC_FAMILIES]
+
+        def column_of(tok: Dict[str, Any]) -> int:
+            # Numbers are right-aligned under their header, text is left-aligned
+            simple = _token_text(tok).replace(" ", "").strip("()")
+            x = _tok_right(tok) - 1e-4 if NUMERIC_ANCHOR_RE.fullmatch(simple) else _tok_left(tok) + 1e-4
+            for c in range(cols):
+                if x < bounds[c + 1]:
+                    return c
+            return cols - 1
+
+        row_groups: List[List[Dict[str, Any]]] = []
+        for line in body_lines:
+            if stop_y is not None and line["y0"] >= stop_y - 0.002:
+                break
+            joined = _canon(line.get("text", ""))
+            if cfg.stop_after_totals and joined and any(k and k in joined for k in totals_keys):
+                break
+            if joined and any(k in joined for k in extra_keys):
+                break
+            starts_row = not numeric_cols or any(
+                column_of(tok) in numeric_cols and any(ch.isdigit() for ch in _token_text(tok))
+                for tok in line["tokens"]
+            )
+            if starts_row:
+                row_groups.append([line])
+            elif row_groups:
+                row_groups[-1].append(line)
+
+        grid_rows: List[Dict[str, Any]] = []
+        for r, group in enumerate(row_groups):
+            y0 = min(ln["y0"] for ln in group)
+            y1 = max(ln["y1"] for ln in group)
+            col_tokens: Dict[int, List[str]] = {}
+            for ln in group:
+                for tok in sorted(ln["tokens"], key=_tok_left):
+                    text = _token_text(tok)
+                    if text:
+                        col_tokens.setdefault(column_of(tok), []).append(text)
+            texts = [" ".join(" ".join(col_tokens.get(c, [])).split()) for c in range(cols)]
+            if _is_repeat_header_row(texts, col_map, header_prefix_map):
+                continue
+            cells = []
+            for c in range(cols):
+                value = texts[c]
+                prefixes = header_prefix_map.get(col_map[c].upper(), [])
+                if prefixes:
+                    value = _strip_alias_prefix(value, prefixes)
+                if col_map[c].upper() in NUMERIC_FAMILIES:
+                    value = _trim_numeric_tail(value)
+                cells.append({
+                    "col": c,
+                    "name": col_map[c],
+                    "bbox": {"x0": bounds[c], "y0": y0, "x1": bounds[c + 1], "y1": y1},
+                    "text": value,
+                })
+            grid_rows.append({"row": r, "cells": cells})
+
+        limit = cfg.page_row_limit.get(page_no)
+        if limit is not None:
+            grid_rows = grid_rows[:limit]
+
+        table_bottom = max((ln["y1"] for grp in row_groups for ln in grp), default=table_top)
+        pages_out.append(BaseTable(
+            page=page_no,
+            flavor="tokens",
+            header_row_index=0 if header is not None else None,
+            header_cells=[{"col": c, "text": header_texts[c], "name": col_map[c]} for c in range(cols)],
+            rows=grid_rows,
+            bbox={"x0": bounds[0], "y0": table_top, "x1": bounds[-1], "y1": table_bottom},
+        ))
+        prev_layout = (bounds, col_map, header_texts)
+
+    return pages_out
+
+
 # ---------------------------------------------------------------------------
 # Row fixer (Stage 4.5)
 # ---------------------------------------------------------------------------
@@ -2329,11 +2697,31 @@ class RowFixer:
 # ---------------------------------------------------------------------------
 
 
-def build_cells(pdf_path: Path, tokens_path: Path, out_path: Path, config_path: Path, token_engine: Optional[str] = None) -> Dict[str, Any]:
+def build_cells(
+    pdf_path: Path,
+    tokens_path: Path,
+    out_path: Path,
+    config_path: Path,
+    token_engine: Optional[str] = None,
+    grid_engine: str = "camelot",
+    plan_path: Optional[Path] = None,
+    segments_path: Optional[Path] = None,
+) -> Dict[str, Any]:
     cfg = _validate_config(json.loads(config_path.read_text(encoding="utf-8")))
     preferred_engine = token_engine or cfg.token_engine
     tokens = load_tokens(tokens_path, preferred_engine=preferred_engine)
-    base_tables = build_base_tables(pdf_path, tokens_path, out_path, cfg, tokens)
+    if grid_engine == "tokens":
+        base_tables = build_token_tables(cfg, tokens, segments_path=segments_path, table_pages=load_page_plan(plan_path))
+    else:
+        base_tables = build_base_tables(
+            pdf_path,
+            tokens_path,
+            out_path,
+            cfg,
+            tokens,
+            table_pages=load_page_plan(plan_path),
+            segments_path=segments_path,
+        )
 
     final_tables = base_tables
     fixer = None
@@ -2368,6 +2756,7 @@ def build_cells(pdf_path: Path, tokens_path: Path, out_path: Path, config_path:
         "stage": "camelot_grid_rowfix",
         "doc_id": tokens.doc_id,
         "token_engine": tokens.engine,
+        "grid_engine": grid_engine,
         "pages": [
             {
                 "page": p.get("page"),
@@ -2394,6 +2783,14 @@ def main() -> None:
     ap.add_argument("--out", required=True)
     ap.add_argument("--config", required=True)
     ap.add_argument("--tokenizer", required=False, help="Token source override (plumber, pymupdf, combined)")
+    ap.add_argument(
+        "--engine",
+        choices=["camelot", "tokens"],
+        default="camelot",
+        help="Grid engine: camelot (lattice/stream) or tokens (token geometry only, no Camelot)",
+    )
+    ap.add_argument("--plan", required=False, help="s00 preflight JSON; only its table_pages are processed")
+    ap.add_argument("--segments", required=False, help="s03 segments JSON; restricts pages and table areas to the table region")
     args = ap.parse_args()
 
     token_engine = args.tokenizer.strip().lower() if getattr(args, "tokenizer", None) else None
@@ -2404,6 +2801,9 @@ def main() -> None:
         Path(args.out).resolve(),
         Path(args.config).resolve(),
         token_engine=token_engine,
+        grid_engine=args.engine,
+        plan_path=Path(args.plan).resolve() if args.plan else None,
+        segments_path=Path(args.segments).resolve() if args.segments else None,
     )
 
 
@@ -3,23 +3,41 @@
 This module rebuilds reading-order lines from S02 tokens, filters regions
 (header, total, etc.) based on S03, indexes them into Postgres/pgvector, and performs
 hybrid retrieval (dense + keyword) with optional reranking via Ollama.
+
+Retrieval runs in-process by default (NumPy dense scores + a local BM25 keyword
+scorer over the region's lines); Postgres is an optional persistence sink
+(``--persist``) or the retrieval backend with ``--retriever pg``.
+
+Region lines are bulk-inserted and, unless persisted, deleted once the
+document is done; ``s04_rag.py maintenance`` prunes old rows (``--prune-days``),
+vacuums and prints a table/index bloat report.
+
+Embeddings are requested in batches and kept in a persistent SQLite cache
+(``EMBED_CACHE_PATH``, empty to disable) keyed by model, dimension and text.
 """
 
 from __future__ import annotations
 
 import argparse
 import copy
+import hashlib
 import json
 import logging
 import math
 import os
 import re
+import sqlite3
 import sys
-from dataclasses import dataclass
-from typing import Callable, Dict, Iterable, List, Optional, Pattern, Sequence, Tuple, TypedDict
+import tempfile
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Pattern, Sequence, Tuple, TypedDict
 
+import numpy as np
 import psycopg2
-from psycopg2.extras import Json
+from psycopg2.extras import Json, execute_values
+from psycopg2.sql import SQL, Identifier
 import requests
 
 
@@ -680,9 +698,22 @@ def pg_connect_from_env():
     return conn
 
 
+_SCHEMA_READY: set = set()
+
+
 def ensure_schema(conn, embed_dim: int, table_name: str = "rag_header_lines") -> None:
-    """Ensure pgvector extension and the specified region table exist."""
+    """Ensure pgvector extension and the specified region table exist.
+
+    Runs once per (connection, table, dimension); later pages and regions in
+    the same run skip straight to the inserts. s04_rag is a one-shot process,
+    so for an existing table the catalog is read first and only a missing
+    ``created_at`` column or index is added: ALTER TABLE and CREATE INDEX lock
+    the table against writers even when there is nothing to do.
+    """
 
+    key = (id(conn), table_name, embed_dim)
+    if key in _SCHEMA_READY:
+        return
     with conn.cursor() as cur:
         try:
             cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
@@ -703,6 +734,8 @@ def ensure_schema(conn, embed_dim: int, table_name: str = "rag_header_lines") ->
             (table_name,),
         )
         exists = cur.fetchone()[0]
+        columns: set = set()
+        indexes: set = set()
         if exists:
             cur.execute(
                 """
@@ -725,6 +758,19 @@ def ensure_schema(conn, embed_dim: int, table_name: str = "rag_header_lines") ->
                         f" ({current_dim}) does not match EMBED_DIM ({embed_dim})."
                         " Drop or recreate the table with the desired dimension."
                     )
+            cur.execute(
+                """
+                SELECT column_name FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = %s
+                """,
+                (table_name,),
+            )
+            columns = {row[0] for row in cur.fetchall()}
+            cur.execute(
+                "SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = %s",
+                (table_name,),
+            )
+            indexes = {row[0] for row in cur.fetchall()}
         else:
             cur.execute(
                 f"""
@@ -737,52 +783,270 @@ def ensure_schema(conn, embed_dim: int, table_name: str = "rag_header_lines") ->
                   bbox JSONB NOT NULL,
                   tokens JSONB NOT NULL,
                   ts tsvector GENERATED ALWAYS AS (to_tsvector('simple', coalesce(text, ''))) STORED,
-                  embedding vector({embed_dim}) NOT NULL
+                  embedding vector({embed_dim}) NOT NULL,
+                  created_at TIMESTAMPTZ NOT NULL DEFAULT now()
                 )
                 """
             )
-        cur.execute(
-            f"CREATE INDEX IF NOT EXISTS {table_name}_doc_page_idx ON {table_name}(doc_id, page)"
-        )
-        cur.execute(
-            f"CREATE INDEX IF NOT EXISTS {table_name}_ts_idx ON {table_name} USING GIN(ts)"
-        )
-        cur.execute(
-            f"""
-            CREATE INDEX IF NOT EXISTS {table_name}_vec_idx
-            ON {table_name} USING ivfflat (embedding vector_cosine_ops)
-            """
-        )
+            columns = {"created_at"}
+        if "created_at" not in columns:
+            # Tables created before retention support lack created_at
+            cur.execute(
+                f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ NOT NULL DEFAULT now()"
+            )
+        index_ddl = {
+            f"{table_name}_created_idx": f"ON {table_name}(created_at)",
+            f"{table_name}_doc_page_idx": f"ON {table_name}(doc_id, page)",
+            f"{table_name}_ts_idx": f"ON {table_name} USING GIN(ts)",
+            f"{table_name}_vec_idx": f"ON {table_name} USING ivfflat (embedding vector_cosine_ops)",
+        }
+        for index_name, definition in index_ddl.items():
+            if index_name not in indexes:
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} {definition}")
     conn.commit()
+    _SCHEMA_READY.add(key)
 
 
-def embed_text_ollama(text: str) -> List[float]:
-    """Request a dense embedding from Ollama."""
+class EmbeddingCache:
+    """Persistent embedding cache (SQLite) keyed by model, dimension, endpoint and text hash.
 
-    base_url = os.getenv("OLLAMA_BASE_URL", "http://192.168.86.123:11434")
-    model = os.getenv("EMBED_MODEL", "bge-m3")
-    embed_dim = int(os.getenv("EMBED_DIM", "1024"))
-    try:
-        response = requests.post(
-            f"{base_url.rstrip('/')}/api/embeddings",
-            json={"model": model, "prompt": text},
-            timeout=(10, 60),
-        )
-    except requests.RequestException as exc:
-        raise RuntimeError(f"Embedding request failed: {exc}") from exc
-    if response.status_code != 200:
-        raise RuntimeError(
-            f"Embedding request failed with status {response.status_code}: {response.text.strip()}"
+    Shared by every s04_rag run on the worker, so vendor boilerplate lines and
+    the fixed field queries are embedded once. The endpoint is part of the key
+    because ``/api/embed`` returns normalised vectors and ``/api/embeddings``
+    does not. Beyond ``max_rows`` (0 = unbounded) the least recently used
+    rows are dropped. Cache errors never fail a run: the cache just stops
+    being used.
+    """
+
+    def __init__(self, path: str, max_rows: int = 50000) -> None:
+        self.path = path
+        self.max_rows = max(0, max_rows)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._rows = 0
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            conn = sqlite3.connect(path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                  key TEXT PRIMARY KEY,
+                  model TEXT NOT NULL,
+                  dim INTEGER NOT NULL,
+                  vec BLOB NOT NULL,
+                  created_at REAL NOT NULL,
+                  last_used REAL NOT NULL DEFAULT 0
+                )
+                """
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(embeddings)")}
+            if "last_used" not in columns:
+                # Caches from before LRU pruning; their rows are the first to go
+                conn.execute("ALTER TABLE embeddings ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used_idx ON embeddings(last_used)")
+            conn.commit()
+            self._rows = int(conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0])
+            self._conn = conn
+        except (OSError, sqlite3.Error) as exc:
+            logger.warning("Embedding cache disabled (%s): %s", path, exc)
+
+    @staticmethod
+    def key(model: str, dim: int, text: str, endpoint: str = "/api/embed") -> str:
+        return hashlib.sha256(f"{model}\x00{dim}\x00{endpoint}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        if self._conn is None or not keys:
+            return {}
+        found: Dict[str, List[float]] = {}
+        try:
+            for start in range(0, len(keys), 500):
+                chunk = list(keys[start:start + 500])
+                placeholders = ",".join("?" for _ in chunk)
+                rows = self._conn.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[key] = vec.tolist()
+            if found:
+                hits = list(found)
+                now = time.time()
+                for start in range(0, len(hits), 500):
+                    chunk = hits[start:start + 500]
+                    placeholders = ",".join("?" for _ in chunk)
+                    self._conn.execute(f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})", [now, *chunk])
+                self._conn.commit()
+        except sqlite3.Error as exc:
+            logger.warning("Embedding cache read failed: %s", exc)
+        return found
+
+    def put_many(self, model: str, dim: int, items: Dict[str, Sequence[float]]) -> None:
+        if self._conn is None or not items:
+            return
+        now = time.time()
+        try:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dim, vec, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, model, dim, array("f", vec).tobytes(), now, now) for key, vec in items.items()],
+            )
+            self._conn.commit()
+            # Upper bound (replacements and other workers' writes); recounted before pruning
+            self._rows += len(items)
+            if self.max_rows and self._rows > self.max_rows:
+                self.prune()
+        except sqlite3.Error as exc:
+            logger.warning("Embedding cache write failed: %s", exc)
+
+    def prune(self) -> int:
+        """Drop the least recently used rows beyond ``max_rows``; returns the number removed."""
+        if self._conn is None:
+            return 0
+        rows = int(self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0])
+        excess = rows - self.max_rows if self.max_rows else 0
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self._conn.commit()
+            rows -= excess
+        self._rows = rows
+        return max(0, excess)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+@dataclass
+class OllamaEmbedder:
+    """Batched Ollama embeddings with a persistent cache in front.
+
+    Uses ``/api/embed`` (list input) in chunks of ``batch_size``; servers that
+    only expose the legacy ``/api/embeddings`` endpoint get one request per text.
+    """
+
+    base_url: str
+    model: str
+    embed_dim: int
+    batch_size: int = 32
+    cache: Optional[EmbeddingCache] = None
+    stats: Dict[str, int] = field(default_factory=lambda: {"requests": 0, "cache_hits": 0, "embedded": 0})
+    _batch_endpoint: bool = True
+
+    @classmethod
+    def from_env(cls) -> "OllamaEmbedder":
+        cache_path = os.getenv(
+            "EMBED_CACHE_PATH",
+            os.path.join(tempfile.gettempdir(), "s04_rag", "embeddings.sqlite"),
         )
-    payload = response.json()
-    embedding = payload.get("embedding")
-    if not isinstance(embedding, list):
-        raise RuntimeError("Embedding response missing 'embedding' list.")
-    if len(embedding) != embed_dim:
-        raise RuntimeError(
-            f"Embedding dimension mismatch: expected {embed_dim}, received {len(embedding)}."
+        return cls(
+            base_url=os.getenv("OLLAMA_BASE_URL", "http://192.168.86.123:11434"),
+            model=os.getenv("EMBED_MODEL", "bge-m3"),
+            embed_dim=int(os.getenv("EMBED_DIM", "1024")),
+            batch_size=max(1, int(os.getenv("EMBED_BATCH_SIZE", "32"))),
+            cache=EmbeddingCache(cache_path, int(os.getenv("EMBED_CACHE_MAX_ROWS", "50000"))) if cache_path else None,
         )
-    return [float(value) for value in embedding]
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_many([text])[0]
+
+    @property
+    def endpoint(self) -> str:
+        return "/api/embed" if self._batch_endpoint else "/api/embeddings"
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embed texts in order; cached and duplicate texts are not sent again."""
+        endpoint = self.endpoint
+        vectors, cache_hits = self._embed_many(texts)
+        if cache_hits and self.endpoint != endpoint:
+            # /api/embed turned out to be missing: do not mix its cached vectors with legacy ones
+            vectors, _ = self._embed_many(texts)
+        return vectors
+
+    def _embed_many(self, texts: Sequence[str]) -> Tuple[List[List[float]], int]:
+        keys = [EmbeddingCache.key(self.model, self.embed_dim, text, self.endpoint) for text in texts]
+        known = self.cache.get_many(sorted(set(keys))) if self.cache else {}
+        cache_hits = sum(1 for key in keys if key in known)
+        self.stats["cache_hits"] += cache_hits
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in known and key not in missing:
+                missing[key] = text
+        if missing:
+            pending = list(missing.items())
+            fresh: Dict[str, List[float]] = {}
+            # Cached under the endpoint that actually served each chunk
+            to_cache: Dict[str, List[float]] = {}
+            for start in range(0, len(pending), self.batch_size):
+                chunk = pending[start:start + self.batch_size]
+                vectors = self._request([text for _, text in chunk])
+                for (key, text), vec in zip(chunk, vectors):
+                    fresh[key] = vec
+                    to_cache[EmbeddingCache.key(self.model, self.embed_dim, text, self.endpoint)] = vec
+            self.stats["embedded"] += len(fresh)
+            if self.cache:
+                self.cache.put_many(self.model, self.embed_dim, to_cache)
+            known.update(fresh)
+        return [known[key] for key in keys], cache_hits
+
+    def _request(self, texts: List[str]) -> List[List[float]]:
+        if self._batch_endpoint:
+            self.stats["requests"] += 1
+            payload = self._post("/api/embed", {"model": self.model, "input": texts})
+            if payload is not None:
+                embeddings = payload.get("embeddings")
+                if not isinstance(embeddings, list) or len(embeddings) != len(texts):
+                    raise RuntimeError("Embedding response missing 'embeddings' list.")
+                return [self._check(vec) for vec in embeddings]
+            # Older Ollama without /api/embed: fall back to one request per text
+            self._batch_endpoint = False
+        vectors = []
+        for text in texts:
+            self.stats["requests"] += 1
+            payload = self._post("/api/embeddings", {"model": self.model, "prompt": text})
+            if payload is None:
+                raise RuntimeError("Embedding endpoint not found on Ollama.")
+            vectors.append(self._check(payload.get("embedding")))
+        return vectors
+
+    def _post(self, path: str, body: Dict[str, object]) -> Optional[dict]:
+        """POST to Ollama; None when the endpoint does not exist (404)."""
+        try:
+            response = requests.post(f"{self.base_url.rstrip('/')}{path}", json=body, timeout=(10, 60))
+        except requests.RequestException as exc:
+            raise RuntimeError(f"Embedding request failed: {exc}") from exc
+        if response.status_code == 404 and path == "/api/embed":
+            return None
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Embedding request failed with status {response.status_code}: {response.text.strip()}"
+            )
+        return response.json()
+
+    def _check(self, embedding) -> List[float]:
+        if not isinstance(embedding, list):
+            raise RuntimeError("Embedding response missing 'embedding' list.")
+        if len(embedding) != self.embed_dim:
+            raise RuntimeError(
+                f"Embedding dimension mismatch: expected {self.embed_dim}, received {len(embedding)}."
+            )
+        return [float(value) for value in embedding]
+
+
+_DEFAULT_EMBEDDER: Optional[OllamaEmbedder] = None
+
+
+def embed_text_ollama(text: str) -> List[float]:
+    """Request a dense embedding from Ollama (cached, via the shared embedder)."""
+
+    global _DEFAULT_EMBEDDER
+    if _DEFAULT_EMBEDDER is None:
+        _DEFAULT_EMBEDDER = OllamaEmbedder.from_env()
+    return _DEFAULT_EMBEDDER.embed(text)
 
 
 def _vector_literal(vec: Sequence[float]) -> str:
@@ -808,36 +1072,160 @@ def upsert_lines(
     doc_id: str,
     page: int,
     lines: Sequence[Line],
-    embed: Callable[[str], Sequence[float]],
+    embed_many: Callable[[Sequence[str]], Sequence[Sequence[float]]],
     table_name: str = "rag_header_lines",
 ) -> int:
-    """Insert region lines with embeddings inside a single transaction."""
+    """Insert region lines with embeddings inside a single transaction.
 
-    inserted = 0
+    All line texts are embedded in one batched call, then inserted with one
+    multi-row INSERT (execute_values) instead of a statement per line.
+    """
+
+    lines = [line for line in lines if line.text]
+    if not lines:
+        return 0
+    embeddings = embed_many([line.text for line in lines])
+    rows = []
+    for line, embedding in zip(lines, embeddings):
+        bbox_json, tokens_json = _line_to_payload(line)
+        rows.append(
+            (
+                doc_id,
+                page,
+                line.line_no,
+                line.text,
+                Json(bbox_json),
+                Json(tokens_json),
+                _vector_literal(embedding),
+            )
+        )
     with conn.cursor() as cur:
-        for line in lines:
-            if not line.text:
+        execute_values(
+            cur,
+            f"INSERT INTO {table_name} (doc_id, page, line_no, text, bbox, tokens, embedding) VALUES %s",
+            rows,
+            template="(%s, %s, %s, %s, %s, %s, %s::vector)",
+            page_size=500,
+        )
+    conn.commit()
+    return len(rows)
+
+
+def delete_doc_lines(conn, doc_id: str, table_name: str = "rag_header_lines") -> int:
+    """Drop every row of a document from a region table; returns the row count."""
+
+    with conn.cursor() as cur:
+        cur.execute(SQL("DELETE FROM {} WHERE doc_id = %s").format(Identifier(table_name)), (doc_id,))
+        deleted = cur.rowcount
+    conn.commit()
+    return deleted
+
+
+def prune_lines(conn, table_name: str, older_than_days: int) -> int:
+    """Retention: delete rows older than the given number of days."""
+
+    with conn.cursor() as cur:
+        cur.execute(
+            SQL("DELETE FROM {} WHERE created_at < now() - make_interval(days => %s)").format(Identifier(table_name)),
+            (int(older_than_days),),
+        )
+        deleted = cur.rowcount
+    conn.commit()
+    return deleted
+
+
+def list_region_tables(conn) -> List[str]:
+    """Region line tables present in the public schema (rag_*_lines)."""
+
+    with conn.cursor() as cur:
+        cur.execute(
+            r"""
+            SELECT table_name FROM information_schema.tables
+            WHERE table_schema = 'public' AND table_name LIKE 'rag\_%\_lines'
+            ORDER BY table_name
+            """
+        )
+        return [row[0] for row in cur.fetchall()]
+
+
+def bloat_report(conn, tables: Sequence[str]) -> List[Dict[str, object]]:
+    """Size, dead-tuple and per-index statistics for the region tables."""
+
+    report: List[Dict[str, object]] = []
+    with conn.cursor() as cur:
+        for table_name in tables:
+            cur.execute(
+                """
+                SELECT n_live_tup, n_dead_tup, last_vacuum, last_autovacuum,
+                       pg_relation_size(relid), pg_indexes_size(relid), pg_total_relation_size(relid)
+                FROM pg_stat_user_tables
+                WHERE schemaname = 'public' AND relname = %s
+                """,
+                (table_name,),
+            )
+            row = cur.fetchone()
+            if row is None:
                 continue
-            embedding = embed(line.text)
-            bbox_json, tokens_json = _line_to_payload(line)
+            live, dead, last_vacuum, last_autovacuum, heap_bytes, index_bytes, total_bytes = row
             cur.execute(
-                f"""
-                INSERT INTO {table_name} (doc_id, page, line_no, text, bbox, tokens, embedding)
-                VALUES (%s, %s, %s, %s, %s, %s, %s::vector)
+                """
+                SELECT indexrelname, pg_relation_size(indexrelid), idx_scan
+                FROM pg_stat_user_indexes
+                WHERE schemaname = 'public' AND relname = %s
+                ORDER BY indexrelname
                 """,
-                (
-                    doc_id,
-                    page,
-                    line.line_no,
-                    line.text,
-                    Json(bbox_json),
-                    Json(tokens_json),
-                    _vector_literal(embedding),
-                ),
+                (table_name,),
+            )
+            indexes = [
+                {"name": name, "bytes": int(size), "scans": int(scans or 0)}
+                for name, size, scans in cur.fetchall()
+            ]
+            cur.execute(
+                SQL("SELECT count(DISTINCT doc_id), min(created_at), max(created_at) FROM {}").format(
+                    Identifier(table_name)
+                )
+            )
+            docs, oldest, newest = cur.fetchone()
+            live = int(live or 0)
+            dead = int(dead or 0)
+            report.append(
+                {
+                    "table": table_name,
+                    "live_rows": live,
+                    "dead_rows": dead,
+                    "dead_ratio": round(dead / (live + dead), 4) if (live + dead) else 0.0,
+                    "documents": int(docs or 0),
+                    "oldest": oldest.isoformat() if oldest else None,
+                    "newest": newest.isoformat() if newest else None,
+                    "heap_bytes": int(heap_bytes),
+                    "index_bytes": int(index_bytes),
+                    "total_bytes": int(total_bytes),
+                    "bytes_per_live_row": round(int(total_bytes) / live, 1) if live else None,
+                    "last_vacuum": (last_vacuum or last_autovacuum).isoformat() if (last_vacuum or last_autovacuum) else None,
+                    "indexes": indexes,
+                }
             )
-            inserted += 1
     conn.commit()
-    return inserted
+    return report
+
+
+_PREPARED: set = set()
+
+
+def _execute_prepared(cur, name: str, param_types: str, sql: str, params: Sequence[object]) -> None:
+    """EXECUTE a server-side prepared statement, preparing it on first use per connection.
+
+    ``sql`` uses $1..$n placeholders. s04_rag runs as a one-shot subprocess
+    with its own connection (the worker's db.py pool cannot be shared across
+    the process boundary), so this keeps the per-field retrieval queries of a
+    run from being parsed and planned again for every field and region.
+    """
+    key = (id(cur.connection), name)
+    if key not in _PREPARED:
+        cur.execute(f"PREPARE {name} ({param_types}) AS {sql}")
+        _PREPARED.add(key)
+    placeholders = ", ".join(["%s"] * len(params))
+    cur.execute(f"EXECUTE {name} ({placeholders})", tuple(params))
 
 
 def dense_candidates(
@@ -850,15 +1238,18 @@ def dense_candidates(
 ) -> List[Dict[str, object]]:
     vec_literal = _vector_literal(qvec)
     with conn.cursor() as cur:
-        cur.execute(
+        _execute_prepared(
+            cur,
+            f"{table_name}_dense",
+            "text, text, int, int",
             f"""
-            SELECT id, line_no, text, embedding <-> %s::vector AS distance
+            SELECT id, line_no, text, embedding <-> $1::vector AS distance
             FROM {table_name}
-            WHERE doc_id = %s AND page = %s
-            ORDER BY embedding <-> %s::vector
-            LIMIT %s
+            WHERE doc_id = $2 AND page = $3
+            ORDER BY embedding <-> $1::vector
+            LIMIT $4
             """,
-            (vec_literal, doc_id, page, vec_literal, topk),
+            (vec_literal, doc_id, page, topk),
         )
         rows = cur.fetchall()
     results: List[Dict[str, object]] = []
@@ -888,11 +1279,14 @@ def keyword_scores(
     if not candidate_ids:
         return {}
     with conn.cursor() as cur:
-        cur.execute(
+        _execute_prepared(
+            cur,
+            f"{table_name}_keyword",
+            "text, text, int, bigint[]",
             f"""
-            SELECT id, ts_rank(ts, websearch_to_tsquery('simple', %s))
+            SELECT id, ts_rank(ts, websearch_to_tsquery('simple', $1))
             FROM {table_name}
-            WHERE doc_id = %s AND page = %s AND id = ANY(%s)
+            WHERE doc_id = $2 AND page = $3 AND id = ANY($4)
             """,
             (query_text, doc_id, page, list(candidate_ids)),
         )
@@ -981,6 +1375,132 @@ def _fetch_line_text(
     return None
 
 
+_KEYWORD_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def _keyword_terms(text: str) -> List[str]:
+    """Lower-cased word tokens, like the 'simple' text search configuration."""
+    return _KEYWORD_TOKEN.findall(text.lower())
+
+
+class PgRetriever:
+    """Hybrid retrieval against the region table in Postgres (pgvector + ts_rank)."""
+
+    def __init__(self, conn, doc_id: str, page: int, table_name: str) -> None:
+        self.conn = conn
+        self.doc_id = doc_id
+        self.page = page
+        self.table_name = table_name
+        self._line_cache: Dict[int, str] = {}
+
+    def dense_many(self, qvecs: Sequence[Sequence[float]], topk: int) -> List[List[Dict[str, object]]]:
+        return [
+            dense_candidates(self.conn, self.doc_id, self.page, qvec, topk, self.table_name)
+            for qvec in qvecs
+        ]
+
+    def keyword(self, query_text: str, candidate_ids: Sequence[int]) -> Dict[int, float]:
+        return keyword_scores(self.conn, self.doc_id, self.page, query_text, candidate_ids, self.table_name)
+
+    def line_text(self, line_no: int) -> Optional[str]:
+        return _fetch_line_text(self.conn, self.doc_id, self.page, line_no, self._line_cache, self.table_name)
+
+
+class MemoryRetriever:
+    """Per-document hybrid retrieval held in memory.
+
+    A region holds tens of lines, so the embedding matrix and a BM25 index are
+    built locally and every field query is scored in one matrix product.
+    Candidate ids are line numbers. Dense scores keep the pgvector ``<->``
+    definition (``1 - L2 distance``, floored at 0), and keyword scores rank
+    the ``" OR "`` query terms the way ``ts_rank`` is used by the SQL path,
+    so ``hybrid_rank`` sees the same kind of inputs from either backend.
+    """
+
+    def __init__(self, lines: Sequence[Line], embeddings: Sequence[Sequence[float]],
+                 k1: float = 1.2, b: float = 0.75) -> None:
+        kept = [(line, vec) for line, vec in zip(lines, embeddings) if line.text]
+        self.ids = [int(line.line_no) for line, _ in kept]
+        self.texts = {int(line.line_no): line.text for line, _ in kept}
+        self.matrix = (
+            np.asarray([vec for _, vec in kept], dtype=np.float64).reshape(len(kept), -1)
+            if kept else np.zeros((0, 0))
+        )
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [self._counts(_keyword_terms(line.text)) for line, _ in kept]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        doc_freq: Dict[str, int] = {}
+        for tf in self.term_freqs:
+            for term in tf:
+                doc_freq[term] = doc_freq.get(term, 0) + 1
+        self.doc_freq = doc_freq
+        self._row_of = {line_id: idx for idx, line_id in enumerate(self.ids)}
+
+    @staticmethod
+    def _counts(terms: Sequence[str]) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        return counts
+
+    def dense_many(self, qvecs: Sequence[Sequence[float]], topk: int) -> List[List[Dict[str, object]]]:
+        """Top-k lines per query by L2 distance, all queries in one vectorized step."""
+        if not self.ids or not qvecs:
+            return [[] for _ in qvecs]
+        queries = np.asarray(qvecs, dtype=np.float64).reshape(len(qvecs), -1)
+        q_norms = np.einsum("ij,ij->i", queries, queries)
+        sq_dist = q_norms[:, None] + self.sq_norms[None, :] - 2.0 * (queries @ self.matrix.T)
+        distances = np.sqrt(np.maximum(sq_dist, 0.0))
+        limit = max(0, min(int(topk), len(self.ids)))
+        results: List[List[Dict[str, object]]] = []
+        for row in distances:
+            # Stable sort: ties keep line order, like the id order in Postgres
+            order = np.argsort(row, kind="stable")[:limit]
+            results.append([
+                {
+                    "id": self.ids[idx],
+                    "line_no": self.ids[idx],
+                    "text": self.texts[self.ids[idx]],
+                    "distance": float(row[idx]),
+                    "dense_score": max(0.0, 1.0 - float(row[idx])),
+                }
+                for idx in order
+            ])
+        return results
+
+    def keyword(self, query_text: str, candidate_ids: Sequence[int]) -> Dict[int, float]:
+        """BM25 of the query terms (alternatives split on ``OR``) for each candidate line."""
+        terms = {
+            term
+            for alternative in re.split(r"\s+OR\s+", query_text)
+            for term in _keyword_terms(alternative)
+        }
+        n_docs = len(self.ids)
+        scores: Dict[int, float] = {}
+        for line_id in candidate_ids:
+            row = self._row_of.get(int(line_id))
+            if row is None:
+                continue
+            tf = self.term_freqs[row]
+            norm = self.k1 * (1.0 - self.b + self.b * (self.lengths[row] / self.avg_length if self.avg_length else 0.0))
+            score = 0.0
+            for term in terms:
+                freq = tf.get(term, 0)
+                if not freq:
+                    continue
+                df = self.doc_freq.get(term, 0)
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                score += idf * (freq * (self.k1 + 1.0)) / (freq + norm)
+            scores[int(line_id)] = score
+        return scores
+
+    def line_text(self, line_no: int) -> Optional[str]:
+        return self.texts.get(line_no) or None
+
+
 def rerank_service(
     query: str,
     candidates: Sequence[Tuple[int, str]],
@@ -1027,7 +1547,10 @@ def rerank_service(
         logger.debug("Failed to decode reranker response: %s", exc)
         return None
 
-    best = payload_json.get("best")
+    return _best_candidate_id(payload_json.get("best"))
+
+
+def _best_candidate_id(best: Any) -> Optional[int]:
     if not isinstance(best, dict):
         return None
 
@@ -1043,6 +1566,64 @@ def rerank_service(
     return None
 
 
+def rerank_service_batch(
+    queries: Dict[str, Tuple[str, Sequence[Tuple[int, str]]]],
+    model: Optional[str],
+    k: int,
+) -> Optional[Dict[str, Optional[int]]]:
+    """Rerank every field of a region with one ``/rerank/batch`` call.
+
+    ``queries`` maps field -> (query text, candidates). Returns field -> best
+    id, or None when the batch endpoint is unavailable (older reranker or no
+    service), in which case callers fall back to per-field_name reranking.
+    """
+
+    queries = {field_name: entry for field_name, entry in queries.items() if entry[1]}
+    if not queries or not model:
+        return None
+
+    base_url = os.getenv("RERANKER_BASE_URL") or os.getenv("FLAG_RERANKER_BASE_URL") or "http://localhost:9000"
+    payload = {
+        "model": model,
+        "normalize_scores": True,
+        "queries": [
+            {
+                "key": field_name,
+                "query": query,
+                "top_k": k,
+                "candidates": [{"id": cid, "text": text} for cid, text in candidates],
+            }
+            for field_name, (query, candidates) in queries.items()
+        ],
+    }
+
+    try:
+        response = requests.post(
+            f"{base_url.rstrip('/')}/rerank/batch",
+            json=payload,
+            timeout=(10, 60),
+        )
+    except requests.RequestException as exc:
+        logger.warning("Reranker batch request failed: %s", exc)
+        return None
+
+    if response.status_code != 200:
+        logger.debug("Reranker batch response %s: %s", response.status_code, response.text)
+        return None
+
+    try:
+        results = response.json().get("results") or []
+    except (ValueError, AttributeError) as exc:
+        logger.debug("Failed to decode reranker batch response: %s", exc)
+        return None
+
+    best_ids: Dict[str, Optional[int]] = {}
+    for entry in results:
+        if isinstance(entry, dict) and entry.get("key") in queries:
+            best_ids[entry["key"]] = _best_candidate_id(entry.get("best"))
+    return best_ids
+
+
 def rerank_ollama(
     query: str,
     candidates: Sequence[Tuple[int, str]],
@@ -1288,43 +1869,53 @@ def _normalize_answer(field: str, text: str, field_cfg: FieldConfig) -> str:
 
 
 def run_queries(
-    conn,
-    doc_id: str,
-    page: int,
+    retriever,
     region_config: RegionConfig,
     echo: bool = False,
+    embedder: Optional[OllamaEmbedder] = None,
 ) -> Dict[str, str]:
-    """Run RAG queries for all fields in a region configuration."""
+    """Run RAG queries for all fields in a region configuration.
+
+    ``retriever`` is a MemoryRetriever (default) or a PgRetriever.
+    """
     topk = int(os.getenv("TOPK", "10"))
     rerank_k = int(os.getenv("RERANK_K", "5"))
     alpha = float(os.getenv("HYBRID_ALPHA", "0.5"))
     rerank_model = os.getenv("RERANK_MODEL", "bge-reranker-v2-m3")
 
-    table_name = region_config.table_name
-
-    answers: Dict[str, str] = {}
-    for field, synonyms in region_config.query_synonyms.items():
-        line_cache: Dict[int, str] = {}
-        answers[field] = ""
-        query_text = " OR ".join(synonyms)
-        try:
-            qvec = embed_text_ollama(query_text)
-        except RuntimeError as exc:
-            logger.error("Embedding failed for query '%s': %s", field, exc)
+    embedder = embedder or OllamaEmbedder.from_env()
+    queries = {field_name: " OR ".join(synonyms) for field_name, synonyms in region_config.query_synonyms.items()}
+    # One batched (and cached) embedding call for every field query of the region
+    try:
+        query_vectors = dict(zip(queries, embedder.embed_many(list(queries.values()))))
+    except RuntimeError as exc:
+        logger.error("Embedding failed for %s queries: %s", region_config.name, exc)
+        query_vectors = {}
+
+    embedded_fields = [field_name for field_name in queries if field_name in query_vectors]
+    dense_by_field = dict(zip(
+        embedded_fields,
+        retriever.dense_many([query_vectors[field_name] for field_name in embedded_fields], topk),
+    ))
+
+    answers: Dict[str, str] = {field_name: "" for field_name in queries}
+    # Hybrid ranking per field; all fields are then reranked in one call
+    ranked: Dict[str, Tuple[List[Tuple[int, str]], Dict[int, Dict[str, Any]]]] = {}
+    for field_name, query_text in queries.items():
+        if field_name not in dense_by_field:
             continue
-        dense_rows = dense_candidates(conn, doc_id, page, qvec, topk, table_name)
+        dense_rows = dense_by_field[field_name]
         if echo:
             preview = [f"{row['id']}: {row['text']}" for row in dense_rows[: min(5, len(dense_rows))]]
-            logger.info("Dense candidates for %s: %s", field, preview or "<none>")
+            logger.info("Dense candidates for %s: %s", field_name, preview or "<none>")
         if not dense_rows:
             continue
         dense_raw = {row["id"]: row["dense_score"] for row in dense_rows}
         dense_norm = normalize_scores(dense_raw)
-        keyword_raw = keyword_scores(conn, doc_id, page, query_text, list(dense_raw.keys()), table_name)
+        keyword_raw = retriever.keyword(query_text, list(dense_raw.keys()))
         keyword_norm = normalize_scores(keyword_raw)
         hybrid_ids = hybrid_rank(dense_norm, keyword_norm, alpha)
         if not hybrid_ids:
-            answers[field] = ""
             continue
         combined_scores = {
             candidate_id: alpha * dense_norm.get(candidate_id, 0.0)
@@ -1340,9 +1931,22 @@ def run_queries(
                 ranked_preview.append(
                     f"{candidate_id}:{combined_scores[candidate_id]:.3f}:{text_preview}"
                 )
-            logger.info("Hybrid ranking for %s: %s", field, ranked_preview or "<none>")
+            logger.info("Hybrid ranking for %s: %s", field_name, ranked_preview or "<none>")
         rerank_input = [(cid, candidate_map[cid]["text"]) for cid in hybrid_ids if cid in candidate_map]
-        best_id = rerank_service(query_text, rerank_input, rerank_model, rerank_k)
+        ranked[field_name] = (rerank_input, candidate_map)
+
+    batch_best = rerank_service_batch(
+        {field_name: (queries[field_name], rerank_input) for field_name, (rerank_input, _) in ranked.items()},
+        rerank_model,
+        rerank_k,
+    )
+
+    for field_name, (rerank_input, candidate_map) in ranked.items():
+        query_text = queries[field_name]
+        if batch_best is not None:
+            best_id = batch_best.get(field_name)
+        else:
+            best_id = rerank_service(query_text, rerank_input, rerank_model, rerank_k)
         if best_id is None:
             best_id = rerank_ollama(query_text, rerank_input, rerank_model, rerank_k)
         if best_id is None and rerank_input:
@@ -1355,7 +1959,7 @@ def run_queries(
             if cid not in candidate_order:
                 candidate_order.append(cid)
 
-        field_cfg = region_config.fields.get(field, FieldConfig(name=field))
+        field_cfg = region_config.fields.get(field_name, FieldConfig(name=field_name))
         selected_text: Optional[str] = None
         for cid in candidate_order:
             entry = candidate_map.get(cid, {})
@@ -1367,7 +1971,7 @@ def run_queries(
                 texts_to_try.append(raw_text)
             if isinstance(line_no, int):
                 for offset in (1, 2):
-                    neighbor_text = _fetch_line_text(conn, doc_id, page, line_no + offset, line_cache, table_name)
+                    neighbor_text = retriever.line_text(line_no + offset)
                     if neighbor_text and neighbor_text not in texts_to_try:
                         texts_to_try.append(neighbor_text)
 
@@ -1378,16 +1982,16 @@ def run_queries(
                         logger.debug("Candidate rejected by stop_regex: %s", candidate_text[:60])
                     continue
 
-                normalized = _normalize_answer(field, candidate_text, field_cfg)
+                normalized = _normalize_answer(field_name, candidate_text, field_cfg)
                 if normalized:
-                    answers[field] = normalized
+                    answers[field_name] = normalized
                     selected_text = candidate_text
                     break
             if selected_text is not None:
                 break
         if echo and selected_text is not None:
-            logger.info("Selected line for %s: %s", field, selected_text)
-            logger.info("Normalized %s: %s", field, answers[field])
+            logger.info("Selected line for %s: %s", field_name, selected_text)
+            logger.info("Normalized %s: %s", field_name, answers[field_name])
     return answers
 
 
@@ -1616,13 +2220,71 @@ def _setup_logging(echo: bool) -> None:
     logging.basicConfig(level=level, format="%(levelname)s: %(message)s")
 
 
+def maintenance_main(argv: Sequence[str]) -> int:
+    """``s04_rag.py maintenance``: retention pruning, vacuum and a bloat report (JSON on stdout)."""
+
+    parser = argparse.ArgumentParser(prog="s04_rag.py maintenance", description="Region table maintenance")
+    parser.add_argument("--tables", nargs="*", help="Region tables (default: every rag_*_lines table)")
+    parser.add_argument("--prune-days", type=int, default=None, help="Delete rows older than this many days")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM (ANALYZE) the tables after pruning")
+    parser.add_argument("--reindex", action="store_true", help="REINDEX the tables (rebuilds ivfflat lists after heavy churn)")
+    args = parser.parse_args(argv)
+    _setup_logging(False)
+
+    conn = None
+    try:
+        conn = pg_connect_from_env()
+        tables = list(args.tables or list_region_tables(conn))
+        pruned: Dict[str, int] = {}
+        if args.prune_days is not None:
+            for table_name in tables:
+                pruned[table_name] = prune_lines(conn, table_name, args.prune_days)
+        if args.vacuum or args.reindex:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                for table_name in tables:
+                    if args.vacuum:
+                        cur.execute(SQL("VACUUM (ANALYZE) {}").format(Identifier(table_name)))
+                    if args.reindex:
+                        cur.execute(SQL("REINDEX TABLE {}").format(Identifier(table_name)))
+            conn.autocommit = False
+        print(json.dumps({"pruned": pruned, "tables": bloat_report(conn, tables)}, indent=2))
+        return 0
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.error("s04_rag maintenance failed: %s", exc)
+        return 1
+    finally:
+        if conn is not None:
+            try:
+                conn.close()
+            except psycopg2.Error as close_exc:
+                logger.debug("Failed to close Postgres connection cleanly: %s", close_exc)
+
+
 def main(argv: Optional[Sequence[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv and argv[0] == "maintenance":
+        return maintenance_main(argv[1:])
+
     parser = argparse.ArgumentParser(description="Multi-region RAG pipeline")
     parser.add_argument("--s02", required=True, help="Path to S02 JSON tokens input")
     parser.add_argument("--s03", required=True, help="Path to S03 JSON segments input")
     parser.add_argument("--doc-id", required=True, help="Document identifier for persistence")
     parser.add_argument("--out", required=True, help="Output JSON path for results")
     parser.add_argument("--reindex", action="store_true", help="Reinsert region lines for doc/page")
+    parser.add_argument(
+        "--retriever",
+        choices=["memory", "pg"],
+        default=os.getenv("RAG_RETRIEVER", "memory"),
+        help="Hybrid retrieval backend: in-process (default) or Postgres/pgvector",
+    )
+    parser.add_argument(
+        "--persist",
+        action="store_true",
+        default=os.getenv("RAG_PERSIST", "").lower() in {"1", "true", "yes"},
+        help="Keep region lines and embeddings in Postgres after extraction "
+             "(with --retriever pg they are otherwise deleted once the document is done)",
+    )
     parser.add_argument(
         "--config",
         default="auto",
@@ -1675,8 +2337,9 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
 
         all_lines = rebuild_lines(tokens)
 
-        conn = pg_connect_from_env()
-        embed_dim = int(os.getenv("EMBED_DIM", "1024"))
+        embedder = OllamaEmbedder.from_env()
+        embed_dim = embedder.embed_dim
+        use_pg = args.retriever == "pg" or args.persist
 
         # Process each region
         all_answers: Dict[str, str] = {}
@@ -1738,37 +2401,52 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
                 # Ensure schema for this region's table (only if use_reranker is true)
                 if region_config.use_reranker:
                     table_name = region_config.table_name
-                    ensure_schema(conn, embed_dim, table_name)
-
-                    # Check if we need to index
-                    existing_count = 0
-                    with conn.cursor() as cur:
-                        cur.execute(
-                            f"SELECT COUNT(*) FROM {table_name} WHERE doc_id = %s AND page = %s",
-                            (args.doc_id, 1),
-                        )
-                        existing_count = cur.fetchone()[0]
-
-                    if args.reindex and existing_count:
+                    if use_pg:
+                        if conn is None:
+                            conn = pg_connect_from_env()
+                        ensure_schema(conn, embed_dim, table_name)
+
+                        # Check if we need to index
+                        existing_count = 0
                         with conn.cursor() as cur:
                             cur.execute(
-                                f"DELETE FROM {table_name} WHERE doc_id = %s AND page = %s",
+                                f"SELECT COUNT(*) FROM {table_name} WHERE doc_id = %s AND page = %s",
                                 (args.doc_id, 1),
                             )
-                        conn.commit()
-                        existing_count = 0
-                        logger.info("Existing rows for doc %s page 1 in %s removed for reindex.", args.doc_id, table_name)
-
-                    if region_lines and (args.reindex or not existing_count):
-                        inserted = upsert_lines(conn, args.doc_id, 1, region_lines, embed_text_ollama, table_name)
-                        if args.echo:
-                            logger.info("Inserted %s lines for region %s (doc %s page 1).", inserted, region_name, args.doc_id)
-                    elif args.echo:
-                        logger.info("Skipping indexing for %s; existing rows already present.", region_name)
+                            existing_count = cur.fetchone()[0]
+
+                        if args.reindex and existing_count:
+                            with conn.cursor() as cur:
+                                cur.execute(
+                                    f"DELETE FROM {table_name} WHERE doc_id = %s AND page = %s",
+                                    (args.doc_id, 1),
+                                )
+                            conn.commit()
+                            existing_count = 0
+                            logger.info("Existing rows for doc %s page 1 in %s removed for reindex.", args.doc_id, table_name)
+
+                        if region_lines and (args.reindex or not existing_count):
+                            inserted = upsert_lines(conn, args.doc_id, 1, region_lines, embedder.embed_many, table_name)
+                            if args.echo:
+                                logger.info("Inserted %s lines for region %s (doc %s page 1).", inserted, region_name, args.doc_id)
+                        elif args.echo:
+                            logger.info("Skipping indexing for %s; existing rows already present.", region_name)
+
+                    if args.retriever == "pg":
+                        retriever = PgRetriever(conn, args.doc_id, 1, table_name)
+                    else:
+                        indexed = [line for line in region_lines if line.text]
+                        retriever = MemoryRetriever(indexed, embedder.embed_many([line.text for line in indexed]))
 
                     # Run queries for this region
-                    region_answers = run_queries(conn, args.doc_id, 1, region_config, echo=args.echo)
+                    region_answers = run_queries(retriever, region_config, echo=args.echo, embedder=embedder)
                     all_answers.update(region_answers)
+
+                    # Rows only served this extraction: drop them unless persisting
+                    if use_pg and not args.persist:
+                        deleted = delete_doc_lines(conn, args.doc_id, table_name)
+                        if args.echo:
+                            logger.info("Removed %s lines for doc %s from %s.", deleted, args.doc_id, table_name)
                 else:
                     # Skip RAG for regions with use_reranker=false
                     if args.echo:
@@ -1788,6 +2466,7 @@ def main(argv: Optional[Sequence[str]] = None) -> int:
 
         if args.echo:
             logger.info("Final output: %d flat fields, %d line items", len(all_answers), len(line_items))
+            logger.info("Embeddings: %s", embedder.stats)
 
         return 0
     except Exception as exc:  # pylint: disable=broad-except
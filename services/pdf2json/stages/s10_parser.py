@@ -68,6 +68,9 @@ def persist_to_database(doc_id: str, final_doc: Dict[str, Any], manifest: Dict[s
     database_url = os.getenv("DATABASE_URL")
     if not database_url:
         return
+    # Under the pdf2json worker the upsert goes through its pooled connection instead
+    if os.getenv("PDF2JSON_PERSIST_OWNER") == "worker":
+        return
 
     try:
         import psycopg
@@ -632,6 +635,15 @@ def main():
         "version": "1.0"
     }
 
+    # Keep the orchestration block the processor wrote before this stage ran
+    if manifest_p.exists():
+        try:
+            prior_manifest = loadj(manifest_p)
+        except Exception:
+            prior_manifest = {}
+        if isinstance(prior_manifest.get("execution"), dict):
+            manifest["execution"] = prior_manifest["execution"]
+
     final_p.write_text(json.dumps(final, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
     manifest_p.write_text(json.dumps(manifest, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
 
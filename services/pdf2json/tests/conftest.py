@@ -0,0 +1,36 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+SERVICE_ROOT = Path(__file__).resolve().parents[1]
+STAGES_DIR = SERVICE_ROOT / "stages"
+SHARED_DIR = SERVICE_ROOT.parent / "shared"
+for path in (SERVICE_ROOT, STAGES_DIR, SHARED_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+@pytest.fixture
+def rag_db():
+    """(connection, scratch table name) on the pgvector database in RAG_TEST_DATABASE_URL.
+
+    The table is dropped afterwards; tests are skipped when the variable is unset.
+    """
+    psycopg2 = pytest.importorskip("psycopg2")
+    dsn = os.getenv("RAG_TEST_DATABASE_URL")
+    if not dsn:
+        pytest.skip("RAG_TEST_DATABASE_URL not set")
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = False
+    table_name = f"rag_test_{uuid.uuid4().hex[:12]}_lines"
+    try:
+        yield conn, table_name
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {table_name}")
+        conn.commit()
+        conn.close()
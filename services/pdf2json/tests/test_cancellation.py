@@ -0,0 +1,77 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import processor
+from processor import CancelToken, PipelineCancelled
+
+# The stage starts a grandchild that would outlive it, records its pid, then hangs
+STAGE = """
+import subprocess, sys, time
+child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+open(sys.argv[1], "w").write(str(child.pid))
+time.sleep(60)
+"""
+
+
+def _alive(pid):
+    try:
+        state = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()[0]
+    except FileNotFoundError:
+        return False
+    return state not in {"Z", "X"}
+
+
+def _run_stage(tmp_path, cancel):
+    pid_file = tmp_path / "grandchild.pid"
+    started = time.monotonic()
+    with pytest.raises(PipelineCancelled) as cancelled:
+        processor.run([sys.executable, "-c", STAGE, str(pid_file)], cancel=cancel)
+    elapsed = time.monotonic() - started
+
+    grandchild = int(pid_file.read_text())
+    deadline = time.monotonic() + 5
+    while _alive(grandchild) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return cancelled.value, elapsed, _alive(grandchild)
+
+
+@pytest.fixture(autouse=True)
+def short_grace(monkeypatch):
+    monkeypatch.setattr(processor, "KILL_GRACE_SECONDS", 0.5)
+
+
+@pytest.mark.skipif(not Path("/proc").is_dir(), reason="needs /proc")
+def test_deadline_kills_the_whole_process_group(tmp_path):
+    error, elapsed, grandchild_alive = _run_stage(tmp_path, CancelToken(timeout=1.0))
+    assert error.deadline_exceeded
+    assert elapsed < 10
+    assert not grandchild_alive
+
+
+@pytest.mark.skipif(not Path("/proc").is_dir(), reason="needs /proc")
+def test_cancel_from_another_thread_kills_the_stage(tmp_path):
+    cancel = CancelToken()
+    threading.Timer(1.0, cancel.cancel, args=("client disconnected",)).start()
+    error, elapsed, grandchild_alive = _run_stage(tmp_path, cancel)
+    assert not error.deadline_exceeded
+    assert error.reason == "client disconnected"
+    assert cancel.cancelled
+    assert not grandchild_alive
+
+
+def test_cancelled_token_does_not_start_the_stage(tmp_path):
+    cancel = CancelToken()
+    cancel.cancel("client disconnected")
+    with pytest.raises(PipelineCancelled):
+        processor.run([sys.executable, "-c", f"open({str(tmp_path / 'ran')!r}, 'w')"], cancel=cancel)
+    assert not (tmp_path / "ran").exists()
+
+
+def test_finished_stage_returns_normally():
+    proc = processor.run([sys.executable, "-c", "print('ok')"], cancel=CancelToken(timeout=30))
+    assert proc.returncode == 0
+    assert proc.stdout.strip() == "ok"
@@ -0,0 +1,175 @@
+import os
+import sys
+import threading
+import types
+import uuid
+
+import pytest
+
+import db
+import s10_parser
+
+
+class FakeConn:
+    def __init__(self, dsn, kwargs):
+        self.dsn = dsn
+        self.kwargs = kwargs
+        self.closed = False
+        self.broken = False
+        self.executed = []
+
+    def execute(self, query, params=None, prepare=None):
+        self.executed.append((" ".join(query.split())[:60], params, prepare))
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_psycopg(monkeypatch):
+    """``db`` wired to a fake psycopg; every connection it opens is recorded."""
+    opened = []
+
+    def connect(dsn, autocommit, **kwargs):
+        assert autocommit
+        conn = FakeConn(dsn, kwargs)
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(db, "psycopg", types.SimpleNamespace(connect=connect))
+    monkeypatch.setattr(db, "Json", lambda value: value)
+    monkeypatch.setattr(db, "_pool", None)
+    monkeypatch.setattr(db, "_schema_ready", False)
+    monkeypatch.setenv("DATABASE_URL", "postgresql://db/pdf2json")
+    monkeypatch.delenv(db.PERSIST_OWNER_ENV, raising=False)
+    return opened
+
+
+def test_without_database_url_everything_is_a_no_op(fake_psycopg, monkeypatch):
+    monkeypatch.delenv("DATABASE_URL")
+    assert not db.enabled()
+    assert db.get_pool() is None
+    assert db.init() is False
+    assert db.persist_parser_result("doc-1", {}, {}) is False
+    assert db.PERSIST_OWNER_ENV not in db.stage_env()
+    assert fake_psycopg == []
+
+
+def test_connections_are_returned_and_reused(fake_psycopg):
+    pool = db.ConnectionPool("dsn", min_size=1, max_size=2, timeout=0.1)
+    assert len(fake_psycopg) == 1
+    with pool.connection() as first:
+        pass
+    with pool.connection() as again:
+        assert again is first
+    assert pool.stats() == {"max_size": 2, "idle": 1, "opened": 1}
+
+    with pool.connection() as a, pool.connection() as b:
+        assert a is not b
+        assert pool.stats()["opened"] == 2
+        # Both slots are taken: the next checkout gives up after the timeout
+        with pytest.raises(TimeoutError):
+            with pool.connection():
+                pass
+    assert pool.stats()["idle"] == 2
+
+
+def test_checkout_waits_for_a_returned_connection(fake_psycopg):
+    pool = db.ConnectionPool("dsn", min_size=1, max_size=1, timeout=5)
+    released = threading.Event()
+
+    def hold():
+        with pool.connection():
+            released.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    threading.Timer(0.2, released.set).start()
+    with pool.connection() as conn:
+        assert conn is fake_psycopg[0]
+    holder.join()
+    assert pool.stats()["opened"] == 1
+
+
+def test_broken_and_closed_connections_are_replaced(fake_psycopg):
+    pool = db.ConnectionPool("dsn", min_size=1, max_size=1, timeout=0.1)
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.broken = True
+            raise RuntimeError("server closed the connection")
+    assert pool.stats()["idle"] == 0
+
+    with pool.connection() as fresh:
+        assert fresh is not conn
+        fresh.closed = True
+    with pool.connection() as replacement:
+        assert replacement is not fresh
+    assert pool.stats()["opened"] == 3
+
+
+def test_statement_timeout_is_set_per_connection(fake_psycopg, monkeypatch):
+    db.ConnectionPool("dsn", min_size=1)
+    assert fake_psycopg[-1].kwargs == {"connect_timeout": 5, "options": "-c statement_timeout=5000"}
+
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS", "0")
+    db.ConnectionPool("dsn", min_size=1)
+    assert fake_psycopg[-1].kwargs == {"connect_timeout": 5}
+
+
+def test_persist_creates_the_schema_once_and_upserts_prepared(fake_psycopg):
+    assert db.persist_parser_result("doc-1", {"doc_id": "doc-1"}, {"version": "1.0"})
+    assert db.persist_parser_result("doc-2", {"doc_id": "doc-2"}, {"version": "1.0"})
+
+    (conn,) = fake_psycopg
+    assert conn.dsn == "postgresql://db/pdf2json"
+    ddl, first, second = conn.executed
+    assert ddl[0].startswith("CREATE TABLE IF NOT EXISTS parser_results")
+    assert first[0].startswith("INSERT INTO parser_results")
+    assert first[1:] == (("doc-1", {"doc_id": "doc-1"}, {"version": "1.0"}), True)
+    assert second[1][0] == "doc-2"
+    assert db.persist_parser_result("", {}, {}) is False
+
+
+def test_persist_failures_are_logged_not_raised(fake_psycopg, monkeypatch, capsys):
+    def refuse(dsn, autocommit, **kwargs):
+        raise OSError("connection refused")
+
+    monkeypatch.setattr(db, "psycopg", types.SimpleNamespace(connect=refuse))
+    assert db.persist_parser_result("doc-1", {}, {}) is False
+    assert "failed to persist results for doc_id=doc-1: connection refused" in capsys.readouterr().err
+
+
+def test_stage_env_hands_persistence_to_the_worker(fake_psycopg, monkeypatch):
+    env = db.stage_env()
+    assert env[db.PERSIST_OWNER_ENV] == "worker"
+    assert env["DATABASE_URL"] == "postgresql://db/pdf2json"
+
+    # s10 sees the marker and leaves the upsert to the worker: it must not even import psycopg
+    def connect(*args, **kwargs):
+        raise AssertionError("s10 opened its own connection")
+
+    monkeypatch.setitem(sys.modules, "psycopg", types.SimpleNamespace(connect=connect))
+    monkeypatch.setenv(db.PERSIST_OWNER_ENV, "worker")
+    s10_parser.persist_to_database("doc-1", {}, {})
+
+
+def test_persist_on_postgres(monkeypatch):
+    pytest.importorskip("psycopg")
+    dsn = os.getenv("RAG_TEST_DATABASE_URL")
+    if not dsn:
+        pytest.skip("RAG_TEST_DATABASE_URL not set")
+    monkeypatch.setattr(db, "_pool", None)
+    monkeypatch.setattr(db, "_schema_ready", False)
+    monkeypatch.setenv("DATABASE_URL", dsn)
+    doc_id = f"test-{uuid.uuid4().hex[:12]}"
+    try:
+        assert db.persist_parser_result(doc_id, {"total": 1}, {"version": "1.0"})
+        assert db.persist_parser_result(doc_id, {"total": 2}, {"version": "1.0"})
+        with db.get_pool().connection() as conn:
+            assert conn.execute("SHOW statement_timeout").fetchone()[0] == "5s"
+            row = conn.execute("SELECT final FROM parser_results WHERE doc_id = %s", (doc_id,)).fetchone()
+            assert row[0] == {"total": 2}
+    finally:
+        with db.get_pool().connection() as conn:
+            conn.execute("DELETE FROM parser_results WHERE doc_id = %s", (doc_id,))
+        db.close()
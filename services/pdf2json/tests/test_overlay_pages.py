@@ -0,0 +1,43 @@
+import pytest
+from starlette.testclient import TestClient
+
+import main
+from processor import check_page_selection
+from s03_segmenter import parse_pages
+
+
+def test_page_ranges_are_clamped_to_the_document():
+    assert parse_pages("1-1000000000", 4) == {1, 2, 3, 4}
+    assert parse_pages("2, 3-4, 9", 4) == {2, 3, 4}
+    assert parse_pages("1,3-4") == {1, 3, 4}
+    assert parse_pages("  ") is None
+
+
+@pytest.mark.parametrize("spec", ["x", "1-x", "0", "4-2", "1;2", "-3"])
+def test_malformed_selections_are_rejected(spec):
+    with pytest.raises(ValueError):
+        check_page_selection(spec)
+    with pytest.raises(ValueError):
+        parse_pages(spec, 4)
+
+
+def test_selection_check_accepts_and_normalises_valid_specs():
+    assert check_page_selection(" 1, 3-4 ") == "1, 3-4"
+    assert check_page_selection("") is None
+    assert check_page_selection(None) is None
+    with pytest.raises(ValueError):
+        check_page_selection("1," * 200 + "1")
+
+
+def test_artifacts_endpoint_answers_400_before_running_the_pipeline(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("pipeline should not run")
+
+    monkeypatch.setattr(main, "process_pdf_from_pipeline_config_with_artifacts", fail)
+    response = TestClient(main.app).post(
+        "/process-with-artifacts",
+        files={"file": ("a.pdf", b"%PDF-1.4", "application/pdf")},
+        data={"overlay_pages": "1-1000000000x"},
+    )
+    assert response.status_code == 400
+    assert "overlay_pages" in response.json()["detail"]
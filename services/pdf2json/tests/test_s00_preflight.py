@@ -0,0 +1,135 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+import s00_preflight
+from s00_preflight import EXIT_REJECTED, preflight
+
+HEADER = ["Invoice No: INV-001", "Bill To: PT Maju"]
+ITEMS = ["1 Widget 2 10.00 20.00", "2 Bolt 5 1.50 7.50", "3 Nut 10 0.25 2.50"]
+
+
+def _page(doc, lines, ruled=False):
+    page = doc.new_page(width=595, height=842)
+    for idx, text in enumerate(lines):
+        page.insert_text((72, 100 + idx * 20), text, fontsize=10)
+    if ruled:
+        for idx in range(len(lines) + 1):
+            y = 86 + idx * 20
+            page.draw_line((60, y), (520, y))
+        page.draw_line((60, 86), (60, 86 + len(lines) * 20))
+    return page
+
+
+def _pdf(tmp_path, pages, name="invoice.pdf", **save):
+    doc = fitz.open()
+    for spec in pages:
+        if spec == "scan":
+            page = doc.new_page(width=595, height=842)
+            pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 8, 8), False)
+            page.insert_image(fitz.Rect(72, 72, 300, 300), pixmap=pixmap)
+        elif spec == "blank":
+            doc.new_page(width=595, height=842)
+        else:
+            _page(doc, *spec)
+    path = tmp_path / name
+    doc.save(path, **save)
+    doc.close()
+    return path
+
+
+def test_plan_classifies_pages(tmp_path):
+    path = _pdf(tmp_path, [(HEADER + ITEMS, True), (HEADER + ITEMS[:2],), "blank", "scan"])
+    report = preflight(path)
+
+    assert report["status"] == "ok" and report["reason"] is None
+    assert report["page_count"] == 4
+    assert report["plan"] == {
+        "process_pages": [1, 2],
+        "table_pages": [1, 2],
+        "blank_pages": [3],
+        "scanned_pages": [4],
+    }
+    first, second = report["pages"][:2]
+    assert first["rulings"]["h"] >= 3 and first["rulings"]["v"] >= 1
+    assert first["numeric_lines"] == 3
+    assert second["numeric_lines"] == 2 and not second["table_continuation"]
+
+
+def test_unruled_continuation_page_with_one_item_row_is_a_table_page(tmp_path):
+    path = _pdf(tmp_path, [
+        (HEADER + ITEMS, True),
+        (ITEMS[2:] + ["Grand Total 30.00"],),
+        (["Terms and conditions apply", "Thank you for your business"],),
+    ])
+    report = preflight(path)
+
+    assert report["plan"]["table_pages"] == [1, 2]
+    assert report["pages"][1]["numeric_lines"] == 1
+    assert report["pages"][1]["table_continuation"]
+    assert not report["pages"][2]["has_table"]
+
+
+def test_pages_between_table_pages_are_kept(tmp_path):
+    path = _pdf(tmp_path, [
+        (HEADER + ITEMS, True),
+        (["Items continued overleaf", "see next page"],),
+        (ITEMS, True),
+    ])
+    assert preflight(path)["plan"]["table_pages"] == [1, 2, 3]
+
+
+def test_document_without_table_has_no_table_pages(tmp_path):
+    path = _pdf(tmp_path, [(HEADER + ["Total 30.00"],), (["Thank you for your business"],)])
+    report = preflight(path)
+    assert report["plan"]["table_pages"] == []
+    assert report["plan"]["process_pages"] == [1, 2]
+
+
+@pytest.mark.parametrize(
+    "pages, kwargs, save, reason",
+    [
+        (["scan"], {}, {}, "no_text_layer"),
+        (["blank"], {}, {}, "no_text"),
+        ([(HEADER + ITEMS,)] * 3, {"max_pages": 2}, {}, "too_many_pages (3 > 2)"),
+        ([(HEADER + ITEMS,)], {}, {"encryption": fitz.PDF_ENCRYPT_AES_256, "user_pw": "secret"}, "encrypted"),
+    ],
+)
+def test_rejections(tmp_path, pages, kwargs, save, reason):
+    report = preflight(_pdf(tmp_path, pages, **save), **kwargs)
+    assert report["status"] == "rejected"
+    assert report["reason"] == reason
+
+
+def test_unreadable_file_is_rejected(tmp_path):
+    path = tmp_path / "broken.pdf"
+    path.write_bytes(b"not a pdf")
+    report = preflight(path)
+    assert report["status"] == "rejected"
+    assert report["reason"].startswith("unreadable: ")
+    assert report["plan"]["process_pages"] == []
+
+
+def test_cli_writes_the_report_and_exits_3_on_rejection(tmp_path):
+    script = s00_preflight.__file__
+    out = tmp_path / "out" / "preflight.json"
+
+    ok = subprocess.run(
+        [sys.executable, script, "--in", str(_pdf(tmp_path, [(HEADER + ITEMS, True)])), "--out", str(out)],
+        capture_output=True, text=True,
+    )
+    assert ok.returncode == 0, ok.stderr
+    assert json.loads(ok.stdout.splitlines()[-1])["table_pages"] == [1]
+    assert json.loads(out.read_text(encoding="utf-8"))["status"] == "ok"
+
+    rejected = subprocess.run(
+        [sys.executable, script, "--in", str(_pdf(tmp_path, ["scan"], name="scan.pdf")), "--out", str(out)],
+        capture_output=True, text=True,
+    )
+    assert rejected.returncode == EXIT_REJECTED
+    assert "no_text_layer" in rejected.stderr
+    assert json.loads(out.read_text(encoding="utf-8"))["reason"] == "no_text_layer"
@@ -0,0 +1,54 @@
+"""The split per-page/merge segmenter against output of the single-pass one.
+
+``fixtures/s03/*.json`` were written by s03_segmenter as it was before the
+per-page phase was split out, from the training documents below.
+"""
+
+import logging
+from pathlib import Path
+
+import pytest
+
+import s03_segmenter
+from s03_segmenter import AgnosticSegmenter
+
+SERVICE_ROOT = Path(__file__).resolve().parents[1]
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "s03"
+CASES = [
+    ("training/rittal/4/s02.json", "s03_invoice_rittal_segmenter_v1.json", "rittal_4.json"),
+    ("training/pdp/3/s02.json", "s03_invoice_pdp_segmenter_v1.json", "pdp_3.json"),
+    ("training/simon/3/s02-simon.json", "s03_invoice_simon_segmenter_v13.json", "simon_3.json"),
+]
+
+
+def _segment(tmp_path, s02, config, workers):
+    out_path = tmp_path / f"s03_{workers}.json"
+    segmenter = AgnosticSegmenter(SERVICE_ROOT / "config" / config)
+    segmenter.segment(SERVICE_ROOT / s02, out_path, "plumber", workers=workers)
+    return out_path.read_bytes()
+
+
+@pytest.mark.parametrize("s02, config, expected", CASES)
+@pytest.mark.parametrize("workers", [1, 2])
+def test_page_phase_output_matches_the_single_pass_segmenter(tmp_path, s02, config, expected, workers):
+    assert _segment(tmp_path, s02, config, workers) == (FIXTURES / expected).read_bytes()
+
+
+def test_pool_is_used_only_on_long_documents_by_default(tmp_path, caplog):
+    s02, config, expected = CASES[0]
+    with caplog.at_level(logging.INFO, logger=s03_segmenter.logger.name):
+        _segment(tmp_path, s02, config, 0)
+        assert "Page phase" not in caplog.text
+        _segment(tmp_path, s02, config, 2)
+        assert "Page phase: 4 pages on 2 workers" in caplog.text
+
+
+def test_falls_back_to_sequential_when_the_pool_cannot_start(tmp_path, monkeypatch, caplog):
+    def no_pool(*args, **kwargs):
+        raise OSError("no semaphores")
+
+    monkeypatch.setattr(s03_segmenter, "ProcessPoolExecutor", no_pool)
+    s02, config, expected = CASES[0]
+    with caplog.at_level(logging.WARNING, logger=s03_segmenter.logger.name):
+        assert _segment(tmp_path, s02, config, 2) == (FIXTURES / expected).read_bytes()
+    assert "Process pool unavailable" in caplog.text
@@ -0,0 +1,186 @@
+import itertools
+import sqlite3
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+import s04_rag
+from s04_rag import EmbeddingCache, OllamaEmbedder
+
+DIM = 4
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = "not found" if status_code == 404 else ""
+
+    def json(self):
+        return self._payload
+
+
+class FakeOllama:
+    """Embeds a text as [len, 0.5, 0.25, 0]; records every request body."""
+
+    def __init__(self, batch_endpoint=True, dim=DIM):
+        self.batch_endpoint = batch_endpoint
+        self.dim = dim
+        self.calls = []
+
+    def vector(self, text):
+        return ([float(len(text)), 0.5, 0.25] + [0.0] * self.dim)[:self.dim]
+
+    def __call__(self, url, json, timeout):
+        path = url.split("11434", 1)[1]
+        self.calls.append((path, json))
+        if path == "/api/embed":
+            if not self.batch_endpoint:
+                return FakeResponse(404)
+            return FakeResponse(200, {"embeddings": [self.vector(text) for text in json["input"]]})
+        return FakeResponse(200, {"embedding": self.vector(json["prompt"])})
+
+
+@pytest.fixture
+def ollama(monkeypatch):
+    fake = FakeOllama()
+    monkeypatch.setattr(s04_rag.requests, "post", fake)
+    return fake
+
+
+def _embedder(tmp_path, batch_size=2):
+    cache = EmbeddingCache(str(tmp_path / "cache" / "embeddings.sqlite"))
+    return OllamaEmbedder("http://ollama:11434", "bge-m3", DIM, batch_size=batch_size, cache=cache)
+
+
+def test_duplicates_are_embedded_once_in_batch_size_chunks(tmp_path, ollama):
+    embedder = _embedder(tmp_path)
+    texts = ["a", "bb", "a", "ccc", "dddd", "bb", "eeeee"]
+    vectors = embedder.embed_many(texts)
+
+    assert vectors == [ollama.vector(text) for text in texts]
+    assert [body["input"] for _path, body in ollama.calls] == [["a", "bb"], ["ccc", "dddd"], ["eeeee"]]
+    assert embedder.stats == {"requests": 3, "cache_hits": 0, "embedded": 5}
+
+
+def test_cached_texts_are_not_sent_again(tmp_path, ollama):
+    _embedder(tmp_path).embed_many(["a", "bb"])
+    ollama.calls.clear()
+
+    embedder = _embedder(tmp_path)
+    vectors = embedder.embed_many(["bb", "ccc", "a"])
+    assert vectors == [ollama.vector(text) for text in ("bb", "ccc", "a")]
+    assert [body["input"] for _path, body in ollama.calls] == [["ccc"]]
+    assert embedder.stats["cache_hits"] == 2
+
+
+def test_cache_is_keyed_by_model_and_dimension(tmp_path, ollama):
+    _embedder(tmp_path).embed_many(["a"])
+    other = _embedder(tmp_path)
+    other.model = "nomic-embed-text"
+    other.embed_many(["a"])
+    assert other.stats["cache_hits"] == 0
+    assert len(ollama.calls) == 2
+
+
+def test_falls_back_to_the_legacy_endpoint_once(tmp_path, ollama):
+    ollama.batch_endpoint = False
+    embedder = _embedder(tmp_path)
+    assert embedder.embed_many(["a", "bb", "ccc"]) == [ollama.vector(text) for text in ("a", "bb", "ccc")]
+    assert [path for path, _body in ollama.calls] == [
+        "/api/embed", "/api/embeddings", "/api/embeddings", "/api/embeddings",
+    ]
+    ollama.calls.clear()
+    embedder.embed("dddd")
+    assert [path for path, _body in ollama.calls] == ["/api/embeddings"]
+
+
+def test_wrong_dimension_fails_and_is_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(s04_rag.requests, "post", FakeOllama(dim=DIM + 1))
+    embedder = _embedder(tmp_path)
+    with pytest.raises(RuntimeError, match="dimension mismatch"):
+        embedder.embed("a")
+    assert embedder.cache.get_many([EmbeddingCache.key("bge-m3", DIM, "a")]) == {}
+
+
+def test_unusable_cache_path_disables_the_cache(tmp_path, ollama):
+    blocker = tmp_path / "file"
+    blocker.write_text("", encoding="utf-8")
+    embedder = OllamaEmbedder(
+        "http://ollama:11434", "bge-m3", DIM, cache=EmbeddingCache(str(blocker / "embeddings.sqlite"))
+    )
+    assert embedder.embed_many(["a", "a"]) == [ollama.vector("a")] * 2
+    assert len(ollama.calls) == 1
+
+
+def test_vectors_are_cached_per_endpoint(tmp_path, ollama):
+    # /api/embed vectors are normalised, /api/embeddings ones are not: never serve one for the other
+    ollama.batch_endpoint = False
+    _embedder(tmp_path).embed_many(["a", "bb"])
+    ollama.batch_endpoint = True
+    ollama.calls.clear()
+
+    embedder = _embedder(tmp_path)
+    embedder.embed_many(["a", "bb"])
+    assert embedder.stats["cache_hits"] == 0
+    assert [path for path, _body in ollama.calls] == ["/api/embed"]
+    assert EmbeddingCache.key("bge-m3", DIM, "a") != EmbeddingCache.key("bge-m3", DIM, "a", "/api/embeddings")
+
+
+def test_batch_cache_hits_are_dropped_when_the_server_lacks_the_batch_endpoint(tmp_path, ollama):
+    _embedder(tmp_path).embed_many(["a"])
+    ollama.batch_endpoint = False
+    ollama.calls.clear()
+
+    embedder = _embedder(tmp_path)
+    assert embedder.embed_many(["a", "bb"]) == [ollama.vector("a"), ollama.vector("bb")]
+    # "a" is embedded again through the legacy endpoint rather than mixed in from the cache
+    assert [body.get("prompt") for path, body in ollama.calls if path == "/api/embeddings"] == ["bb", "a"]
+    cache = embedder.cache
+    assert set(cache.get_many([EmbeddingCache.key("bge-m3", DIM, text, "/api/embeddings") for text in ("a", "bb")]))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(s04_rag.time, "time", lambda: float(next(ticks)))
+
+
+def _vec(value):
+    return [float(value)] * DIM
+
+
+def test_least_recently_used_rows_are_pruned(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_rows=2)
+    cache.put_many("bge-m3", DIM, {"a": _vec(1)})
+    cache.put_many("bge-m3", DIM, {"b": _vec(2)})
+    assert set(cache.get_many(["a"])) == {"a"}  # "b" is now the least recently used
+    cache.put_many("bge-m3", DIM, {"c": _vec(3)})
+
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    cache.put_many("bge-m3", DIM, {"d": _vec(4), "e": _vec(5)})
+    assert set(cache.get_many(["a", "b", "c", "d", "e"])) == {"d", "e"}
+    assert cache.prune() == 0
+
+
+def test_unbounded_cache_keeps_every_row(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"), max_rows=0)
+    cache.put_many("bge-m3", DIM, {str(idx): _vec(idx) for idx in range(5)})
+    assert len(cache.get_many([str(idx) for idx in range(5)])) == 5
+
+
+def test_caches_without_last_used_are_migrated(tmp_path, clock):
+    path = tmp_path / "embeddings.sqlite"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE embeddings (key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL,"
+        " vec BLOB NOT NULL, created_at REAL NOT NULL)"
+    )
+    conn.execute("INSERT INTO embeddings VALUES ('old', 'bge-m3', 4, ?, 1.0)", (b"\0" * 16,))
+    conn.commit()
+    conn.close()
+
+    cache = EmbeddingCache(str(path), max_rows=1)
+    cache.put_many("bge-m3", DIM, {"new": _vec(1)})
+    assert set(cache.get_many(["old", "new"])) == {"new"}
@@ -0,0 +1,132 @@
+import pytest
+
+pytest.importorskip("psycopg2")
+
+import s04_rag
+from s04_rag import Line, MemoryRetriever, RegionConfig
+
+LINES = [
+    (1, "Invoice No: INV-001", [1.0, 0.0, 0.0]),
+    (2, "Customer: PT Maju", [0.0, 1.0, 0.0]),
+    (3, "Customer No: C-17", [0.0, 0.75, 0.25]),
+]
+QUERY_VECTORS = {
+    "Invoice No OR Invoice Number": [1.0, 0.0, 0.0],
+    "Customer OR Buyer": [0.0, 1.0, 0.0],
+}
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = "not found" if status_code == 404 else ""
+
+    def json(self):
+        return self._payload
+
+
+class FakeServices:
+    """Answers each endpoint path from its own queue of responses; records the paths called."""
+
+    def __init__(self, **responses):
+        self.responses = {path: list(queue) for path, queue in responses.items()}
+        self.calls = []
+
+    def __call__(self, url, json, timeout):
+        path = "/" + url.split("/", 3)[3]
+        self.calls.append((path, json))
+        response = self.responses[path].pop(0)
+        return response(json) if callable(response) else response
+
+
+class Embedder:
+    def embed_many(self, texts):
+        return [QUERY_VECTORS[text] for text in texts]
+
+
+def _region():
+    return RegionConfig(
+        name="header",
+        query_synonyms={"invoice_number": ["Invoice No", "Invoice Number"], "buyer_name": ["Customer", "Buyer"]},
+        fields={},
+        table_name="rag_header_lines",
+    )
+
+
+def _run(services, monkeypatch):
+    monkeypatch.setattr(s04_rag.requests, "post", services)
+    retriever = MemoryRetriever(
+        [Line(line_no, text, (0.0, 0.0, 1.0, 0.1), []) for line_no, text, _vec in LINES],
+        [vec for _line_no, _text, vec in LINES],
+    )
+    return s04_rag.run_queries(retriever, _region(), embedder=Embedder())
+
+
+def _paths(services):
+    return [path for path, _body in services.calls]
+
+
+def _ollama_score(body):
+    # Prefers the customer number line for the buyer query
+    return FakeResponse(200, {"response": "0.9" if "C-17" in body["prompt"] else "0.2"})
+
+
+def test_batch_endpoint_answers_every_field_in_one_call(monkeypatch):
+    services = FakeServices(**{"/rerank/batch": [FakeResponse(200, {"results": [
+        {"key": "invoice_number", "best": {"id": 1}},
+        {"key": "buyer_name", "best": {"id": "3"}},
+    ]})]})
+    answers = _run(services, monkeypatch)
+
+    assert answers == {"invoice_number": "Invoice No: INV-001", "buyer_name": "Customer No: C-17"}
+    assert _paths(services) == ["/rerank/batch"]
+    body = services.calls[0][1]
+    assert [query["key"] for query in body["queries"]] == ["invoice_number", "buyer_name"]
+
+
+def test_missing_batch_endpoint_falls_back_to_per_field_rerank(monkeypatch):
+    services = FakeServices(**{
+        "/rerank/batch": [FakeResponse(404)],
+        "/rerank": [FakeResponse(200, {"best": {"id": 1}}), FakeResponse(200, {"best": {"id": 3}})],
+    })
+    answers = _run(services, monkeypatch)
+
+    assert answers["buyer_name"] == "Customer No: C-17"
+    assert _paths(services) == ["/rerank/batch", "/rerank", "/rerank"]
+    assert services.calls[2][1]["query"] == "Customer OR Buyer"
+
+
+def test_missing_reranker_service_falls_back_to_ollama(monkeypatch):
+    services = FakeServices(**{
+        "/rerank/batch": [FakeResponse(404)],
+        "/rerank": [FakeResponse(404), FakeResponse(404)],
+        "/api/generate": [_ollama_score] * 10,
+    })
+    answers = _run(services, monkeypatch)
+
+    assert answers["buyer_name"] == "Customer No: C-17"
+    paths = _paths(services)
+    assert paths[:2] == ["/rerank/batch", "/rerank"]
+    assert paths.count("/rerank") == 2
+    assert set(paths[2:]) - {"/rerank"} == {"/api/generate"}
+
+
+def test_no_reranker_at_all_keeps_the_hybrid_order(monkeypatch):
+    services = FakeServices(**{
+        "/rerank/batch": [FakeResponse(404)],
+        "/rerank": [FakeResponse(404), FakeResponse(404)],
+        "/api/generate": [FakeResponse(404), FakeResponse(404)],
+    })
+    answers = _run(services, monkeypatch)
+    assert answers == {"invoice_number": "Invoice No: INV-001", "buyer_name": "Customer: PT Maju"}
+
+
+def test_batch_ignores_fields_without_candidates(monkeypatch):
+    services = FakeServices(**{"/rerank/batch": [FakeResponse(200, {"results": [{"key": "a", "best": {"id": 2}}]})]})
+    monkeypatch.setattr(s04_rag.requests, "post", services)
+    best = s04_rag.rerank_service_batch({"a": ("q", [(2, "x")]), "b": ("q", [])}, "bge-reranker-v2-m3", 5)
+    assert best == {"a": 2}
+    assert [query["key"] for query in services.calls[0][1]["queries"]] == ["a"]
+    assert s04_rag.rerank_service_batch({"b": ("q", [])}, "bge-reranker-v2-m3", 5) is None
+    assert len(services.calls) == 1
@@ -0,0 +1,126 @@
+import math
+
+import numpy as np
+import pytest
+
+pytest.importorskip("psycopg2")
+
+import s04_rag
+from s04_rag import Line, MemoryRetriever, PgRetriever, hybrid_rank, normalize_scores
+
+# Components are multiples of 1/4 so pgvector's float4 storage holds them exactly
+LINES = [
+    (3, "Invoice No: INV-001", [1.0, 0.0, 0.0]),
+    (4, "Invoice Date: 12 March 2024", [0.75, 0.5, 0.0]),
+    (5, "", [0.0, 0.0, 1.0]),
+    (6, "Customer: PT Maju", [0.0, 1.0, 0.0]),
+    (7, "Customer No: C-17", [0.0, 1.0, 0.0]),
+    (8, "Payment terms: 30 days net", [0.0, 0.25, 0.75]),
+]
+QUERIES = {
+    "invoice_number": ("Invoice No OR Invoice Number", [1.0, 0.25, 0.0]),
+    "buyer_name": ("Customer OR Buyer OR Bill To", [0.0, 0.75, 0.25]),
+    "payment_terms": ("Payment terms OR Terms", [0.0, 0.0, 1.0]),
+}
+
+
+def _lines():
+    return [Line(line_no, text, (0.0, 0.0, 1.0, 0.1), []) for line_no, text, _vec in LINES]
+
+
+def _embeddings():
+    return [vec for _line_no, _text, vec in LINES]
+
+
+def _memory():
+    return MemoryRetriever(_lines(), _embeddings())
+
+
+def _hybrid(retriever, query_text, qvec, alpha=0.5, topk=10):
+    dense_rows = retriever.dense_many([qvec], topk)[0]
+    dense = normalize_scores({row["id"]: row["dense_score"] for row in dense_rows})
+    keyword = normalize_scores(retriever.keyword(query_text, [row["id"] for row in dense_rows]))
+    line_nos = {row["id"]: row["line_no"] for row in dense_rows}
+    return [line_nos[cid] for cid in hybrid_rank(dense, keyword, alpha)]
+
+
+def test_dense_scores_follow_the_pgvector_l2_definition():
+    retriever = _memory()
+    qvecs = [vec for _text, vec in QUERIES.values()]
+    results = retriever.dense_many(qvecs, topk=10)
+
+    indexed = [(line_no, vec) for line_no, text, vec in LINES if text]
+    for qvec, rows in zip(qvecs, results):
+        expected = sorted(
+            ((float(np.linalg.norm(np.subtract(qvec, vec))), line_no) for line_no, vec in indexed),
+            key=lambda item: item[0],
+        )
+        assert [row["line_no"] for row in rows] == [line_no for _dist, line_no in expected]
+        for row, (dist, _line_no) in zip(rows, expected):
+            assert row["id"] == row["line_no"]
+            assert row["distance"] == pytest.approx(dist)
+            assert row["dense_score"] == pytest.approx(max(0.0, 1.0 - dist))
+
+
+def test_dense_ties_keep_line_order_and_topk_is_capped():
+    retriever = _memory()
+    rows = retriever.dense_many([[0.0, 1.0, 0.0]], topk=2)[0]
+    assert [row["line_no"] for row in rows] == [6, 7]
+    assert retriever.dense_many([[0.0, 1.0, 0.0]], topk=0) == [[]]
+    assert len(retriever.dense_many([[0.0, 1.0, 0.0]], topk=100)[0]) == 5
+    assert MemoryRetriever([], []).dense_many([[1.0, 0.0, 0.0]], topk=3) == [[]]
+
+
+def test_keyword_scores_are_bm25_over_the_or_alternatives():
+    retriever = _memory()
+    scores = retriever.keyword("Customer OR Buyer", [3, 6, 7, 8, 99])
+    assert set(scores) == {3, 6, 7, 8}
+    assert scores[3] == scores[8] == 0.0
+    # Same term frequency: the shorter line wins
+    assert scores[6] > scores[7] > 0.0
+
+    n_docs, df, k1, b = 5, 2, retriever.k1, retriever.b
+    idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+    avg_length = sum(retriever.lengths) / n_docs
+    norm = k1 * (1.0 - b + b * 3 / avg_length)
+    assert scores[6] == pytest.approx(idf * (k1 + 1.0) / (1.0 + norm))
+
+    # Terms from every alternative count; "no" is shared by lines 3 and 7
+    both = retriever.keyword("Invoice No OR Invoice Number", [3, 4, 7])
+    assert both[3] > both[4] > 0.0
+    assert both[7] > 0.0
+
+
+def test_lines_without_text_are_not_indexed():
+    retriever = _memory()
+    assert 5 not in retriever.ids
+    assert retriever.line_text(5) is None
+    assert retriever.line_text(6) == "Customer: PT Maju"
+
+
+def test_hybrid_ranking_picks_the_expected_lines():
+    retriever = _memory()
+    assert _hybrid(retriever, *QUERIES["invoice_number"])[0] == 3
+    assert _hybrid(retriever, *QUERIES["buyer_name"])[0] == 6
+    assert _hybrid(retriever, *QUERIES["payment_terms"])[0] == 8
+
+
+@pytest.fixture
+def pg_retriever(rag_db):
+    conn, table_name = rag_db
+    s04_rag.ensure_schema(conn, 3, table_name)
+    vectors = {text: vec for _line_no, text, vec in LINES}
+    s04_rag.upsert_lines(conn, "doc-1", 1, _lines(), lambda texts: [vectors[text] for text in texts], table_name)
+    return PgRetriever(conn, "doc-1", 1, table_name)
+
+
+def test_memory_and_postgres_retrievers_agree(pg_retriever):
+    memory = _memory()
+    for field, (query_text, qvec) in QUERIES.items():
+        pg_rows = pg_retriever.dense_many([qvec], 10)[0]
+        memory_rows = memory.dense_many([qvec], 10)[0]
+        assert [row["line_no"] for row in pg_rows] == [row["line_no"] for row in memory_rows], field
+        for pg_row, memory_row in zip(pg_rows, memory_rows):
+            assert pg_row["dense_score"] == pytest.approx(memory_row["dense_score"], abs=1e-6)
+        assert _hybrid(pg_retriever, query_text, qvec)[0] == _hybrid(memory, query_text, qvec)[0], field
+    assert pg_retriever.line_text(6) == memory.line_text(6)
@@ -0,0 +1,181 @@
+import json
+import os
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+import s04_rag
+from s04_rag import Line
+
+INDEXES = ["created_idx", "doc_page_idx", "ts_idx", "vec_idx"]
+
+
+class FakeCursor:
+    """Answers the ensure_schema catalog queries from ``catalog`` and records all SQL."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        query = " ".join(str(query).split())
+        self.conn.queries.append(query)
+        catalog = self.conn.catalog
+        if "information_schema.tables" in query:
+            self.result = [(catalog is not None,)]
+        elif "atttypmod" in query:
+            self.result = [(3,)]
+        elif "information_schema.columns" in query:
+            self.result = [(column,) for column in catalog["columns"]]
+        elif "pg_indexes" in query:
+            self.result = [(f"{params[0]}_{index}",) for index in catalog["indexes"]]
+        else:
+            self.result = []
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+
+class FakeConn:
+    def __init__(self, catalog=None):
+        self.catalog = catalog
+        self.queries = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture(autouse=True)
+def fresh_schema_cache(monkeypatch):
+    monkeypatch.setattr(s04_rag, "_SCHEMA_READY", set())
+
+
+def _ddl(conn):
+    return [query for query in conn.queries if query.startswith(("ALTER", "CREATE TABLE", "CREATE INDEX"))]
+
+
+def test_current_table_gets_no_ddl():
+    conn = FakeConn({"columns": ["id", "embedding", "created_at"], "indexes": INDEXES})
+    s04_rag.ensure_schema(conn, 3, "rag_header_lines")
+    assert _ddl(conn) == []
+    # Cached for the rest of the run
+    s04_rag.ensure_schema(conn, 3, "rag_header_lines")
+    assert conn.commits == 1
+
+
+def test_old_table_gets_only_the_missing_column_and_index():
+    conn = FakeConn({"columns": ["id", "embedding"], "indexes": ["doc_page_idx", "ts_idx", "vec_idx"]})
+    s04_rag.ensure_schema(conn, 3, "rag_header_lines")
+    assert _ddl(conn) == [
+        "ALTER TABLE rag_header_lines ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ NOT NULL DEFAULT now()",
+        "CREATE INDEX IF NOT EXISTS rag_header_lines_created_idx ON rag_header_lines(created_at)",
+    ]
+
+
+def test_new_table_is_created_with_every_index():
+    conn = FakeConn()
+    s04_rag.ensure_schema(conn, 3, "rag_header_lines")
+    ddl = _ddl(conn)
+    assert ddl[0].startswith("CREATE TABLE rag_header_lines (")
+    assert not any(query.startswith("ALTER") for query in ddl)
+    assert [query.split()[5] for query in ddl[1:]] == [f"rag_header_lines_{index}" for index in INDEXES]
+
+
+def test_upsert_lines_embeds_once_and_inserts_one_batch(monkeypatch):
+    inserts = []
+    monkeypatch.setattr(
+        s04_rag, "execute_values", lambda cur, query, rows, template, page_size: inserts.append((query, rows))
+    )
+    embedded = []
+
+    def embed_many(texts):
+        embedded.append(list(texts))
+        return [[0.5, 0.25, float(len(text))] for text in texts]
+
+    token = {"text": "Invoice", "bbox": [0.1, 0.1, 0.2, 0.12], "page": 1}
+    lines = [
+        Line(1, "Invoice", (0.1, 0.1, 0.2, 0.12), [token]),
+        Line(2, "", (0.0, 0.0, 0.0, 0.0), []),
+        Line(3, "No 7", (0.1, 0.2, 0.2, 0.22), []),
+    ]
+    conn = FakeConn()
+    assert s04_rag.upsert_lines(conn, "doc-1", 1, lines, embed_many, "rag_header_lines") == 2
+
+    assert embedded == [["Invoice", "No 7"]]
+    (query, rows), = inserts
+    assert query.startswith("INSERT INTO rag_header_lines ")
+    assert [row[:4] for row in rows] == [("doc-1", 1, 1, "Invoice"), ("doc-1", 1, 3, "No 7")]
+    assert rows[0][5].adapted == [token]
+    assert [row[6] for row in rows] == ["[0.5,0.25,7]", "[0.5,0.25,4]"]
+    assert conn.commits == 1
+
+    assert s04_rag.upsert_lines(conn, "doc-1", 1, lines[1:2], embed_many, "rag_header_lines") == 0
+    assert len(embedded) == 1
+
+
+def _populate(conn, table_name):
+    s04_rag.ensure_schema(conn, 3, table_name)
+    lines = [Line(line_no, f"line {line_no}", (0.0, 0.0, 1.0, 0.1), []) for line_no in range(1, 5)]
+    embed = lambda texts: [[1.0, 0.0, 0.0] for _ in texts]  # noqa: E731
+    for doc_id in ("doc-old", "doc-new"):
+        s04_rag.upsert_lines(conn, doc_id, 1, lines, embed, table_name)
+    with conn.cursor() as cur:
+        cur.execute(f"UPDATE {table_name} SET created_at = now() - interval '40 days' WHERE doc_id = 'doc-old'")
+    conn.commit()
+
+
+def test_delete_prune_and_bloat_report_on_postgres(rag_db):
+    conn, table_name = rag_db
+    _populate(conn, table_name)
+
+    report, = s04_rag.bloat_report(conn, [table_name])
+    assert report["table"] == table_name
+    assert report["documents"] == 2
+    expected_indexes = sorted(f"{table_name}_{index}" for index in INDEXES + ["pkey"])
+    assert sorted(index["name"] for index in report["indexes"]) == expected_indexes
+
+    assert s04_rag.prune_lines(conn, table_name, 30) == 4
+    assert s04_rag.delete_doc_lines(conn, "doc-new", table_name) == 4
+    assert s04_rag.delete_doc_lines(conn, "doc-new", table_name) == 0
+    assert s04_rag.bloat_report(conn, [table_name])[0]["documents"] == 0
+    assert table_name in s04_rag.list_region_tables(conn)
+
+
+def test_table_names_are_quoted_as_identifiers(rag_db):
+    conn, table_name = rag_db
+    _populate(conn, table_name)
+    hostile = f"{table_name}; DELETE FROM {table_name}"
+    with pytest.raises(psycopg2.errors.UndefinedTable):
+        s04_rag.prune_lines(conn, hostile, 0)
+    conn.rollback()
+    assert s04_rag.bloat_report(conn, [hostile]) == []
+    assert s04_rag.bloat_report(conn, [table_name])[0]["documents"] == 2
+
+
+def test_maintenance_prunes_vacuums_and_reindexes(rag_db, monkeypatch, capsys):
+    conn, table_name = rag_db
+    _populate(conn, table_name)
+    monkeypatch.setattr(s04_rag, "pg_connect_from_env", lambda: psycopg2.connect(os.environ["RAG_TEST_DATABASE_URL"]))
+
+    argv = ["--tables", table_name, "--prune-days", "30", "--vacuum", "--reindex"]
+    assert s04_rag.maintenance_main(argv) == 0
+    output = json.loads(capsys.readouterr().out)
+    assert output["pruned"] == {table_name: 4}
+    assert output["tables"][0]["documents"] == 1
+
+    assert s04_rag.maintenance_main(["--tables", f"{table_name}; DROP TABLE {table_name}", "--vacuum"]) == 1
+    assert table_name in s04_rag.list_region_tables(conn)
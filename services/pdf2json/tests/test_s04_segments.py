@@ -0,0 +1,76 @@
+import json
+
+from s04_camelot_grid_config import load_segment_regions, plan_items_regions
+
+REGIONS = ["table", "table_body", "items"]
+
+
+def write_segments(tmp_path, segments):
+    path = tmp_path / "segments.json"
+    path.write_text(json.dumps({"segments": segments}), encoding="utf-8")
+    return path
+
+
+def token_bands():
+    return {page: {"page": page, "y0": 0.2, "y1": 0.9, "source": "tokens"} for page in (1, 2, 3, 4)}
+
+
+def test_stitched_region_contributes_every_part(tmp_path):
+    # rittal: document-scoped region, canonical fragment on the last page
+    path = write_segments(tmp_path, [{
+        "id": "table", "page": 4, "bbox": [0.0, 0.33, 1.0, 0.61],
+        "parts": [
+            {"id": "table__p1", "page": 1, "bbox": [0.0, 0.34, 1.0, 0.95]},
+            {"id": "table__p2", "page": 2, "bbox": [0.0, 0.33, 1.0, 0.95]},
+            {"id": "table__p3", "page": 3, "bbox": [0.0, 0.35, 1.0, 0.95]},
+            {"id": "table__p4", "page": 4, "bbox": [0.0, 0.33, 1.0, 0.61]},
+        ],
+    }])
+    bands = load_segment_regions(path, REGIONS)
+    assert sorted(bands) == [1, 2, 3, 4]
+    assert all(band["end_anchor"] is None for band in bands.values())
+
+    regions, pages = plan_items_regions(bands, token_bands, [1, 2, 3, 4], [1, 2, 3, 4])
+    assert pages == [1, 2, 3, 4]
+    assert regions[1]["y1"] == 0.95
+
+
+def test_first_page_region_does_not_drop_later_pages(tmp_path):
+    # kass/kemas: region emitted on the first page only
+    path = write_segments(tmp_path, [{"id": "table", "page": 1, "bbox": [0.0, 0.42, 1.0, 0.59]}])
+    bands = load_segment_regions(path, REGIONS)
+    regions, pages = plan_items_regions(bands, token_bands, [1, 2], [1, 2])
+    assert pages == [1, 2]
+    assert regions[1]["source"] == "segments"
+    assert regions[2]["source"] == "tokens"
+    assert regions[1]["end_anchor"] is None
+
+
+def test_first_page_region_without_plan_keeps_all_pages(tmp_path):
+    path = write_segments(tmp_path, [{"id": "table", "page": 1, "bbox": [0.0, 0.42, 1.0, 0.59]}])
+    _regions, pages = plan_items_regions(load_segment_regions(path, REGIONS), token_bands, None, [1, 2])
+    assert pages is None
+
+
+def test_region_on_every_planned_page_restricts_pages(tmp_path):
+    path = write_segments(tmp_path, [
+        {"id": "table", "page": 2, "bbox": [0.0, 0.3, 1.0, 0.8]},
+        {"id": "table", "page": 3, "bbox": [0.0, 0.1, 1.0, 0.5]},
+        {"id": "table", "page": 3, "bbox": [0.0, 0.1, 1.0, 0.5], "metadata": {"ghost": True}},
+    ])
+    calls = []
+    regions, pages = plan_items_regions(
+        load_segment_regions(path, REGIONS),
+        lambda: calls.append(1) or token_bands(),
+        [2, 3],
+        [1, 2, 3],
+    )
+    assert pages == [2, 3]
+    assert sorted(regions) == [2, 3]
+    assert not calls
+
+
+def test_no_segments_falls_back_to_plan_and_anchors(tmp_path):
+    regions, pages = plan_items_regions(load_segment_regions(tmp_path / "missing.json", REGIONS), token_bands, [1, 3], [1, 2, 3])
+    assert pages == [1, 3]
+    assert regions == token_bands()
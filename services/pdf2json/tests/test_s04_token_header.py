@@ -0,0 +1,60 @@
+from s04_camelot_grid_config import _build_family_matcher, _cluster_tokens_by_line, _find_token_header
+
+ALIASES = {
+    "NO": ["NO"],
+    "DESC": ["DESCRIPTION"],
+    "QTY": ["QTY"],
+    "UOM": ["UNIT", "PCS"],
+    "PRICE": ["UNIT PRICE"],
+    "AMOUNT": ["AMOUNT"],
+}
+
+
+def tok(text, x0, x1, y0, height=0.006):
+    return {"text": text, "page": 1, "bbox": {"x0": x0, "x1": x1, "y0": y0, "y1": y0 + height}}
+
+
+def test_single_line_header():
+    lines = _cluster_tokens_by_line([
+        tok("NO", 0.10, 0.13, 0.30),
+        tok("DESCRIPTION", 0.20, 0.40, 0.30),
+        tok("QTY", 0.60, 0.65, 0.30),
+        tok("1", 0.10, 0.11, 0.32),
+        tok("Widget", 0.20, 0.28, 0.32),
+        tok("5", 0.63, 0.65, 0.32),
+    ])
+    first, last, groups, families = _find_token_header(lines, _build_family_matcher(ALIASES), None)
+    assert first == last == 0
+    assert families == ["NO", "DESC", "QTY"]
+
+
+def test_header_wrapped_over_several_lines():
+    # "UNIT PRI" / "CE" and "QTY." / "(PCS)" wrap, as on the PT Simon invoices
+    lines = _cluster_tokens_by_line([
+        tok("UNIT PRI", 0.70, 0.78, 0.470),
+        tok("QTY.", 0.64, 0.68, 0.478),
+        tok("AMOUNT", 0.81, 0.88, 0.478),
+        tok("NO.", 0.10, 0.14, 0.486),
+        tok("DESCRIPTION", 0.24, 0.42, 0.486),
+        tok("CE", 0.73, 0.75, 0.486),
+        tok("(PCS)", 0.64, 0.67, 0.494),
+        tok("10", 0.10, 0.12, 0.510),
+        tok("30", 0.66, 0.68, 0.510),
+    ])
+    first, last, groups, families = _find_token_header(lines, _build_family_matcher(ALIASES), None)
+    assert families == ["NO", "DESC", "QTY", "PRICE", "AMOUNT"]
+    assert lines[first]["center"] < lines[last]["center"] < 0.5
+    price = groups[families.index("PRICE")]
+    assert " ".join(t["text"] for t in price) == "UNIT PRI CE"
+
+
+def test_numeric_lines_never_join_the_header():
+    lines = _cluster_tokens_by_line([
+        tok("NO", 0.10, 0.13, 0.300),
+        tok("QTY", 0.60, 0.65, 0.300),
+        tok("1", 0.10, 0.11, 0.308),
+        tok("AMOUNT", 0.80, 0.88, 0.308),
+    ])
+    first, last, _groups, families = _find_token_header(lines, _build_family_matcher(ALIASES), None)
+    assert (first, last) == (0, 0)
+    assert "AMOUNT" not in families
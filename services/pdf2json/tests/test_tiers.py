@@ -0,0 +1,106 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import processor
+
+
+def _stage(script, *args):
+    return {"script": script, "args": list(args)}
+
+
+PIPELINE = {
+    "stages": [
+        _stage("s04_camelot_grid_config.py", "--out", "{cells}"),
+        _stage("s08_validator.py", "--out", "{validation}"),
+        _stage("s09_confidence.py", "--out", "{confidence}"),
+        _stage("s10_parser.py", "--final", "{final}"),
+    ],
+    "execution": {
+        "mode": "tiered",
+        "tiers": [{"name": "tokens", "overrides": {"s04_camelot_grid_config.py": {"extra_args": ["--engine", "tokens"]}}}],
+        "accept": {"min_confidence": 0.9, "min_row_pass_rate": 1.0},
+    },
+}
+
+
+def _arg(cmd, flag):
+    return Path(cmd[cmd.index(flag) + 1])
+
+
+class FakeStages:
+    """Stands in for the stage subprocesses; ``tokens_mode`` decides what the cheap tier does."""
+
+    def __init__(self, tokens_mode):
+        self.tokens_mode = tokens_mode
+        self.calls = []
+        self.engine = None
+
+    def __call__(self, cmd, env=None, cancel=None):
+        script = Path(cmd[1]).name
+        self.calls.append((script, "--engine" in cmd))
+        if script == "s04_camelot_grid_config.py":
+            self.engine = "tokens" if "--engine" in cmd else "camelot"
+            if self.engine == "tokens" and self.tokens_mode == "crash":
+                raise RuntimeError("Command failed (1): python")
+        elif script == "s08_validator.py":
+            good = self.engine == "camelot" or self.tokens_mode == "accept"
+            self._write(_arg(cmd, "--out"), {
+                "rows": {"total": 3, "pass_rate": 1.0 if good else 0.0},
+                "totals": {"checks": {"subtotal": {"pass": good}}},
+            })
+        elif script == "s09_confidence.py":
+            good = self.engine == "camelot" or self.tokens_mode == "accept"
+            self._write(_arg(cmd, "--out"), {"score": 0.95 if good else 0.3})
+        elif script == "s10_parser.py":
+            self._write(_arg(cmd, "--final"), {"doc_id": "d", "engine": self.engine})
+
+    @staticmethod
+    def _write(path, payload):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(payload), encoding="utf-8")
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    config = tmp_path / "pipeline.json"
+    config.write_text(json.dumps(PIPELINE), encoding="utf-8")
+    monkeypatch.setattr(processor, "_find_pipeline_config", lambda name: config)
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+
+    def run(tokens_mode):
+        fake = FakeStages(tokens_mode)
+        monkeypatch.setattr(processor, "run", fake)
+        final, _ = processor._run_pipeline(b"%PDF", "d", "pipeline.json", include_refs=True, with_artifacts=False)
+        return final, fake
+
+    return run
+
+
+def test_accepted_cheap_tier_serves_the_document(pipeline):
+    final, fake = pipeline("accept")
+    assert final["engine"] == "tokens"
+    assert [script for script, _ in fake.calls].count("s04_camelot_grid_config.py") == 1
+
+
+def test_rejected_cheap_tier_escalates_to_full(pipeline):
+    final, fake = pipeline("reject")
+    assert final["engine"] == "camelot"
+    assert ("s04_camelot_grid_config.py", True) in fake.calls
+    assert ("s04_camelot_grid_config.py", False) in fake.calls
+
+
+def test_failing_cheap_tier_falls_through_to_full(pipeline):
+    final, fake = pipeline("crash")
+    assert final["engine"] == "camelot"
+    # s08/s09 never ran for the failed tier, only for the full one
+    assert [script for script, _ in fake.calls].count("s08_validator.py") == 1
+
+
+def test_tier_stages_applies_overrides_and_skips():
+    tier = {"skip": ["s08_validator.py"], "overrides": {"s04_camelot_grid_config.py": {"extra_args": ["--engine", "tokens"]}}}
+    plan = processor._tier_stages(PIPELINE["stages"], tier)
+    assert [step["script"] for step in plan] == ["s04_camelot_grid_config.py", "s09_confidence.py", "s10_parser.py"]
+    assert plan[0]["args"][-2:] == ["--engine", "tokens"]
+    assert PIPELINE["stages"][0]["args"] == ["--out", "{cells}"]
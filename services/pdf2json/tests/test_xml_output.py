@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+import xml_output
+
+
+@pytest.fixture
+def profiles(tmp_path, monkeypatch):
+    pipeline = {
+        "json2xml": {
+            "profiles": {
+                "default": {"mapping": "mappings/pt_simon_invoice_v1.json", "params": {"seller": "S"}},
+                "broken": {"mapping": "mappings/missing.json"},
+            }
+        }
+    }
+    (tmp_path / "fused_test.json").write_text(json.dumps(pipeline), encoding="utf-8")
+    monkeypatch.setenv("CONFIG_DIR", str(tmp_path))
+    monkeypatch.setenv("JSON2XML_RELOAD_INTERVAL", "0")
+    monkeypatch.setattr(xml_output, "_REGISTRY", None)
+    registry = xml_output._profiles()
+
+    calls = []
+
+    def fake_converter(payload, mapping, params=None, pretty=False):
+        calls.append((mapping, params))
+        return b"<xml/>"
+
+    for profile in registry._profiles.values():
+        if profile.converter is not None:
+            monkeypatch.setattr(profile, "converter", fake_converter)
+    return registry, calls
+
+
+def test_registry_and_mapping_are_reused_across_requests(profiles):
+    registry, calls = profiles
+    loads = registry.mappings.loads
+
+    assert xml_output.convert({}, "fused_test.json") == b"<xml/>"
+    assert xml_output.convert({}, "fused_test.json", params={"extra": 1}) == b"<xml/>"
+
+    assert xml_output._profiles() is registry
+    assert registry.mappings.loads == loads
+    assert calls[0][0] is calls[1][0]
+    assert calls[0][1] == {"seller": "S"}
+    assert calls[1][1] == {"seller": "S", "extra": 1}
+
+
+def test_unusable_profiles_fall_back_to_json(profiles):
+    with pytest.raises(xml_output.FusedUnavailable):
+        xml_output.convert({}, "fused_test.json", profile="broken")
+    with pytest.raises(xml_output.FusedUnavailable):
+        xml_output.convert({}, "fused_test.json", profile="unknown")
@@ -0,0 +1,128 @@
+"""
+In-process JSON→XML conversion for the fused PDF→XML route.
+
+``/process-xml`` runs the pipeline and then the converter declared in the
+same pipeline config (``json2xml.profiles.<profile>``) inside this process,
+so the JSON never leaves the worker. The json2xml package and its mappings
+are looked up in JSON2XML_DIR (default: ``/json2xml``, then the sibling
+``services/json2xml`` of a source checkout), and profiles are resolved with
+that service's ``registry`` module, once per process.
+
+When the converter cannot be loaded here, ``FusedUnavailable`` is raised and
+the caller returns JSON so the gateway can finish with the json2xml service.
+"""
+
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from processor import _config_dirs
+
+SERVICE_DIR = Path(__file__).resolve().parent
+SERVICES_DIR = SERVICE_DIR.parent
+
+# json2xml ProfileRegistry, built by _profiles() on the first fused request
+_REGISTRY = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+class FusedUnavailable(RuntimeError):
+    """The json2xml converter (or the profile) is not usable in this process."""
+
+
+class ConversionFailed(RuntimeError):
+    """The converter rejected the document; ``status_code`` mirrors the json2xml service."""
+
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _json2xml_dir() -> Optional[Path]:
+    candidates = [os.getenv("JSON2XML_DIR"), "/json2xml", str(SERVICES_DIR / "json2xml")]
+    for candidate in candidates:
+        if candidate and (Path(candidate) / "json2xml" / "__init__.py").exists():
+            return Path(candidate)
+    return None
+
+
+def _ensure_importable() -> Path:
+    root = _json2xml_dir()
+    if root is None:
+        raise FusedUnavailable("json2xml package not found (set JSON2XML_DIR)")
+    if str(root) not in sys.path:
+        sys.path.append(str(root))
+    return root
+
+
+def _search_roots(json2xml_root: Path) -> List[Path]:
+    roots: List[Path] = []
+    if os.getenv("CONFIG_DIR"):
+        roots.append(Path(os.environ["CONFIG_DIR"]))
+    roots += [SERVICES_DIR, json2xml_root, json2xml_root / "mappings"]
+    return roots
+
+
+def _profiles():
+    """The process-wide ``registry.ProfileRegistry`` of the json2xml service.
+
+    Built on first use and kept for the life of the worker, so converters are
+    imported once and every request gets the same compiled mapping object
+    (the converter's plan cache is keyed by it). Changed configs and mapping
+    files are picked up by the registry's mtime checks. Called from the
+    pipeline pool, so concurrent first requests build it only once.
+    """
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            root = _ensure_importable()
+            try:
+                import registry as profile_registry
+            except ImportError as exc:
+                raise FusedUnavailable(f"json2xml registry unavailable: {exc}") from exc
+            default_pipeline = os.getenv("PIPELINE_CONFIG") or os.getenv("DEFAULT_PIPELINE") or "invoice_pt_simon.json"
+            _REGISTRY = profile_registry.from_env(_config_dirs(), _search_roots(root), default_pipeline)
+        return _REGISTRY
+
+
+def convert(
+    payload: Dict[str, Any],
+    pipeline: str,
+    profile: str = "default",
+    pretty: bool = False,
+    params: Optional[Dict[str, Any]] = None,
+) -> bytes:
+    """Convert the ``/process`` response payload with the pipeline's json2xml profile.
+
+    Blocking (registry load on first use, lxml build); call it off the event loop.
+    """
+
+    profiles = _profiles()
+
+    from json2xml.converter import ConversionError
+    from json2xml.mapping import MappingError
+    from registry import RegistryError
+
+    try:
+        resolved, mapping_config = profiles.resolve(profile, pipeline)
+    except RegistryError as exc:
+        raise FusedUnavailable(exc.detail) from exc
+    except MappingError as exc:
+        raise ConversionFailed(422, f"Mapping error: {exc}") from exc
+
+    combined_params = dict(resolved.params)
+    if params:
+        combined_params.update(params)
+
+    try:
+        return resolved.converter(payload, mapping_config, params=combined_params or None, pretty=pretty)
+    except MappingError as exc:
+        raise ConversionFailed(422, f"Mapping error: {exc}") from exc
+    except ConversionError as exc:
+        message = str(exc)
+        if "missing" in message.lower() or "invalid" in message.lower():
+            raise ConversionFailed(400, f"Invalid input data: {message}") from exc
+        raise ConversionFailed(422, f"Conversion constraint violation: {message}") from exc
@@ -0,0 +1,253 @@
+"""Scoring backends for the reranker service.
+
+Every backend turns a list of ``[query, text]`` pairs into raw relevance
+logits (the same scale ``FlagReranker.compute_score`` returns):
+
+- ``flag``: the reference FlagEmbedding model (PyTorch, optional fp16).
+- ``onnx``: an ONNX export run with onnxruntime; point RERANKER_MODEL_DIR at a
+  directory holding the tokenizer files and ``model.onnx`` (or the file named
+  by RERANKER_ONNX_FILE, e.g. an int8 ``model_quantized.onnx``).
+- ``int8``: the Hugging Face checkpoint from RERANKER_MODEL_DIR (or the hub
+  id) with its Linear layers dynamically quantized to int8.
+
+``parity_check`` scores a fixed pair set with a candidate and the reference
+backend so a quantized or exported model can be vetted before it serves.
+
+Fork safety: ``flag`` and ``int8`` are plain PyTorch modules and may be built
+in the gunicorn master and shared copy-on-write by the workers. An
+onnxruntime ``InferenceSession`` owns native thread pools that do not survive
+``fork()``, so ``onnx`` sessions are built in each worker after it forks.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger("reranker")
+
+# Backends whose model may be loaded before gunicorn forks (see module docstring)
+FORK_SAFE_BACKENDS = frozenset({"flag", "int8"})
+
+
+# Fixed pairs for parity checks: header lines and field queries as s04_rag sends them
+PARITY_PAIRS: List[List[str]] = [
+    ["invoice number OR no. invoice OR nomor faktur", "Invoice No : INV/076/0825"],
+    ["invoice number OR no. invoice OR nomor faktur", "Date : 29 August 2025"],
+    ["invoice date OR tanggal", "Tanggal: 12-03-2024"],
+    ["invoice date OR tanggal", "PT Sinar Abadi Jaya, Jl. Merdeka No. 5 Jakarta"],
+    ["buyer OR bill to OR customer", "Bill To: PT Nusantara Academy"],
+    ["buyer OR bill to OR customer", "Subtotal 39,146,622.00"],
+    ["grand total OR total amount due", "Grand Total IDR 43,452,750.00"],
+    ["grand total OR total amount due", "Email: info@nusantara-academy.com"],
+    ["vat OR ppn OR tax", "PPN 11% 4,306,128.00"],
+    ["vat OR ppn OR tax", "Payment due within 30 days of invoice date"],
+    ["subtotal OR sub total", "Sub Total 35,884,404.00"],
+    ["subtotal OR sub total", "Thank you for your business"],
+]
+
+
+class ScoringBackend:
+    """Base class; subclasses implement ``_score_batch``."""
+
+    name = "base"
+
+    def __init__(self, max_length: int, batch_size: int) -> None:
+        self.max_length = max_length
+        self.batch_size = max(1, batch_size)
+
+    def compute(self, pairs: Sequence[Sequence[str]]) -> List[float]:
+        scores: List[float] = []
+        for start in range(0, len(pairs), self.batch_size):
+            scores.extend(self._score_batch([list(pair) for pair in pairs[start:start + self.batch_size]]))
+        return scores
+
+    def _score_batch(self, pairs: List[List[str]]) -> List[float]:
+        raise NotImplementedError
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": self.name, "max_length": self.max_length, "batch_size": self.batch_size}
+
+
+class FlagBackend(ScoringBackend):
+    """Reference backend: FlagEmbedding's FlagReranker."""
+
+    name = "flag"
+
+    def __init__(self, model_id: str, device: str, use_fp16: bool, max_length: int, batch_size: int) -> None:
+        super().__init__(max_length, batch_size)
+        from FlagEmbedding import FlagReranker
+
+        self.device = device
+        self.use_fp16 = use_fp16
+        self.model = FlagReranker(model_id, use_fp16=use_fp16, device=device)
+
+    def _score_batch(self, pairs: List[List[str]]) -> List[float]:
+        scores = self.model.compute_score(pairs, batch_size=self.batch_size, max_length=self.max_length)
+        if isinstance(scores, (list, tuple)):
+            return [float(value) for value in scores]
+        return [float(scores)]
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "device": self.device, "fp16": self.use_fp16}
+
+
+class OnnxBackend(ScoringBackend):
+    """ONNX Runtime on CPU with a fixed intra-op thread count."""
+
+    name = "onnx"
+
+    def __init__(self, model_dir: str, onnx_file: str, threads: int, max_length: int, batch_size: int) -> None:
+        super().__init__(max_length, batch_size)
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as exc:
+            raise RuntimeError("onnx backend requires onnxruntime and transformers") from exc
+
+        model_path = os.path.join(model_dir, onnx_file)
+        if not os.path.exists(model_path):
+            raise RuntimeError(f"ONNX model not found: {model_path}")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.model_path = model_path
+        self.threads = threads
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+
+    def _score_batch(self, pairs: List[List[str]]) -> List[float]:
+        encoded = self.tokenizer(
+            pairs,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np",
+        )
+        feeds = {name: encoded[name].astype("int64") for name in self.input_names if name in encoded}
+        logits = self.session.run(None, feeds)[0]
+        return [float(value) for value in logits.reshape(len(pairs), -1)[:, 0]]
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "model_path": self.model_path, "threads": self.threads}
+
+
+class Int8Backend(ScoringBackend):
+    """PyTorch sequence classifier with int8 dynamic quantization of Linear layers."""
+
+    name = "int8"
+
+    def __init__(self, model_source: str, threads: int, max_length: int, batch_size: int) -> None:
+        super().__init__(max_length, batch_size)
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.torch = torch
+        self.threads = threads
+        self.model_source = model_source
+        self.tokenizer = AutoTokenizer.from_pretrained(model_source)
+        model = AutoModelForSequenceClassification.from_pretrained(model_source)
+        model.eval()
+        self.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def _score_batch(self, pairs: List[List[str]]) -> List[float]:
+        encoded = self.tokenizer(
+            pairs,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="pt",
+        )
+        with self.torch.inference_mode():
+            logits = self.model(**encoded, return_dict=True).logits
+        return [float(value) for value in logits.view(len(pairs), -1)[:, 0]]
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "model_source": self.model_source, "threads": self.threads}
+
+
+def create_backend(name: str, model_id: str, device: str, use_fp16: bool) -> ScoringBackend:
+    """Build a backend from its name and the RERANKER_* environment."""
+
+    max_length = int(os.getenv("RERANKER_MAX_LENGTH", "512"))
+    batch_size = int(os.getenv("RERANKER_INFER_BATCH", "32"))
+    threads = int(os.getenv("RERANKER_THREADS", "0"))
+    model_dir = os.getenv("RERANKER_MODEL_DIR", "")
+
+    name = (name or "flag").lower()
+    if name == "flag":
+        if threads > 0:
+            import torch
+
+            torch.set_num_threads(threads)
+        return FlagBackend(model_dir or model_id, device, use_fp16, max_length, batch_size)
+    if name == "onnx":
+        if not model_dir:
+            raise RuntimeError("onnx backend requires RERANKER_MODEL_DIR")
+        return OnnxBackend(model_dir, os.getenv("RERANKER_ONNX_FILE", "model.onnx"), threads, max_length, batch_size)
+    if name == "int8":
+        return Int8Backend(model_dir or model_id, threads, max_length, batch_size)
+    raise RuntimeError(f"Unknown reranker backend '{name}' (expected flag, onnx or int8)")
+
+
+def _ranks(values: Sequence[float]) -> List[int]:
+    order = sorted(range(len(values)), key=lambda idx: values[idx])
+    ranks = [0] * len(values)
+    for rank, idx in enumerate(order):
+        ranks[idx] = rank
+    return ranks
+
+
+def parity_check(
+    candidate: ScoringBackend,
+    reference: ScoringBackend,
+    pairs: Optional[List[List[str]]] = None,
+    max_abs_diff: float = 0.5,
+) -> Dict[str, Any]:
+    """Compare ``candidate`` with ``reference`` on a fixed pair set.
+
+    Passes when every logit is within ``max_abs_diff`` and each query picks
+    the same best line under both backends.
+    """
+
+    pairs = pairs or PARITY_PAIRS
+    started = time.perf_counter()
+    expected = reference.compute(pairs)
+    reference_ms = (time.perf_counter() - started) * 1000.0
+    started = time.perf_counter()
+    actual = candidate.compute(pairs)
+    candidate_ms = (time.perf_counter() - started) * 1000.0
+
+    diffs = [abs(a - b) for a, b in zip(actual, expected)]
+    by_query: Dict[str, List[int]] = {}
+    for idx, (query, _text) in enumerate(pairs):
+        by_query.setdefault(query, []).append(idx)
+    best_agree = sum(
+        1
+        for idxs in by_query.values()
+        if max(idxs, key=lambda i: actual[i]) == max(idxs, key=lambda i: expected[i])
+    )
+    n = len(pairs)
+    rank_a, rank_e = _ranks(actual), _ranks(expected)
+    spearman = 1.0 - 6.0 * sum((a - b) ** 2 for a, b in zip(rank_a, rank_e)) / (n * (n * n - 1)) if n > 1 else 1.0
+
+    max_diff = max(diffs) if diffs else 0.0
+    return {
+        "candidate": candidate.name,
+        "reference": reference.name,
+        "pairs": n,
+        "max_abs_diff": round(max_diff, 4),
+        "mean_abs_diff": round(sum(diffs) / n, 4) if n else 0.0,
+        "spearman": round(spearman, 4),
+        "best_agreement": f"{best_agree}/{len(by_query)}",
+        "reference_ms": round(reference_ms, 2),
+        "candidate_ms": round(candidate_ms, 2),
+        "passed": max_diff <= max_abs_diff and best_agree == len(by_query),
+    }
@@ -0,0 +1,22 @@
+"""Gunicorn settings for pre-fork serving of the reranker.
+
+The app (and with RERANKER_PRELOAD the model) is imported once in the master
+before workers fork, so every worker shares the model weights copy-on-write
+instead of holding its own copy. Each worker still runs its own warm-up and
+reports readiness on /ready.
+
+Only the PyTorch backends (flag, int8) are preloaded. With RERANKER_BACKEND=onnx
+the master skips the model and each worker builds its own onnxruntime session
+after fork, since an InferenceSession's thread pools are not fork-safe.
+"""
+
+import os
+
+os.environ.setdefault("RERANKER_PRELOAD", "1")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("RERANKER_WORKERS", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("RERANKER_WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
@@ -5,16 +5,26 @@ Provides a simple JSON API compatible with the RAG pipeline's reranking needs.
 
 from __future__ import annotations
 
+import asyncio
+import gc
+import hashlib
 import logging
 import math
 import os
+import queue
+import sqlite3
+import sys
 import threading
-from typing import List, Optional, Union
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, validator
 
-from FlagEmbedding import FlagReranker
+from backends import FORK_SAFE_BACKENDS, PARITY_PAIRS, ScoringBackend, create_backend, parity_check
 
 
 logger = logging.getLogger("reranker")
@@ -49,6 +59,29 @@ class RerankRequest(BaseModel):
         return value
 
 
+class BatchQuery(BaseModel):
+    """One query of a multi-query rerank request."""
+
+    key: Union[int, str]
+    query: str
+    candidates: List[Candidate]
+    top_k: Optional[int] = None
+
+    @validator("query")
+    def _validate_query(cls, value: str) -> str:
+        if not value.strip():
+            raise ValueError("query must be non-empty")
+        return value
+
+
+class BatchRerankRequest(BaseModel):
+    """Payload accepted by the multi-query endpoint."""
+
+    queries: List[BatchQuery]
+    model: Optional[str] = None
+    normalize_scores: bool = True
+
+
 class ScoredCandidate(BaseModel):
     """Candidate with an attached relevance score."""
 
@@ -65,6 +98,23 @@ class RerankResponse(BaseModel):
     best: Optional[ScoredCandidate]
 
 
+class BatchQueryResult(BaseModel):
+    """Scores and best candidate for one query of a batch."""
+
+    key: Union[int, str]
+    results: List[ScoredCandidate]
+    best: Optional[ScoredCandidate]
+
+
+class BatchRerankResponse(BaseModel):
+    """Response returned from the multi-query endpoint."""
+
+    model: str
+    results: List[BatchQueryResult]
+    pairs: int
+    unique_pairs: int
+
+
 MODEL_ALIAS = os.getenv("RERANKER_MODEL", "bge-reranker-v2-m3")
 MODEL_DEVICE = os.getenv("RERANKER_DEVICE", "cpu")
 FORCE_FP16 = os.getenv("RERANKER_USE_FP16")
@@ -77,8 +127,29 @@ ACTIVE_MODEL_ALIAS = MODEL_ALIAS
 ACTIVE_MODEL_ID = MODEL_ALIASES.get(MODEL_ALIAS, MODEL_ALIAS)
 USE_FP16 = FORCE_FP16.lower() in {"1", "true", "yes"} if FORCE_FP16 else MODEL_DEVICE != "cpu"
 
+# Scoring backend: flag (reference), onnx or int8 (see backends.py)
+BACKEND_NAME = os.getenv("RERANKER_BACKEND", "flag").lower()
+PARITY_CHECK = os.getenv("RERANKER_PARITY_CHECK", "").lower() in {"1", "true", "yes"}
+PARITY_MAX_DIFF = float(os.getenv("RERANKER_PARITY_MAX_DIFF", "0.5"))
+
+# Micro-batching: pairs from concurrent requests are scored in one forward pass
+BATCH_MAX_PAIRS = max(1, int(os.getenv("RERANKER_BATCH_MAX_PAIRS", "64")))
+BATCH_WAIT_MS = max(0.0, float(os.getenv("RERANKER_BATCH_WAIT_MS", "5")))
+
+# Score cache: bounded in-memory LRU, optionally backed by SQLite when a path is set
+CACHE_MAX_ENTRIES = max(0, int(os.getenv("RERANKER_CACHE_SIZE", "100000")))
+CACHE_PATH = os.getenv("RERANKER_CACHE_PATH", "")
+
+# Startup: load the model and score a warm-up batch before /ready reports ready.
+# RERANKER_PRELOAD=1 (set by gunicorn.conf.py) loads it at import in the pre-fork master,
+# for fork-safe backends only; onnx sessions are always built in the worker after fork.
+# The RERANKER_PARITY_CHECK comparison runs inference, so each worker runs it in _warm_up.
+WARMUP = os.getenv("RERANKER_WARMUP", "1").lower() in {"1", "true", "yes"}
+PRELOAD = os.getenv("RERANKER_PRELOAD", "").lower() in {"1", "true", "yes"}
+
 _app_lock = threading.Lock()
-_reranker: Optional[FlagReranker] = None
+_reranker: Optional[ScoringBackend] = None
+_parity: Optional[dict] = None
 
 app = FastAPI(
     title="FlagEmbedding Reranker",
@@ -87,17 +158,325 @@ app = FastAPI(
 )
 
 
-def _load_reranker() -> FlagReranker:
+def _load_reranker() -> ScoringBackend:
+    """Build the configured backend once; only loads weights, so it is safe before fork."""
+
     global _reranker
     if _reranker is not None:
         return _reranker
     with _app_lock:
         if _reranker is None:
-            logger.info("Loading reranker model '%s' on device '%s' (fp16=%s)", ACTIVE_MODEL_ID, MODEL_DEVICE, USE_FP16)
-            _reranker = FlagReranker(ACTIVE_MODEL_ID, use_fp16=USE_FP16, device=MODEL_DEVICE)
+            logger.info(
+                "Loading reranker model '%s' with backend '%s' on device '%s' (fp16=%s)",
+                ACTIVE_MODEL_ID, BACKEND_NAME, MODEL_DEVICE, USE_FP16,
+            )
+            _reranker = create_backend(BACKEND_NAME, ACTIVE_MODEL_ID, MODEL_DEVICE, USE_FP16)
+    return _reranker
+
+
+def _vetted_reranker() -> ScoringBackend:
+    """The serving backend, vetted against ``flag`` once per process when enabled.
+
+    The parity check runs inference, so it happens in the worker (``_warm_up``
+    or the first request), never in the pre-fork master. A failing backend is
+    swapped for the reference.
+    """
+
+    global _reranker, _parity
+    backend = _load_reranker()
+    if not PARITY_CHECK or _parity is not None or backend.name == "flag":
+        return backend
+    with _app_lock:
+        if _parity is None:
+            reference = create_backend("flag", ACTIVE_MODEL_ID, MODEL_DEVICE, USE_FP16)
+            _parity = parity_check(backend, reference, max_abs_diff=PARITY_MAX_DIFF)
+            logger.info("Parity check: %s", _parity)
+            if not _parity["passed"]:
+                logger.error("Backend '%s' failed the parity check; serving the reference backend", backend.name)
+                _reranker = reference
+            del reference
     return _reranker
 
 
+class BatchMetrics:
+    """Counters for batch size, batch-formation latency and queue depth."""
+
+    SIZE_BUCKETS = (1, 4, 16, 64, 256)
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.pairs = 0
+        self.failures = 0
+        self.formation_ms_total = 0.0
+        self.formation_ms_max = 0.0
+        self.inference_ms_total = 0.0
+        self.queue_depth_last = 0
+        self.queue_depth_max = 0
+        self.size_histogram = {str(b): 0 for b in self.SIZE_BUCKETS}
+        self.size_histogram["+Inf"] = 0
+
+    def record(self, requests: int, pairs: int, formation_ms: float, inference_ms: float, queue_depth: int, failed: bool) -> None:
+        with self._lock:
+            self.batches += 1
+            self.requests += requests
+            self.pairs += pairs
+            self.failures += int(failed)
+            self.formation_ms_total += formation_ms
+            self.formation_ms_max = max(self.formation_ms_max, formation_ms)
+            self.inference_ms_total += inference_ms
+            self.queue_depth_last = queue_depth
+            self.queue_depth_max = max(self.queue_depth_max, queue_depth)
+            bucket = next((str(b) for b in self.SIZE_BUCKETS if pairs <= b), "+Inf")
+            self.size_histogram[bucket] += 1
+
+    def snapshot(self, queue_depth: int) -> Dict[str, Any]:
+        with self._lock:
+            batches = self.batches or 1
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "pairs": self.pairs,
+                "failures": self.failures,
+                "avg_requests_per_batch": round(self.requests / batches, 3),
+                "avg_pairs_per_batch": round(self.pairs / batches, 3),
+                "pairs_per_batch_histogram": dict(self.size_histogram),
+                "formation_ms_avg": round(self.formation_ms_total / batches, 3),
+                "formation_ms_max": round(self.formation_ms_max, 3),
+                "inference_ms_avg": round(self.inference_ms_total / batches, 3),
+                "queue_depth": queue_depth,
+                "queue_depth_last": self.queue_depth_last,
+                "queue_depth_max": self.queue_depth_max,
+            }
+
+
+class _PendingPairs:
+    __slots__ = ("pairs", "future", "enqueued_at")
+
+    def __init__(self, pairs: List[List[str]]) -> None:
+        self.pairs = pairs
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class PairBatcher:
+    """Collect (query, text) pairs from concurrent requests into one model call.
+
+    A single worker thread owns the model. It takes the first waiting request,
+    keeps collecting for up to ``wait_ms`` or until ``max_pairs`` pairs are
+    queued, scores the whole batch at once and hands each request its slice.
+    """
+
+    def __init__(self, score_fn: Callable[[List[List[str]]], List[float]], max_pairs: int, wait_ms: float) -> None:
+        self._score_fn = score_fn
+        self.max_pairs = max_pairs
+        self.wait_s = wait_ms / 1000.0
+        self._queue: "queue.Queue[_PendingPairs]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.metrics = BatchMetrics()
+
+    def submit(self, pairs: List[List[str]]) -> List[float]:
+        """Block until the pairs are scored; raises if their batch failed."""
+        if not pairs:
+            return []
+        self._ensure_worker()
+        pending = _PendingPairs(pairs)
+        self._queue.put(pending)
+        return pending.future.result()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self) -> List[_PendingPairs]:
+        batch = [self._queue.get()]
+        size = len(batch[0].pairs)
+        deadline = batch[0].enqueued_at + self.wait_s
+        while size < self.max_pairs:
+            try:
+                remaining = deadline - time.perf_counter()
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item.pairs)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            formed_at = time.perf_counter()
+            depth = self._queue.qsize()
+            flat = [pair for item in batch for pair in item.pairs]
+            failed = False
+            try:
+                scores = self._score_fn(flat)
+                if len(scores) != len(flat):
+                    raise RuntimeError(f"model returned {len(scores)} scores for {len(flat)} pairs")
+                offset = 0
+                for item in batch:
+                    item.future.set_result(scores[offset:offset + len(item.pairs)])
+                    offset += len(item.pairs)
+            except Exception as exc:
+                failed = True
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(exc)
+            self.metrics.record(
+                requests=len(batch),
+                pairs=len(flat),
+                formation_ms=(formed_at - batch[0].enqueued_at) * 1000.0,
+                inference_ms=(time.perf_counter() - formed_at) * 1000.0,
+                queue_depth=depth,
+                failed=failed,
+            )
+
+
+class ScoreCache:
+    """LRU cache of raw scores keyed by model id, query and candidate-text hash.
+
+    Raw (pre-sigmoid) scores are stored, so one entry serves both
+    ``normalize_scores`` settings. With ``path`` set, entries are also written
+    to SQLite and memory misses are looked up there, so the cache survives
+    restarts. Persistence errors only disable the persistent layer.
+    """
+
+    # Rough per-entry cost of an OrderedDict slot beyond the key and value objects
+    ENTRY_OVERHEAD = 100
+
+    def __init__(self, max_entries: int, path: str = "") -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._path = path if max_entries > 0 else ""
+        self._conn_pid: Optional[int] = None
+        self._open()
+
+    def _open(self) -> None:
+        # SQLite connections must not cross fork(); pre-forked workers reopen their own
+        self._conn = None
+        self._conn_pid = os.getpid()
+        if not self._path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+            self._conn = sqlite3.connect(self._path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS scores (key BLOB PRIMARY KEY, score REAL NOT NULL)")
+            self._conn.commit()
+        except (OSError, sqlite3.Error) as exc:
+            logger.warning("Score cache persistence disabled (%s): %s", self._path, exc)
+            self._path = ""
+            self._conn = None
+
+    def after_fork(self) -> None:
+        if self._conn_pid != os.getpid():
+            self._open()
+
+    @staticmethod
+    def key(model: str, query: str, text: str) -> bytes:
+        text_hash = hashlib.sha1(text.encode("utf-8")).digest()
+        return hashlib.sha1(b"\x1f".join([model.encode("utf-8"), query.encode("utf-8"), text_hash])).digest()
+
+    def get_many(self, keys: List[bytes]) -> List[Optional[float]]:
+        if self.max_entries <= 0:
+            self.misses += len(keys)
+            return [None] * len(keys)
+        found: List[Optional[float]] = []
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                found.append(value)
+            missing = [key for key, value in zip(keys, found) if value is None]
+            if missing and self._conn is not None:
+                stored = self._load(missing)
+                for idx, key in enumerate(keys):
+                    if found[idx] is None and key in stored:
+                        found[idx] = stored[key]
+                        self._insert(key, stored[key])
+            hits = sum(1 for value in found if value is not None)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items: Dict[bytes, float]) -> None:
+        if self.max_entries <= 0 or not items:
+            return
+        with self._lock:
+            for key, value in items.items():
+                self._insert(key, value)
+            if self._conn is not None:
+                try:
+                    self._conn.executemany("INSERT OR REPLACE INTO scores (key, score) VALUES (?, ?)", list(items.items()))
+                    self._conn.commit()
+                except sqlite3.Error as exc:
+                    logger.warning("Score cache write failed; persistence disabled: %s", exc)
+                    self._path = ""
+                    self._conn = None
+
+    def _insert(self, key: bytes, value: float) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, keys: List[bytes]) -> Dict[bytes, float]:
+        try:
+            rows = []
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows.extend(self._conn.execute(f"SELECT key, score FROM scores WHERE key IN ({marks})", chunk).fetchall())
+            return {bytes(key): float(score) for key, score in rows}
+        except sqlite3.Error as exc:
+            logger.warning("Score cache read failed; persistence disabled: %s", exc)
+            self._path = ""
+            self._conn = None
+            return {}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            entries = len(self._entries)
+            per_entry = sys.getsizeof(b"\0" * 20) + sys.getsizeof(0.0) + self.ENTRY_OVERHEAD
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "approx_memory_bytes": sys.getsizeof(self._entries) + entries * per_entry,
+                "persistent": self._conn is not None,
+            }
+
+
+_score_cache = ScoreCache(CACHE_MAX_ENTRIES, CACHE_PATH)
+
+
+def _compute_scores(pairs: List[List[str]]) -> List[float]:
+    return _vetted_reranker().compute(pairs)
+
+
+_batcher = PairBatcher(_compute_scores, BATCH_MAX_PAIRS, BATCH_WAIT_MS)
+
+
 def _sigmoid(value: float) -> float:
     try:
         return 1.0 / (1.0 + math.exp(-value))
@@ -105,49 +484,154 @@ def _sigmoid(value: float) -> float:
         return 0.0 if value < 0 else 1.0
 
 
-def _score_candidates(query: str, candidates: List[Candidate], top_k: Optional[int], normalize: bool) -> List[ScoredCandidate]:
-    reranker = _load_reranker()
+def _score_pairs(pairs: List[List[str]]) -> List[Optional[float]]:
+    """Raw scores for (query, text) pairs; None where scoring failed.
+
+    Identical pairs are scored once, cached pairs not at all, and the rest go
+    to the batcher in a single submission.
+    """
+
+    unique: Dict[Tuple[str, str], int] = {}
+    for query, text in pairs:
+        unique.setdefault((query, text), len(unique))
+    unique_pairs = list(unique)
+
+    # Cached raw scores first; only the misses go to the model
+    # Backends differ slightly in their logits, so the backend is part of the key
+    cache_model = f"{ACTIVE_MODEL_ID}:{BACKEND_NAME}"
+    keys = [ScoreCache.key(cache_model, query, text) for query, text in unique_pairs]
+    raw_scores = _score_cache.get_many(keys)
+    missing = [idx for idx, raw in enumerate(raw_scores) if raw is None]
+
+    if missing:
+        try:
+            # Batched with pairs from concurrent requests
+            scores = _batcher.submit([list(unique_pairs[idx]) for idx in missing])
+            for idx, raw in zip(missing, scores):
+                raw_scores[idx] = raw
+            _score_cache.put_many({keys[idx]: raw for idx, raw in zip(missing, scores)})
+        except Exception as e:
+            logger.error("Batch scoring failed: %s", e)
+            reranker = _vetted_reranker()
+            # Fallback to individual scoring
+            for idx in missing:
+                try:
+                    raw_scores[idx] = reranker.compute([list(unique_pairs[idx])])[0]
+                except Exception as e2:
+                    logger.error("Individual scoring failed for pair %r: %s", unique_pairs[idx][1][:60], e2)
+
+    return [raw_scores[unique[(query, text)]] for query, text in pairs]
+
+
+def _limit(candidates: List[Candidate], top_k: Optional[int]) -> List[Candidate]:
     limit = top_k if top_k is not None and top_k > 0 else len(candidates)
-    limit = min(limit, len(candidates))
+    return candidates[:min(limit, len(candidates))]
+
+
+def _scored(candidates: List[Candidate], raw_scores: List[Optional[float]], normalize: bool) -> List[ScoredCandidate]:
     scored: List[ScoredCandidate] = []
+    for candidate, raw in zip(candidates, raw_scores):
+        if raw is None:
+            # Add a default low score
+            scored.append(ScoredCandidate(id=candidate.id, score=0.0, raw_score=-10.0))
+            continue
+        score = _sigmoid(raw) if normalize else raw
+        scored.append(ScoredCandidate(id=candidate.id, score=score, raw_score=raw))
+    return scored
 
-    # Prepare pairs for batch processing
-    pairs = [[query, candidate.text] for candidate in candidates[:limit]]
 
-    try:
-        # Try batch scoring first
-        scores = reranker.compute_score(pairs)
-        if isinstance(scores, list):
-            for i, candidate in enumerate(candidates[:limit]):
-                raw = float(scores[i])
-                score = _sigmoid(raw) if normalize else raw
-                scored.append(ScoredCandidate(id=candidate.id, score=score, raw_score=raw))
-        else:
-            # Fallback to single score
-            raw = float(scores)
-            score = _sigmoid(raw) if normalize else raw
-            scored.append(ScoredCandidate(id=candidates[0].id, score=score, raw_score=raw))
-    except Exception as e:
-        logger.error("Batch scoring failed: %s", e)
-        # Fallback to individual scoring
-        for candidate in candidates[:limit]:
-            try:
-                raw = float(reranker.compute_score([query, candidate.text]))
-                score = _sigmoid(raw) if normalize else raw
-                scored.append(ScoredCandidate(id=candidate.id, score=score, raw_score=raw))
-            except Exception as e2:
-                logger.error("Individual scoring failed for candidate %s: %s", candidate.id, e2)
-                # Add a default low score
-                scored.append(ScoredCandidate(id=candidate.id, score=0.0, raw_score=-10.0))
+def _best(scored: List[ScoredCandidate]) -> Optional[ScoredCandidate]:
+    return max(scored, key=lambda item: item.score) if scored else None
 
-    return scored
+
+def _check_model(requested: Optional[str]) -> None:
+    requested_model = requested or ACTIVE_MODEL_ALIAS
+    normalized_model = MODEL_ALIASES.get(requested_model, requested_model)
+    if normalized_model != ACTIVE_MODEL_ID:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Model '{requested}' not available; loaded model is '{ACTIVE_MODEL_ALIAS}'",
+        )
+
+
+def _score_candidates(query: str, candidates: List[Candidate], top_k: Optional[int], normalize: bool) -> List[ScoredCandidate]:
+    selected = _limit(candidates, top_k)
+    return _scored(selected, _score_pairs([[query, candidate.text] for candidate in selected]), normalize)
+
+
+_ready = threading.Event()
+_warmup: Dict[str, Any] = {"state": "pending"}
+
+
+def _warm_up() -> None:
+    """Load the backend, vet it, run one batch through it, then mark the service ready."""
+
+    started = time.perf_counter()
+    _warmup["state"] = "running"
+    try:
+        _load_reranker()
+        loaded = time.perf_counter()
+        backend = _vetted_reranker()
+        backend.compute(PARITY_PAIRS)
+        _warmup.update({
+            "state": "done",
+            "load_ms": round((loaded - started) * 1000.0, 2),
+            "warmup_ms": round((time.perf_counter() - loaded) * 1000.0, 2),
+            "pid": os.getpid(),
+        })
+        _ready.set()
+        logger.info("Reranker ready: %s", _warmup)
+    except Exception as exc:
+        _warmup.update({"state": "failed", "error": str(exc)})
+        logger.exception("Reranker warm-up failed")
+
+
+@app.on_event("startup")
+async def startup() -> None:
+    """Warm up in the background so /health answers while the model loads."""
+
+    _score_cache.after_fork()
+    if not WARMUP:
+        _warmup["state"] = "skipped"
+        _ready.set()
+        return
+    asyncio.get_running_loop().run_in_executor(None, _warm_up)
+
+
+@app.get("/ready")
+def ready() -> JSONResponse:
+    """Readiness probe: 503 until the model is loaded and warmed up."""
+
+    body = {"ready": _ready.is_set(), "model": ACTIVE_MODEL_ID, "backend": BACKEND_NAME, "warmup": _warmup}
+    return JSONResponse(status_code=200 if _ready.is_set() else 503, content=body)
 
 
 @app.get("/health")
 def health() -> dict:
     """Health check endpoint."""
 
-    return {"status": "ok", "model": ACTIVE_MODEL_ID}
+    return {
+        "status": "ok",
+        "model": ACTIVE_MODEL_ID,
+        "backend": _reranker.describe() if _reranker is not None else {"backend": BACKEND_NAME, "loaded": False},
+        "parity": _parity,
+        "ready": _ready.is_set(),
+        "score_cache": _score_cache.stats(),
+    }
+
+
+@app.get("/metrics")
+def metrics() -> dict:
+    """Micro-batching metrics (batch size, formation latency, queue depth)."""
+
+    return {
+        "model": ACTIVE_MODEL_ID,
+        "batching": {
+            "max_pairs": BATCH_MAX_PAIRS,
+            "wait_ms": BATCH_WAIT_MS,
+            **_batcher.metrics.snapshot(_batcher.queue_depth()),
+        },
+    }
 
 
 @app.post("/rerank", response_model=RerankResponse)
@@ -157,17 +641,62 @@ def rerank(payload: RerankRequest) -> RerankResponse:
     if not payload.candidates:
         raise HTTPException(status_code=400, detail="candidates list must not be empty")
 
-    requested_model = payload.model or ACTIVE_MODEL_ALIAS
-    normalized_model = MODEL_ALIASES.get(requested_model, requested_model)
-    if normalized_model != ACTIVE_MODEL_ID:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Model '{payload.model}' not available; loaded model is '{ACTIVE_MODEL_ALIAS}'",
-        )
+    _check_model(payload.model)
 
     scored = _score_candidates(payload.query, payload.candidates, payload.top_k, payload.normalize_scores)
-    best: Optional[ScoredCandidate] = None
-    if scored:
-        best = max(scored, key=lambda item: item.score)
-
-    return RerankResponse(model=ACTIVE_MODEL_ALIAS, results=scored, best=best)
+    return RerankResponse(model=ACTIVE_MODEL_ALIAS, results=scored, best=_best(scored))
+
+
+@app.post("/rerank/batch", response_model=BatchRerankResponse)
+def rerank_batch(payload: BatchRerankRequest) -> BatchRerankResponse:
+    """Score several queries with their candidate lists in one batched pass."""
+
+    if not payload.queries:
+        raise HTTPException(status_code=400, detail="queries list must not be empty")
+    _check_model(payload.model)
+
+    selections = [_limit(item.candidates, item.top_k) for item in payload.queries]
+    pairs = [[item.query, candidate.text] for item, selected in zip(payload.queries, selections) for candidate in selected]
+    raw_scores = _score_pairs(pairs)
+
+    results: List[BatchQueryResult] = []
+    offset = 0
+    for item, selected in zip(payload.queries, selections):
+        scored = _scored(selected, raw_scores[offset:offset + len(selected)], payload.normalize_scores)
+        offset += len(selected)
+        results.append(BatchQueryResult(key=item.key, results=scored, best=_best(scored)))
+
+    return BatchRerankResponse(
+        model=ACTIVE_MODEL_ALIAS,
+        results=results,
+        pairs=len(pairs),
+        unique_pairs=len({(query, text) for query, text in pairs}),
+    )
+
+
+if PRELOAD:
+    # Pre-fork: weights load once in the master and are shared copy-on-write by the
+    # workers. Freezing the GC keeps collections from touching (and copying) those pages.
+    # ORT sessions are not fork-safe, so onnx workers build their own in _warm_up.
+    # No inference here: torch thread pools started in the master do not survive fork.
+    if BACKEND_NAME in FORK_SAFE_BACKENDS:
+        _load_reranker()
+    else:
+        logger.info("Backend '%s' is not fork-safe; loading it in each worker", BACKEND_NAME)
+    gc.freeze()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Reranker backend parity check")
+    parser.add_argument("--backend", default=BACKEND_NAME, help="Candidate backend (flag, onnx, int8)")
+    parser.add_argument("--max-diff", type=float, default=PARITY_MAX_DIFF, help="Allowed absolute logit difference")
+    args = parser.parse_args()
+
+    candidate = create_backend(args.backend, ACTIVE_MODEL_ID, MODEL_DEVICE, USE_FP16)
+    reference = create_backend("flag", ACTIVE_MODEL_ID, MODEL_DEVICE, USE_FP16)
+    report = parity_check(candidate, reference, max_abs_diff=args.max_diff)
+    print(json.dumps({**report, "backend": candidate.describe()}))
+    raise SystemExit(0 if report["passed"] else 1)
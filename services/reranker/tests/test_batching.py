@@ -0,0 +1,84 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from main import PairBatcher
+
+
+class Model:
+    """Scores a pair as the length of its text; records every batch it sees."""
+
+    def __init__(self, fail=False, drop=0):
+        self.batches = []
+        self.fail = fail
+        self.drop = drop
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, pairs):
+        self.entered.set()
+        self.gate.wait(5)
+        self.batches.append([text for _query, text in pairs])
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return [float(len(text)) for _query, text in pairs][self.drop:]
+
+
+def _pairs(prefix, count):
+    return [["q", f"{prefix}{'x' * index}"] for index in range(count)]
+
+
+def test_concurrent_requests_share_a_batch_and_get_their_own_slices():
+    model = Model()
+    batcher = PairBatcher(model, max_pairs=64, wait_ms=200)
+    requests = {name: _pairs(name, count) for name, count in (("a", 3), ("bb", 2), ("ccc", 4))}
+    with ThreadPoolExecutor(3) as pool:
+        futures = {name: pool.submit(batcher.submit, pairs) for name, pairs in requests.items()}
+        results = {name: future.result(5) for name, future in futures.items()}
+
+    for name, pairs in requests.items():
+        assert results[name] == [float(len(text)) for _query, text in pairs]
+    assert len(model.batches) == 1
+    assert batcher.metrics.snapshot(0)["requests"] == 3
+
+
+def test_batches_close_at_max_pairs():
+    model = Model()
+    model.gate.clear()
+    batcher = PairBatcher(model, max_pairs=4, wait_ms=50)
+    with ThreadPoolExecutor(4) as pool:
+        # The first batch blocks in the model while the rest queue up behind it
+        first = pool.submit(batcher.submit, _pairs("a", 1))
+        assert model.entered.wait(5)
+        rest = [pool.submit(batcher.submit, _pairs(name, 3)) for name in ("b", "c", "d")]
+        deadline = time.monotonic() + 5
+        while batcher.queue_depth() < 3 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        model.gate.set()
+        assert first.result(5) == [1.0]
+        assert [len(future.result(5)) for future in rest] == [3, 3, 3]
+
+    sizes = [len(batch) for batch in model.batches]
+    assert sizes[0] == 1
+    # 3 + 3 reaches max_pairs, so the third request starts the next batch
+    assert sizes[1:] == [6, 3]
+
+
+def test_a_failed_batch_fails_every_request_in_it():
+    batcher = PairBatcher(Model(fail=True), max_pairs=64, wait_ms=100)
+    with ThreadPoolExecutor(2) as pool:
+        futures = [pool.submit(batcher.submit, _pairs(name, 2)) for name in ("a", "b")]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="model crashed"):
+                future.result(5)
+    assert batcher.metrics.snapshot(0)["failures"] >= 1
+
+
+def test_short_score_list_is_an_error_not_a_misaligned_slice():
+    batcher = PairBatcher(Model(drop=1), max_pairs=64, wait_ms=0)
+    with pytest.raises(RuntimeError, match="3 pairs"):
+        batcher.submit(_pairs("a", 3))
+    assert batcher.submit([]) == []
@@ -0,0 +1,84 @@
+from main import ScoreCache
+
+
+def _keys(*texts):
+    return [ScoreCache.key("bge-reranker-v2-m3:flag", "invoice number", text) for text in texts]
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = ScoreCache(max_entries=2)
+    a, b, c = _keys("a", "b", "c")
+    cache.put_many({a: 1.0, b: 2.0})
+    assert cache.get_many([a]) == [1.0]  # a is now the most recent
+    cache.put_many({c: 3.0})
+
+    assert cache.get_many([a, b, c]) == [1.0, None, 3.0]
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+    assert not stats["persistent"]
+
+
+def test_keys_separate_model_query_and_text():
+    keys = {
+        ScoreCache.key("m1", "q", "t"),
+        ScoreCache.key("m2", "q", "t"),
+        ScoreCache.key("m1", "q2", "t"),
+        ScoreCache.key("m1", "q", "t2"),
+    }
+    assert len(keys) == 4
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ScoreCache(max_entries=0, path=str(tmp_path / "scores.sqlite"))
+    (a,) = _keys("a")
+    cache.put_many({a: 1.0})
+    assert cache.get_many([a]) == [None]
+    assert not (tmp_path / "scores.sqlite").exists()
+
+
+def test_sqlite_layer_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache" / "scores.sqlite")
+    a, b, c = _keys("a", "b", "c")
+    ScoreCache(max_entries=10, path=path).put_many({a: 1.5, b: -2.0})
+
+    reloaded = ScoreCache(max_entries=10, path=path)
+    assert reloaded.stats()["persistent"]
+    assert reloaded.stats()["entries"] == 0
+    assert reloaded.get_many([a, b, c]) == [1.5, -2.0, None]
+    # Hits from SQLite are promoted into memory
+    assert reloaded.stats()["entries"] == 2
+
+
+def test_sqlite_keeps_entries_evicted_from_memory(tmp_path):
+    cache = ScoreCache(max_entries=1, path=str(tmp_path / "scores.sqlite"))
+    a, b = _keys("a", "b")
+    cache.put_many({a: 1.0})
+    cache.put_many({b: 2.0})
+    assert cache.stats()["evictions"] == 1
+    assert cache.get_many([a]) == [1.0]
+
+
+def test_after_fork_reopens_the_connection(tmp_path):
+    cache = ScoreCache(max_entries=10, path=str(tmp_path / "scores.sqlite"))
+    inherited = cache._conn
+    cache.after_fork()
+    assert cache._conn is inherited
+
+    cache._conn_pid = -1  # as seen from a forked worker
+    cache.after_fork()
+    assert cache._conn is not inherited
+    (a,) = _keys("a")
+    cache.put_many({a: 4.0})
+    assert ScoreCache(max_entries=10, path=str(tmp_path / "scores.sqlite")).get_many([a]) == [4.0]
+
+
+def test_unusable_path_disables_persistence_only(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("", encoding="utf-8")
+    cache = ScoreCache(max_entries=10, path=str(blocker / "scores.sqlite"))
+    (a,) = _keys("a")
+    cache.put_many({a: 1.0})
+    assert cache.get_many([a]) == [1.0]
+    assert not cache.stats()["persistent"]
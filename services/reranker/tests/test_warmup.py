@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from backends import PARITY_PAIRS, ScoringBackend, parity_check
+
+
+class Stub(ScoringBackend):
+    """Scores a pair as the text length times ``scale`` plus ``offset``; counts calls."""
+
+    def __init__(self, name, scale=1.0, offset=0.0, fail=False):
+        super().__init__(max_length=512, batch_size=4)
+        self.name = name
+        self.scale = scale
+        self.offset = offset
+        self.fail = fail
+        self.calls = 0
+
+    def _score_batch(self, pairs):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("model crashed")
+        return [len(text) * self.scale + self.offset for _query, text in pairs]
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """Fresh per-test backend, parity and readiness state; ``create_backend`` returns stubs."""
+
+    backends = {}
+
+    def create_backend(name, model_id, device, use_fp16):
+        return backends[name]
+
+    monkeypatch.setattr(main, "create_backend", create_backend)
+    monkeypatch.setattr(main, "_reranker", None)
+    monkeypatch.setattr(main, "_parity", None)
+    monkeypatch.setattr(main, "_ready", threading.Event())
+    monkeypatch.setattr(main, "_warmup", {"state": "pending"})
+    monkeypatch.setattr(main, "BACKEND_NAME", "int8")
+    monkeypatch.setattr(main, "PARITY_CHECK", True)
+    return backends
+
+
+def test_parity_check_passes_for_close_scores():
+    report = parity_check(Stub("int8", offset=0.1), Stub("flag"), max_abs_diff=0.5)
+    assert report["passed"]
+    assert report["candidate"] == "int8" and report["reference"] == "flag"
+    assert report["pairs"] == len(PARITY_PAIRS)
+    assert report["max_abs_diff"] == pytest.approx(0.1)
+    assert report["spearman"] == pytest.approx(1.0)
+
+
+def test_parity_check_fails_on_large_diffs_or_reordering():
+    assert not parity_check(Stub("int8", offset=1.0), Stub("flag"), max_abs_diff=0.5)["passed"]
+
+    pairs = [["q", "a"], ["q", "bbb"]]
+    reversed_order = parity_check(Stub("int8", scale=-0.01), Stub("flag", scale=0.01), pairs=pairs, max_abs_diff=1.0)
+    assert reversed_order["max_abs_diff"] < 1.0
+    assert not reversed_order["passed"]
+
+
+def test_ready_turns_200_after_warm_up(service):
+    service["int8"] = Stub("int8", offset=0.1)
+    service["flag"] = Stub("flag")
+    client = TestClient(main.app)
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["warmup"]["state"] == "pending"
+
+    main._warm_up()
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["warmup"]["state"] == "done"
+    assert main._parity["passed"]
+    assert main._reranker is service["int8"]
+
+
+def test_failed_warm_up_stays_not_ready(service):
+    service["int8"] = Stub("int8", fail=True)
+    service["flag"] = Stub("flag")
+    main._warm_up()
+    response = TestClient(main.app).get("/ready")
+    assert response.status_code == 503
+    assert response.json()["warmup"]["state"] == "failed"
+
+
+def test_loading_runs_no_inference(service):
+    # _load_reranker is what the pre-fork master calls: weights only, no parity check
+    service["int8"] = Stub("int8")
+    service["flag"] = Stub("flag")
+    assert main._load_reranker() is service["int8"]
+    assert service["int8"].calls == 0
+    assert main._parity is None
+
+
+def test_failed_parity_serves_the_reference_backend(service):
+    service["int8"] = Stub("int8", offset=2.0)
+    service["flag"] = Stub("flag")
+    main._load_reranker()
+    main._warm_up()
+    assert not main._parity["passed"]
+    assert main._reranker is service["flag"]
+    assert main._vetted_reranker() is service["flag"]
+    assert TestClient(main.app).get("/ready").status_code == 200
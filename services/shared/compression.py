@@ -0,0 +1,279 @@
+"""
+Negotiated HTTP compression (gzip, or zstd when ``zstandard`` is installed).
+
+``CompressionMiddleware`` compresses responses for clients that send
+``Accept-Encoding`` (zstd preferred over gzip) once the body reaches
+COMPRESS_MIN_BYTES, streaming responses chunk by chunk. Responses that
+already carry a Content-Encoding, or whose type is already compressed (ZIP,
+PDF, images), pass through untouched. Request bodies sent with
+``Content-Encoding: gzip`` / ``zstd`` are read in full and decoded before the
+app sees them, with the decoded size capped at ``max_request_bytes`` (413
+beyond it, 400 for a corrupt stream) so a small compressed body cannot
+inflate without bound.
+
+Settings: COMPRESS_MIN_BYTES (1024), COMPRESS_GZIP_LEVEL (1 — fast, the hops
+are on the internal network), COMPRESS_ZSTD_LEVEL (3), COMPRESS_ENABLED (1),
+COMPRESS_MAX_REQUEST_MB (64, default decoded request cap).
+
+Shared by the gateway, pdf2json and json2xml services (``/shared`` on their
+PYTHONPATH in the containers).
+"""
+
+import gzip
+import io
+import os
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "1"))
+ZSTD_LEVEL = int(os.getenv("COMPRESS_ZSTD_LEVEL", "3"))
+ENABLED = os.getenv("COMPRESS_ENABLED", "1").lower() in {"1", "true", "yes"}
+MAX_REQUEST_BYTES = int(float(os.getenv("COMPRESS_MAX_REQUEST_MB", "64")) * 1024 * 1024)
+# Output produced per step while decoding, so the cap is checked as the body inflates
+DECODE_CHUNK_BYTES = 1024 * 1024
+
+# Already-compressed payloads are not worth another pass
+EXCLUDED_CONTENT_TYPES = ("application/zip", "application/pdf", "application/gzip", "image/")
+
+
+def supported() -> Tuple[str, ...]:
+    return ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the encoding to answer with from an Accept-Encoding header (None: identity)."""
+    if not ENABLED or not accept_encoding:
+        return None
+    offered: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip()] = quality
+    for encoding in supported():
+        if offered.get(encoding, offered.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def accepts(accept_encoding: Optional[str], encoding: str) -> bool:
+    """Whether a client sending ``accept_encoding`` can take a body already encoded as ``encoding``."""
+    if not accept_encoding:
+        return False
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip() in {encoding.lower(), "*"}:
+            return params.strip() not in {"q=0", "q=0.0", "q=0.00", "q=0.000"}
+    return False
+
+
+def encode(data: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def _compressor(encoding: str) -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    if encoding == "zstd":
+        stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        return stream.compress, stream.flush
+    stream = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return stream.compress, stream.flush
+
+
+_DECODE_ERRORS = (zlib.error,) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+class BodyTooLarge(Exception):
+    """The decoded request body exceeds the cap."""
+
+
+def decode(data: bytes, encoding: str, max_bytes: int) -> bytes:
+    """Decode a gzip/zstd body, raising ``BodyTooLarge`` past ``max_bytes`` of output.
+
+    Corrupt input raises ``ValueError`` (``zlib.error`` / ``ZstdError`` are wrapped).
+    """
+    parts = []
+    total = 0
+    try:
+        if encoding == "zstd":
+            reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True)
+            read = reader.read
+        else:
+            stream = zlib.decompressobj(47)
+            pending = [data]
+
+            def read(size: int) -> bytes:
+                chunk = stream.decompress(pending[0], size)
+                pending[0] = stream.unconsumed_tail
+                return chunk
+
+        while True:
+            chunk = read(min(DECODE_CHUNK_BYTES, max_bytes + 1 - total))
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > max_bytes:
+                raise BodyTooLarge(f"decoded body exceeds {max_bytes} bytes")
+            parts.append(chunk)
+    except _DECODE_ERRORS as exc:
+        raise ValueError(f"invalid {encoding} body: {exc}") from exc
+    return b"".join(parts)
+
+
+def _header(headers: Any, name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+class CompressionMiddleware:
+    """ASGI middleware: compress responses, decode compressed request bodies."""
+
+    def __init__(self, app, minimum_size: int = MIN_BYTES, max_request_bytes: int = MAX_REQUEST_BYTES) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.max_request_bytes = max_request_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        request_encoding = (_header(scope["headers"], b"content-encoding") or "").lower()
+        if request_encoding in {"gzip", "zstd"}:
+            if request_encoding not in supported():
+                await _plain_response(send, 415, b'{"detail":"Unsupported Content-Encoding"}')
+                return
+            try:
+                body = await _read_body(receive, self.max_request_bytes)
+                if body is None:
+                    return
+                body = decode(body, request_encoding, self.max_request_bytes)
+            except BodyTooLarge:
+                await _plain_response(send, 413, b'{"detail":"Request body too large"}')
+                return
+            except ValueError:
+                await _plain_response(send, 400, b'{"detail":"Invalid compressed request body"}')
+                return
+            scope = dict(scope)
+            scope["headers"] = [
+                (key, value) for key, value in scope["headers"]
+                if key.lower() not in {b"content-encoding", b"content-length"}
+            ] + [(b"content-length", str(len(body)).encode())]
+            receive = _replay_receive(body, receive)
+
+        encoding = negotiate(_header(scope["headers"], b"accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _EncodingSender(send, encoding, self.minimum_size))
+
+
+async def _read_body(receive, max_bytes: int) -> Optional[bytes]:
+    """The whole (still encoded) request body, held to the same cap; None on disconnect."""
+    parts = []
+    total = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body = message.get("body", b"")
+        total += len(body)
+        if total > max_bytes:
+            raise BodyTooLarge(f"encoded body exceeds {max_bytes} bytes")
+        parts.append(body)
+        if not message.get("more_body", False):
+            return b"".join(parts)
+
+
+def _replay_receive(body: bytes, receive):
+    # The decoded body as one message; later calls wait for the disconnect as usual
+    sent = False
+
+    async def wrapped():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return wrapped
+
+
+async def _plain_response(send, status: int, body: bytes) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class _EncodingSender:
+    """Wraps ``send``: decides on the first body chunk whether to compress the response."""
+
+    def __init__(self, send, encoding: str, minimum_size: int) -> None:
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start: Optional[Dict[str, Any]] = None
+        self.compress: Optional[Callable[[bytes], bytes]] = None
+        self.flush: Optional[Callable[[], bytes]] = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        kind = message["type"]
+        if kind == "http.response.start":
+            headers = message.get("headers") or []
+            content_type = (_header(headers, b"content-type") or "").lower()
+            self.passthrough = bool(_header(headers, b"content-encoding")) or content_type.startswith(
+                EXCLUDED_CONTENT_TYPES
+            )
+            if self.passthrough:
+                await self.send(message)
+            else:
+                self.start = message
+            return
+        if kind != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            if not more and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            self.compress, self.flush = _compressor(self.encoding)
+            headers = [
+                (key, value) for key, value in start.get("headers") or []
+                if key.lower() not in {b"content-length", b"content-encoding"}
+            ]
+            headers.append((b"content-encoding", self.encoding.encode()))
+            vary = _header(headers, b"vary")
+            if vary is None:
+                headers.append((b"vary", b"Accept-Encoding"))
+            payload = self.compress(body) + (b"" if more else self.flush())
+            if not more:
+                headers.append((b"content-length", str(len(payload)).encode()))
+            await self.send({**start, "headers": headers})
+            await self.send({"type": "http.response.body", "body": payload, "more_body": more})
+            return
+
+        payload = self.compress(body) + (b"" if more else self.flush())
+        await self.send({"type": "http.response.body", "body": payload, "more_body": more})